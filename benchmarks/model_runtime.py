@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""Compare startup time, latency and memory of Keras inference against the exported TFLite/ONNX models.
+
+Each backend runs in a fresh subprocess, so import time and peak RSS include everything the backend loads.
+Peak RSS is read from /proc, so this benchmark needs Linux.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_SCRIPT = """
+import json, sys
+from time import perf_counter
+start = perf_counter()
+import numpy as np
+backend, path, num_windows = sys.argv[1], sys.argv[2], int(sys.argv[3])
+if backend == "keras":
+    import tensorflow as tf
+    from synapp.core.machine_learning import InferenceRunner
+    imported = perf_counter()
+    runner = InferenceRunner(tf.keras.models.load_model(path, compile=False), max_batch_size=1)
+else:
+    from synapp.core.model_runtime import LiteModel
+    imported = perf_counter()
+    runner = LiteModel(path, max_batch_size=1)
+loaded = perf_counter()
+windows = np.random.default_rng(0).normal(size=(num_windows,) + runner.input_shape).astype(np.float32)
+for window in windows:
+    runner.predict(window[np.newaxis])
+stats = runner.latency_stats()
+# ru_maxrss survives exec, so it would include the parent's TensorFlow; VmHWM belongs to this process only
+with open("/proc/self/status") as status:
+    peak_rss_kb = next(int(line.split()[1]) for line in status if line.startswith("VmHWM"))
+stats.update(
+    import_s=imported - start,
+    load_s=loaded - imported,
+    peak_rss_mb=peak_rss_kb / 1024,
+    tensorflow_imported="tensorflow" in sys.modules,
+)
+print(json.dumps(stats))
+"""
+
+
+def export_models(folder, eegnet, num_channels, window_length):
+    from synapp.core import machine_learning, model_runtime
+
+    model = machine_learning.getmodel(3, num_channels, window_length, eegnet=eegnet)
+    paths = {"keras": os.path.join(folder, "model.keras")}
+    model.save(paths["keras"])
+    paths["tflite"] = model_runtime.export_tflite(model, os.path.join(folder, "model.tflite"))
+    paths["tflite int8"] = model_runtime.export_tflite(model, os.path.join(folder, "int8.tflite"), quantize=True)
+    if importlib.util.find_spec("tf2onnx") and importlib.util.find_spec("onnxruntime"):
+        paths["onnx"] = model_runtime.export_onnx(model, os.path.join(folder, "model.onnx"))
+    return paths
+
+
+def run_backend(backend, path, num_windows):
+    environment = dict(os.environ, TF_CPP_MIN_LOG_LEVEL="3")
+    result = subprocess.run(
+        [sys.executable, "-c", BACKEND_SCRIPT, backend, path, str(num_windows)],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=environment,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_benchmark(eegnet, num_channels, window_length, num_windows):
+    with tempfile.TemporaryDirectory() as folder:
+        paths = export_models(folder, eegnet, num_channels, window_length)
+
+        model_name = "EEGNet_SynApp" if eegnet else "dense getmodel"
+        print(f"{model_name}, {num_channels} channels x {window_length} samples, {num_windows} single-window calls")
+        print(f"{'backend':<14}{'size kB':>9}{'import s':>10}{'load s':>8}{'p50 ms':>9}{'p99 ms':>9}{'RSS MB':>9}{'TF':>6}")
+        for name, path in paths.items():
+            stats = run_backend("keras" if name == "keras" else "lite", path, num_windows)
+            print(
+                f"{name:<14}{os.path.getsize(path) / 1024:>9.1f}{stats['import_s']:>10.2f}{stats['load_s']:>8.2f}"
+                f"{stats['p50_ms']:>9.3f}{stats['p99_ms']:>9.3f}{stats['peak_rss_mb']:>9.0f}"
+                f"{str(stats['tensorflow_imported']):>6}"
+            )
+
+
+parser = argparse.ArgumentParser(description="Benchmark Keras inference against exported TFLite/ONNX models.")
+parser.add_argument("--dense", action="store_true", help="Benchmark the dense getmodel network instead of EEGNet")
+parser.add_argument("--channels", type=int, default=4, help="Number of channels")
+parser.add_argument("--window-length", type=int, default=128, help="Samples per window")
+parser.add_argument("--windows", type=int, default=1000, help="Number of timed single-window predictions")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    run_benchmark(not args.dense, args.channels, args.window_length, args.windows)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""Compare throughput and numerical stability of the notch filter implementations.
+
+The legacy implementation designs a Butterworth bandstop in (b, a) form and runs `lfilter`. At high
+orders its poles land on or outside the unit circle, so the output blows up.
+"""
+
+import argparse
+from time import perf_counter
+
+import numpy as np
+from scipy import signal as sps
+
+from synapp.core import filtering
+
+
+def legacy_notch_filter(data, q=100, w0=60, delta=0.5, fs=256):
+    nyq = 0.5 * fs
+    b, a = sps.butter(q, [(w0 - delta) / nyq, (w0 + delta) / nyq], btype="bandstop")
+    return sps.lfilter(b, a, data)
+
+
+def legacy_max_pole(q, w0=60, delta=0.5, fs=256):
+    nyq = 0.5 * fs
+    _, a = sps.butter(q, [(w0 - delta) / nyq, (w0 + delta) / nyq], btype="bandstop")
+    return np.abs(np.roots(a)).max()
+
+
+def sos_max_pole(sos):
+    return max(np.abs(np.roots(section[3:])).max() for section in sos)
+
+
+def tone_amplitude(data, frequency, fs):
+    """Amplitude of a single frequency component, by projection onto a complex exponential"""
+    time = np.arange(data.shape[-1]) / fs
+    return 2 * np.abs(np.mean(data * np.exp(-2j * np.pi * frequency * time), axis=-1)).max()
+
+
+def run_benchmark(duration, num_channels, fs, repeats):
+    time = np.arange(int(duration * fs)) / fs
+    signal = np.sin(2 * np.pi * 10 * time) + np.sin(2 * np.pi * 60 * time)
+    data = np.tile(signal, (num_channels, 1)) + np.random.default_rng(0).normal(
+        scale=0.1, size=(num_channels, len(time))
+    )
+    settled = slice(int(5 * fs), None)
+
+    implementations = {
+        "legacy butter (b, a) q=6": (lambda x: legacy_notch_filter(x, q=6, fs=fs), legacy_max_pole(6, fs=fs)),
+        "legacy butter (b, a) q=100": (lambda x: legacy_notch_filter(x, q=100, fs=fs), legacy_max_pole(100, fs=fs)),
+        "butter sos q=100": (
+            lambda x: filtering.notch_filter(x, q=100, fs=fs),
+            sos_max_pole(filtering.butter_sos(59.5, 60.5, fs, 100, "bandstop")),
+        ),
+        "iirnotch causal": (
+            lambda x: filtering.iir_notch_filter(x, fs=fs),
+            sos_max_pole(filtering.iir_notch_sos(60, fs)),
+        ),
+        "iirnotch zero-phase": (
+            lambda x: filtering.iir_notch_filter(x, fs=fs, zero_phase=True),
+            sos_max_pole(filtering.iir_notch_sos(60, fs)),
+        ),
+    }
+
+    print(f"{duration:.0f} s x {num_channels} channels at {fs} Hz, best of {repeats}")
+    print(f"{'implementation':<28}{'Msamples/s':>12}{'max |pole|':>12}{'finite':>8}{'60Hz left':>11}{'10Hz kept':>11}")
+    for name, (filter_function, max_pole) in implementations.items():
+        timings = []
+        with np.errstate(all="ignore"):
+            for _ in range(repeats):
+                start = perf_counter()
+                filtered = filter_function(data)
+                timings.append(perf_counter() - start)
+            finite = bool(np.isfinite(filtered).all())
+            residual = tone_amplitude(filtered[:, settled], 60, fs) if finite else float("nan")
+            passband = tone_amplitude(filtered[:, settled], 10, fs) if finite else float("nan")
+        throughput = data.size / min(timings) / 1e6
+        print(f"{name:<28}{throughput:>12.2f}{max_pole:>12.4f}{str(finite):>8}{residual:>11.4f}{passband:>11.4f}")
+
+
+parser = argparse.ArgumentParser(description="Benchmark notch filter throughput and stability.")
+parser.add_argument("--duration", type=float, default=600, help="Seconds of data to filter")
+parser.add_argument("--channels", type=int, default=4, help="Number of channels")
+parser.add_argument("--sample-rate", type=int, default=256, help="Sample rate (Hz)")
+parser.add_argument("--repeats", type=int, default=3, help="Number of timed repetitions")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    run_benchmark(args.duration, args.channels, args.sample_rate, args.repeats)
@@ -0,0 +1,425 @@
+#!/usr/bin/env python
+"""Throughput benchmarks for the recording and processing hot paths, with baselines and regression flags.
+
+Every case processes the same synthetic recording, at each size in the chosen `--scale`, and is timed over
+several repetitions. The best time is compared, since it is the least affected by other load on the machine.
+
+    python -m benchmarks.suite --scale standard
+
+Baselines are only meaningful on the machine and environment that recorded them, so none are checked in.
+Without `--compare` or `--save-baseline`, the first run at a scale saves its results as this machine's
+baseline in `benchmarks/baselines/<scale>.json` (ignored by git), later runs compare against it, and cases
+it doesn't have yet are added to it. Cases more than `--threshold` slower than the baseline are flagged,
+and the exit status is 1 if any are, so the suite can gate CI. Other baselines can be written and compared
+against explicitly:
+
+    python -m benchmarks.suite --scale standard --save-baseline before.json
+    python -m benchmarks.suite --scale standard --compare before.json
+"""
+
+import argparse
+import functools
+import importlib.util
+import json
+import os
+import platform
+import sys
+import tempfile
+from statistics import median
+from time import perf_counter
+from typing import Callable, Dict, NamedTuple
+
+import numpy as np
+
+DEFAULT_REPEATS = 5
+MIN_ROUND_TIME = 0.2  # sec
+DEFAULT_THRESHOLD = 0.25  # fraction slower than the baseline that counts as a regression
+LOCAL_BASELINE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+CHUNK_SIZE = 12  # samples per device callback, as from a Muse
+WINDOW_DURATION = 1.0  # sec
+INFERENCE_HOP = 0.25  # sec between online predictions
+MAX_INFERENCE_WINDOWS = 600
+MARKER_INTERVAL = 2.0  # sec
+PLOT_WINDOW_DURATION = 4.0  # sec shown at once
+PLOT_FPS = 30
+PLOT_FRAMES = 30
+
+
+class Scale(NamedTuple):
+    channels: int
+    sample_rate: int
+    duration: float  # sec
+
+    @property
+    def label(self) -> str:
+        return f"{self.channels}ch_{self.sample_rate}Hz_{self.duration:.0f}s"
+
+    @property
+    def num_samples(self) -> int:
+        return int(self.duration * self.sample_rate)
+
+
+SCALES = {
+    "smoke": [Scale(4, 256, 10)],
+    "quick": [Scale(4, 256, 60)],
+    "standard": [Scale(4, 256, 600), Scale(32, 256, 600), Scale(8, 1000, 600)],
+    "full": [Scale(4, 256, 3600), Scale(32, 256, 3600), Scale(32, 1000, 600)],
+}
+
+# name -> setup(scale, data) returning (the function to time, samples it processes per call)
+CASES: Dict[str, Callable] = {}
+
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+
+    return register
+
+
+class SkipCase(Exception):
+    """Raised by a setup whose optional dependencies aren't installed"""
+
+
+@functools.lru_cache(maxsize=1)
+def make_data(scale: Scale):
+    """(timestamps, samples of shape (channels, n), markers) for a synthetic recording at this scale"""
+    rng = np.random.default_rng(0)
+    timestamps = np.arange(scale.num_samples) / scale.sample_rate
+    samples = 20 * np.sin(2 * np.pi * 10 * timestamps) + rng.normal(0, 5, (scale.channels, scale.num_samples))
+    marker_times = np.arange(MARKER_INTERVAL, scale.duration - MARKER_INTERVAL, MARKER_INTERVAL)
+    labels = rng.choice(["left", "right"], len(marker_times))
+    markers = np.rec.fromarrays([labels, marker_times], names=["marker", "timestamp"])
+    return timestamps, samples, markers
+
+
+def window_length(scale: Scale) -> int:
+    return int(WINDOW_DURATION * scale.sample_rate)
+
+
+@case("filtering.bandpass_notch_filter_dataframe")
+def bandpass_notch_filter_dataframe(scale, data):
+    import pandas as pd
+
+    from synapp.core.filtering import bandpass_notch_filter_dataframe
+
+    timestamps, samples, _ = data
+    dataframe = pd.DataFrame(samples.T, index=timestamps, columns=[f"channel_{i}" for i in range(scale.channels)])
+    return lambda: bandpass_notch_filter_dataframe(dataframe, sample_rate=scale.sample_rate), scale.num_samples
+
+
+@case("data_parsing.get_ML_set_from_data")
+def get_ML_set_from_data(scale, data):
+    from synapp.core.data_parsing import get_ML_set_from_data
+
+    timestamps, samples, markers = data
+    return lambda: get_ML_set_from_data(markers, timestamps, samples, window_length(scale)), scale.num_samples
+
+
+@case("data_parsing.get_FFT_from_timeseries")
+def get_FFT_from_timeseries(scale, data):
+    from synapp.core.data_parsing import get_FFT_from_timeseries
+
+    _, samples, _ = data
+    length = window_length(scale)
+    windows = [samples[:, start : start + length] for start in range(0, scale.num_samples - length + 1, length)]
+
+    def run():
+        for window in windows:
+            get_FFT_from_timeseries(window, scale.sample_rate)
+
+    return run, len(windows) * length
+
+
+@case("data_parsing.get_markers_between_timestamps")
+def get_markers_between_timestamps(scale, data):
+    from synapp.core.data_parsing import get_markers_between_timestamps
+
+    _, _, markers = data
+    starts = np.arange(0, scale.duration, WINDOW_DURATION)
+
+    def run():
+        for start in starts:
+            get_markers_between_timestamps(start, start + WINDOW_DURATION, markers)
+
+    return run, scale.num_samples
+
+
+@case("markers.MarkerIndex.between")
+def marker_index_between(scale, data):
+    from synapp.core.markers import MarkerIndex
+
+    _, _, markers = data
+    index = MarkerIndex.from_markers(markers)
+    starts = np.arange(0, scale.duration, WINDOW_DURATION)
+
+    def run():
+        for start in starts:
+            index.between(start, start + WINDOW_DURATION)
+
+    return run, scale.num_samples
+
+
+@case("data_parsing.slide_window")
+def slide_window(scale, data):
+    from synapp.core.data_parsing import slide_window
+
+    _, samples, _ = data
+    chunks = [samples[:, start : start + CHUNK_SIZE] for start in range(0, scale.num_samples, CHUNK_SIZE)]
+    length = window_length(scale)
+
+    def run():
+        window = np.zeros((scale.channels, length))
+        for chunk in chunks:
+            window = slide_window(window, chunk)
+
+    return run, scale.num_samples
+
+
+@case("recording.ingest")
+def recording_ingest(scale, data):
+    """Device chunks into a ring buffer, flushed to a recording folder every flush interval"""
+    from synapp.core.recording import DEFAULT_FLUSH_INTERVAL, RecordingWriter
+    from synapp.core.ring_buffer import RingBuffer
+
+    timestamps, samples, _ = data
+    chunks = [
+        (samples[:, start : start + CHUNK_SIZE], timestamps[start : start + CHUNK_SIZE])
+        for start in range(0, scale.num_samples, CHUNK_SIZE)
+    ]
+    chunks_per_flush = max(1, int(DEFAULT_FLUSH_INTERVAL * scale.sample_rate) // CHUNK_SIZE)
+
+    def run():
+        with tempfile.TemporaryDirectory() as folder:
+            buffer = RingBuffer(scale.channels, int(4 * DEFAULT_FLUSH_INTERVAL * scale.sample_rate))
+            with RecordingWriter(folder, buffer) as writer:
+                for i, (chunk_samples, chunk_timestamps) in enumerate(chunks, start=1):
+                    buffer.append(chunk_samples, chunk_timestamps)
+                    if i % chunks_per_flush == 0:
+                        writer.flush()
+
+    return run, scale.num_samples
+
+
+def inference_windows(scale, data):
+    _, samples, _ = data
+    length = window_length(scale)
+    hop = int(INFERENCE_HOP * scale.sample_rate)
+    starts = range(0, scale.num_samples - length + 1, hop)[:MAX_INFERENCE_WINDOWS]
+    return np.stack([samples[:, start : start + length] for start in starts]).astype(np.float32)[..., np.newaxis]
+
+
+def eegnet_model(scale):
+    if importlib.util.find_spec("tensorflow") is None:
+        raise SkipCase("TensorFlow is not installed")
+    from synapp.core.machine_learning import getmodel
+
+    return getmodel(2, scale.channels, window_length(scale), eegnet=True)
+
+
+@case("machine_learning.InferenceRunner")
+def inference_runner(scale, data):
+    """One online prediction per hop, as `InferenceRunner` makes them from a live stream"""
+    from synapp.core.machine_learning import InferenceRunner
+
+    windows = inference_windows(scale, data)
+    runner = InferenceRunner(eegnet_model(scale), max_batch_size=1)
+
+    def run():
+        for window in windows:
+            runner.predict(window[np.newaxis])
+
+    return run, len(windows) * window_length(scale)
+
+
+@case("model_runtime.LiteModel")
+def lite_model(scale, data):
+    """Like machine_learning.InferenceRunner, through the exported TFLite model"""
+    from synapp.core.model_runtime import LiteModel, export_tflite
+
+    windows = inference_windows(scale, data)
+    model = eegnet_model(scale)
+    folder = tempfile.TemporaryDirectory()
+    runner = LiteModel(export_tflite(model, os.path.join(folder.name, "model.tflite")), max_batch_size=1)
+
+    def run(folder=folder):
+        # Holding the folder keeps the model file until the case is done
+        for window in windows:
+            runner.predict(window[np.newaxis])
+
+    return run, len(windows) * window_length(scale)
+
+
+@case("plotting.SignalPlot")
+def signal_plot(scale, data):
+    """Live display frames of a sliding window, advancing in real time at 30 FPS. Keeps up with the
+    stream as long as it processes at least `sample_rate` samples per second.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    from synapp.core.plotting import SignalPlot
+
+    timestamps, samples, _ = data
+    length = int(PLOT_WINDOW_DURATION * scale.sample_rate)
+    hop = scale.sample_rate // PLOT_FPS
+    figure = Figure(figsize=(12, max(4, 0.3 * scale.channels)))
+    FigureCanvasAgg(figure)
+    plot = SignalPlot(scale.channels, length, scale.sample_rate, figure=figure)
+    starts = range(0, hop * PLOT_FRAMES, hop)
+
+    def run():
+        for start in starts:
+            plot.update(timestamps[start : start + length], samples[:, start : start + length])
+
+    return run, len(starts) * hop
+
+
+def measure(function: Callable, repeats: int, min_time: float = MIN_ROUND_TIME) -> dict:
+    """Time `repeats` rounds, after one untimed warm-up call. Fast functions are called several times per
+    round, so each round lasts at least min_time and timer resolution and scheduling noise average out.
+
+    Returns:
+        dict -- Best and median seconds per call
+    """
+    start = perf_counter()
+    function()
+    number = max(1, int(np.ceil(min_time / max(perf_counter() - start, 1e-9))))
+    timings = []
+    for _ in range(repeats):
+        start = perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((perf_counter() - start) / number)
+    return {"best_s": min(timings), "median_s": median(timings)}
+
+
+def run_suite(scales, selected=None, repeats=DEFAULT_REPEATS, min_time=MIN_ROUND_TIME, log=print) -> dict:
+    """Run every case (or those whose names contain one of `selected`) at every scale.
+
+    Returns:
+        dict -- Results keyed by "case[scale]", with best/median seconds and samples per second
+    """
+    results = {}
+    for scale in scales:
+        data = make_data(scale)
+        for name, setup in CASES.items():
+            if selected and not any(pattern in name for pattern in selected):
+                continue
+            key = f"{name}[{scale.label}]"
+            try:
+                function, num_samples = setup(scale, data)
+            except SkipCase as reason:
+                log(f"{key:<70} skipped: {reason}")
+                continue
+            result = measure(function, repeats, min_time)
+            result["samples_per_s"] = num_samples / result["best_s"]
+            results[key] = result
+            log(f"{key:<70}{result['best_s'] * 1e3:>12.2f} ms{result['samples_per_s'] / 1e6:>10.2f} Msamples/s")
+    return results
+
+
+def environment() -> dict:
+    return {
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+
+def save_baseline(path: str, results: dict):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def local_baseline_path(scale: str) -> str:
+    """This machine's baseline for a scale, saved by the first run at that scale"""
+    return os.path.join(LOCAL_BASELINE_FOLDER, f"{scale}.json")
+
+
+def compare(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> dict:
+    """Classify each result against the baseline's best time.
+
+    Returns:
+        dict -- "case[scale]" to (status, time relative to the baseline), where status is "regression",
+                "faster", "ok" or "new"
+    """
+    comparison = {}
+    for key, result in results.items():
+        reference = baseline["results"].get(key)
+        if reference is None:
+            comparison[key] = ("new", None)
+            continue
+        ratio = result["best_s"] / reference["best_s"]
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 / (1 + threshold):
+            status = "faster"
+        else:
+            status = "ok"
+        comparison[key] = (status, ratio)
+    return comparison
+
+
+def print_comparison(comparison: dict, baseline: dict):
+    if baseline.get("environment") != environment():
+        print("Warning: the baseline was recorded on a different machine or environment")
+    print(f"{'case':<70}{'vs baseline':>12}  status")
+    for key, (status, ratio) in comparison.items():
+        relative = "" if ratio is None else f"{ratio:.2f}x"
+        print(f"{key:<70}{relative:>12}  {status.upper() if status == 'regression' else status}")
+
+
+parser = argparse.ArgumentParser(description="Benchmark the processing hot paths, and compare against a baseline.")
+parser.add_argument("--scale", choices=list(SCALES), default="quick", help="Recording sizes to run at")
+parser.add_argument("-k", "--cases", nargs="*", help="Only run cases whose names contain one of these")
+parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="Number of timed repetitions")
+parser.add_argument("--min-time", type=float, default=MIN_ROUND_TIME, help="Shortest timed round (s)")
+parser.add_argument("--save-baseline", type=str, default=None, help="Write the results to this JSON file")
+parser.add_argument("--compare", type=str, default=None, help="Baseline JSON file to compare the results with")
+parser.add_argument(
+    "--threshold", type=float, default=DEFAULT_THRESHOLD, help="Fraction slower than the baseline to flag"
+)
+parser.add_argument("--list", action="store_true", help="List the cases and scales, and exit")
+
+
+def main(argv=None) -> int:
+    args = parser.parse_args(argv)
+    if args.list:
+        print("\n".join(CASES))
+        print("\n".join(f"{name}: {', '.join(s.label for s in scales)}" for name, scales in SCALES.items()))
+        return 0
+
+    results = run_suite(SCALES[args.scale], args.cases, args.repeats, args.min_time)
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results)
+    compare_path = args.compare
+    if compare_path is None and not args.save_baseline:
+        compare_path = local_baseline_path(args.scale)
+        if not os.path.exists(compare_path):
+            save_baseline(compare_path, results)
+            print(f"Saved these results as this machine's baseline, {compare_path}")
+            return 0
+    if compare_path is None:
+        return 0
+
+    baseline = load_baseline(compare_path)
+    comparison = compare(results, baseline, args.threshold)
+    print_comparison(comparison, baseline)
+    new = {key: results[key] for key, (status, _) in comparison.items() if status == "new"}
+    if new and compare_path == local_baseline_path(args.scale) and baseline.get("environment") == environment():
+        save_baseline(compare_path, {**baseline["results"], **new})
+    return 1 if any(status == "regression" for status, _ in comparison.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
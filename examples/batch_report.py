@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+
+import argparse
+
+from synapp.core.batch_report import DEFAULT_DPI, write_reports
+from synapp.core.logging import logger
+
+
+parser = argparse.ArgumentParser(
+    description="Write QA figures and statistics for every recording in a folder. "
+    "Recordings whose reports are already up to date are skipped."
+)
+
+parser.add_argument("root", type=str, help="Folder of recordings and recording sessions to report on.")
+
+parser.add_argument(
+    "--output",
+    type=str,
+    default=None,
+    help="Where to write the reports. Defaults to a 'reports' folder inside the root folder.",
+)
+
+parser.add_argument("--workers", type=int, default=None, help="Worker processes. Defaults to one per CPU.")
+
+parser.add_argument("--force", action="store_true", help="Rewrite every report, even those that are up to date.")
+
+parser.add_argument("--dpi", type=int, default=DEFAULT_DPI, help="Resolution of the figures.")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    summary = write_reports(args.root, args.output, max_workers=args.workers, force=args.force, dpi=args.dpi)
+    failed = [name for name, stats in summary.items() if "error" in stats]
+    logger.info(f"{len(summary) - len(failed)} reports up to date, {len(failed)} failed")
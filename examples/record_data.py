@@ -7,6 +7,7 @@ import argparse
 from threading import Event
 from synapp.core.devices.device import Device, MuseStreamer
 from synapp.core.devices.device_scanner import DeviceScannerFactory
+from synapp.core.devices.recording_session import RecordingSession
 from synapp.core.enums import DeviceType
 from synapp.core.logging import logger
 
@@ -30,6 +31,18 @@ def record_for_time(save_dir, timeout=60, device=None):
     logger.info(f"Recording completed. Elapsed: {recording_info}")
 
 
+def record_all_for_time(save_dir, timeout=60):
+    logger.info("Scanning devices")
+    devices = DeviceScannerFactory.create(DeviceType.muse).scan_for_devices()
+    if not devices:
+        logger.warning("No devices found while scanning")
+        return
+
+    logger.info(f"Beginning recording from {len(devices)} devices...")
+    session_folder = RecordingSession(devices, save_dir, notes='testing').record(timeout)
+    logger.info(f"Recording completed. Saved to {session_folder}")
+
+
 parser = argparse.ArgumentParser(description="Scan for available devices. Interactive mode optional.")
 
 parser.add_argument(
@@ -47,8 +60,17 @@ parser.add_argument(
     help="Where to save the recorded data. A subdirectory will be made.",
 )
 
+parser.add_argument(
+    "--all-devices",
+    action="store_true",
+    help="Record every device found while scanning at once, into one session folder.",
+)
+
 if __name__ == "__main__":
     args = parser.parse_args()
     device_pkl = args.load_device_info
     save_dir = args.save_dir
-    record_for_time(save_dir, timeout=60, device=device_pkl)
+    if args.all_devices:
+        record_all_for_time(save_dir, timeout=60)
+    else:
+        record_for_time(save_dir, timeout=60, device=device_pkl)
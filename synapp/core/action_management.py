@@ -1,7 +1,22 @@
-from pynput.keyboard import Key, Controller, KeyCode, HotKey
-import pynput
-from PyQt5.QtGui import QKeySequence
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from time import perf_counter
+from typing import TYPE_CHECKING, Callable, Tuple, Union
 
+from synapp.core import metrics
+from synapp.core.logging import logger
+
+# pynput connects to the display server when imported, and PyQt5 is an optional extra, so both are
+# only imported by the functions that press keys
+if TYPE_CHECKING:
+    from PyQt5.QtGui import QKeySequence
+
+DEFAULT_DISPATCH_REFRACTORY_PERIOD = 0.5  # sec
+DEFAULT_MAX_PENDING_ACTIONS = 16
+
+_keyboard = None
+_keyboard_lock = threading.Lock()
 
 
 # Action should be a function that does things
@@ -28,61 +43,63 @@ def getBlinkRightLeftActions():
     return actions
 
 
-def ctrlcmdshifta(hold=False, time=200, keyboard=Controller()):
+def get_keyboard():
+    """The pynput keyboard `Controller` shared by every key press, created on first use."""
+    global _keyboard
+    if _keyboard is None:
+        with _keyboard_lock:
+            if _keyboard is None:
+                from pynput.keyboard import Controller
+
+                _keyboard = Controller()
+    return _keyboard
+
+
+def ctrlcmdshifta(hold=False, time=200, keyboard=None):
+    from pynput.keyboard import Key
+
+    keyboard = keyboard or get_keyboard()
     minus = "a"
     with keyboard.pressed(Key.cmd, Key.ctrl, Key.shift):
         keyboard.press(minus)
 
 
-def ctrlcmdshiftequal(hold=False, time=200):
-    keyboard = Controller()
+def ctrlcmdshiftequal(hold=False, time=200, keyboard=None):
+    from pynput.keyboard import Key, KeyCode
+
+    keyboard = keyboard or get_keyboard()
     equal = KeyCode(vk=27)
     with keyboard.pressed(Key.cmd, Key.ctrl, Key.shift):
         keyboard.press(equal)
 
 
-## key: str, key character to be pressed
-## modifiers: list of modifiers to be pressed, as parsed by hotkey.parse
-
-
-def press_key(key, modifiers):
-    keyboard = Controller()
+## keys: key characters to be pressed
+## modifiers: modifiers to be held while they are, as parsed by HotKey.parse
 
-    with keyboard.pressed(*modifiers):
-        keyboard.press(*key)
-        keyboard.release(*key)
 
+def press_key(keys, modifiers, keyboard=None):
+    keyboard = keyboard or get_keyboard()
 
-def press_pyqt_key_sequence(key_sequence: QKeySequence):
-    hotkey_sequence = pyqt_key_sequence_to_pynput_command(key_sequence)
-    press_key(hotkey_sequence)
+    with metrics.timer("action_dispatch_seconds"), keyboard.pressed(*modifiers):
+        for key in keys:
+            keyboard.press(key)
+            keyboard.release(key)
 
 
-def pyqt_key_sequence_to_pynput_command(key_sequence: QKeySequence):
-    string = key_sequence.toString().lower()
-    key_strings = string.split("+")
-    for i in range(len(key_strings)):
-        curr_str = key_strings[i]
-        ### if longer than 1 char, it's a modifier key, so put it in <> for pynput parsing
-        if len(curr_str) > 1:
-            key_strings[i] = "<" + curr_str + ">"
+def press_pyqt_key_sequence(key_sequence: "QKeySequence"):
+    keys, modifiers = pyqt_key_sequence_to_pynput_command(key_sequence)
+    press_key(keys, modifiers)
 
-    joiner = "+"
-    pynput_hotkey_sequence = joiner.join(key_strings)
 
-    parsed_keys = HotKey.parse(pynput_hotkey_sequence)
-    keys = []
-    modifiers = []
-    for key in parsed_keys:
-        if isinstance(key, pynput.keyboard.KeyCode):
-            keys.append(key)
-        else:
-            modifiers.append(key)
+def pyqt_key_sequence_to_pynput_command(key_sequence: "QKeySequence"):
+    return key_sequence_to_pynput_command(key_sequence.toString().lower())
 
-    return keys, modifiers
 
+# Parsed once per distinct sequence. Tuples, so a cached result can't be changed by a caller
+@lru_cache(maxsize=256)
+def key_sequence_to_pynput_command(key_sequence: str) -> Tuple[tuple, tuple]:
+    from pynput.keyboard import HotKey, KeyCode
 
-def key_sequence_to_pynput_command(key_sequence: str):
     key_strings = key_sequence.split("+")
     for i in range(len(key_strings)):
         curr_str = key_strings[i]
@@ -97,12 +114,12 @@ def key_sequence_to_pynput_command(key_sequence: str):
     keys = []
     modifiers = []
     for key in parsed_keys:
-        if isinstance(key, pynput.keyboard.KeyCode):
+        if isinstance(key, KeyCode):
             keys.append(key)
         else:
             modifiers.append(key)
 
-    return keys, modifiers
+    return tuple(keys), tuple(modifiers)
 
 
 def press_key_sequence(key_sequence: str):
@@ -110,9 +127,148 @@ def press_key_sequence(key_sequence: str):
     press_key(keys, modifiers)
 
 
-# Prediction: string of prediction made. Actionset: Set of actions
+def key_sequence_action(name: str, key_sequence: Union[str, "QKeySequence"]) -> Action:
+    """An `Action` that presses a hotkey, e.g. "ctrl+shift+a" or a PyQt `QKeySequence`.
+
+    The sequence is parsed here, once, so executing the action only presses keys.
+    """
+    if isinstance(key_sequence, str):
+        keys, modifiers = key_sequence_to_pynput_command(key_sequence)
+    else:
+        keys, modifiers = pyqt_key_sequence_to_pynput_command(key_sequence)
+    return Action(name, lambda: press_key(keys, modifiers))
+
+
+class ActionDispatcher:
+    """Executes actions on a worker thread, so a slow key press never holds up whoever submitted it.
+
+    `submit` only queues the action and returns. While an action is waiting, submitting it again is
+    coalesced into the pending one, and an action that already ran less than `refractory_period` ago is
+    dropped rather than run again. If `max_pending` actions are waiting, the oldest is dropped.
+
+        with ActionDispatcher() as dispatcher:
+            dispatcher.submit(key_sequence_action("zoom", "ctrl+shift+equal"))
+    """
+
+    def __init__(
+        self,
+        refractory_period: float = DEFAULT_DISPATCH_REFRACTORY_PERIOD,
+        max_pending: int = DEFAULT_MAX_PENDING_ACTIONS,
+        on_executed: Callable = None,
+    ):
+        """
+        Keyword Arguments:
+            refractory_period {float} -- Shortest time between two runs of the same action, in seconds (default: {0.5})
+            max_pending {int} -- Most actions waiting to run (default: {16})
+            on_executed {Callable} -- Called as `on_executed(key, action, submitted_at)` from the worker after
+                                      each action runs (default: {None})
+        """
+        self.refractory_period = refractory_period
+        self.max_pending = max_pending
+        self.on_executed = on_executed
+        self.executed = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.dropped = 0
+
+        self._pending = OrderedDict()  # key -> (action, submitted_at)
+        self._last_run = {}  # key -> perf_counter() when it last ran
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def start(self) -> "ActionDispatcher":
+        if self._running:
+            raise RuntimeError("Dispatcher is already running")
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="ActionDispatcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, action: Action, key: str = None, submitted_at: float = None) -> bool:
+        """Queue an action to run. Never blocks on the action itself.
+
+        Arguments:
+            action {Action} -- Action to execute
+
+        Keyword Arguments:
+            key {str} -- What counts as the same action for coalescing and the refractory period.
+                         Defaults to the action's name (default: {None})
+            submitted_at {float} -- perf_counter() time handed back to `on_executed`, e.g. when the
+                                    samples behind it arrived. Defaults to now (default: {None})
+
+        Returns:
+            bool -- Whether the action was queued, False if it was coalesced into a pending one
+        """
+        key = action.name if key is None else key
+        submitted_at = perf_counter() if submitted_at is None else submitted_at
+        with self._condition:
+            if key in self._pending:
+                self.coalesced += 1
+                metrics.inc("actions_coalesced_total")
+                return False
+            if len(self._pending) >= self.max_pending:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+                metrics.inc("actions_dropped_total")
+            self._pending[key] = (action, submitted_at)
+            metrics.set_gauge("action_queue_depth", len(self._pending))
+            self._condition.notify()
+        return True
+
+    def stop(self):
+        """Run the actions still pending, then stop the worker."""
+        if not self._running:
+            return
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+        self._thread = None
+
+    def _next(self):
+        with self._condition:
+            while not self._pending and self._running:
+                self._condition.wait()
+            if not self._pending:
+                return None
+            key, (action, submitted_at) = self._pending.popitem(last=False)
+            metrics.set_gauge("action_queue_depth", len(self._pending))
+        return key, action, submitted_at
+
+    def _run(self):
+        while (pending := self._next()) is not None:
+            key, action, submitted_at = pending
+            now = perf_counter()
+            last_run = self._last_run.get(key)
+            if last_run is not None and now - last_run < self.refractory_period:
+                self.rate_limited += 1
+                metrics.inc("actions_rate_limited_total")
+                continue
+            self._last_run[key] = now
+            try:
+                action.execute()
+            except Exception as e:
+                logger.error(f"Action {action.name} failed: {e}", exc_info=1)
+                continue
+            self.executed += 1
+            if self.on_executed is not None:
+                try:
+                    self.on_executed(key, action, submitted_at)
+                except Exception as e:
+                    logger.error(f"on_executed callback for action {action.name} failed: {e}", exc_info=1)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+# Prediction: string of prediction made. Actionset: dict of prediction string to Action
+# Output: the Action for that prediction, or None if there is none
 def getaction(prediction, actionset):
-    pass
+    return actionset.get(prediction)
 
 
 def main():
@@ -0,0 +1,216 @@
+"""Headless QA reports for a whole archive of recordings.
+
+`write_reports` finds every recording folder under a root directory - single-device recordings, and the
+device folders inside recording sessions - and renders each one's `plot_timeseries_dataframe` figure to a
+PNG along with its summary statistics. Recordings are spread over a pool of worker processes, each using
+matplotlib's non-interactive Agg backend. The outputs mirror the archive's folder structure:
+
+    <output root>/<recording folder>/timeseries.png
+    <output root>/<recording folder>/stats.json
+    <output root>/summary.json
+
+A recording whose outputs are newer than every file in its folder is skipped, so reruns only process new
+or changed recordings.
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict
+
+import numpy as np
+
+from synapp.core.logging import logger
+from synapp.core.metrics import count_missing_samples
+from synapp.core.recording import Recording, find_recordings
+
+FIGURE_FILE = "timeseries.png"
+STATS_FILE = "stats.json"
+SUMMARY_FILE = "summary.json"
+DEFAULT_OUTPUT_FOLDER = "reports"
+DEFAULT_DPI = 100
+STATS_BLOCK_SIZE = 1 << 20  # samples read at a time
+LINE_NOISE_BANDS = {"50Hz": (49, 51), "60Hz": (59, 61)}
+PSD_SEGMENT_DURATION = 2.0  # sec
+
+
+def estimate_sample_rate(timestamps) -> float:
+    """Sample rate from the median interval between timestamps, for recordings that don't record it"""
+    if len(timestamps) < 2:
+        return 0.0
+    return float(1 / np.median(np.diff(timestamps[:STATS_BLOCK_SIZE])))
+
+
+def recording_stats(recording: Recording) -> dict:
+    """Summary statistics of a recording, reading its samples a block at a time.
+
+    Returns:
+        dict -- Duration, sample counts and samples found missing from timestamp gaps, and per channel the RMS
+                (about the channel's mean) and the power in each `LINE_NOISE_BANDS` band
+    """
+    from synapp.core.spectral import band_power, welch_psd
+
+    num_samples = len(recording)
+    sample_rate = recording.sample_rate or estimate_sample_rate(recording.timestamps)
+    num_channels = len(recording.channels)
+    sums = np.zeros(num_channels)
+    squares = np.zeros(num_channels)
+    dropped_samples = 0
+    previous_timestamp = None
+    for start in range(0, num_samples, STATS_BLOCK_SIZE):
+        samples = np.asarray(recording.samples[start : start + STATS_BLOCK_SIZE], dtype=np.float64)
+        timestamps = np.asarray(recording.timestamps[start : start + STATS_BLOCK_SIZE], dtype=np.float64)
+        sums += samples.sum(axis=0)
+        squares += np.square(samples).sum(axis=0)
+        dropped_samples += count_missing_samples(timestamps, sample_rate, previous_timestamp=previous_timestamp)
+        previous_timestamp = timestamps[-1]
+
+    channels = {name: {"rms": 0.0, "line_noise_power": {}} for name in recording.channels}
+    if num_samples > 0:
+        means = sums / num_samples
+        rms = np.sqrt(np.maximum(squares / num_samples - means**2, 0))
+        bands = {name: band for name, band in LINE_NOISE_BANDS.items() if band[1] < sample_rate / 2}
+        psd, frequencies = welch_psd(
+            recording.samples.T, sample_rate, segment_length=int(PSD_SEGMENT_DURATION * sample_rate)
+        )
+        powers = band_power(psd, frequencies, bands)
+        for i, name in enumerate(recording.channels):
+            channels[name]["rms"] = float(rms[i])
+            channels[name]["line_noise_power"] = {band: float(power[i]) for band, power in powers.items()}
+
+    return {
+        "device": recording.info.get("device"),
+        "sample_rate": float(sample_rate),
+        "num_samples": num_samples,
+        "duration (s)": recording.duration,
+        "dropped_samples": dropped_samples,
+        "channels": channels,
+    }
+
+
+def _newest_modification_time(folder: str) -> float:
+    return max((entry.stat().st_mtime for entry in os.scandir(folder) if entry.is_file()), default=0.0)
+
+
+def is_up_to_date(folder: str, output_folder: str) -> bool:
+    """Whether a recording's report was written after every file in the recording folder last changed."""
+    stats_path = os.path.join(output_folder, STATS_FILE)
+    if not os.path.exists(stats_path):
+        return False
+    with open(stats_path) as f:
+        figure = json.load(f).get("figure")
+    if figure is not None and not os.path.exists(os.path.join(output_folder, figure)):
+        return False
+    return os.path.getmtime(stats_path) >= _newest_modification_time(folder)
+
+
+def _write_json(path: str, content: dict):
+    # Written then renamed, so an interrupted run never leaves a half-written file that looks up to date
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(content, f, indent=2, sort_keys=True)
+    os.replace(temporary_path, path)
+
+
+def write_report(folder: str, output_folder: str, title: str = None, dpi: int = DEFAULT_DPI) -> dict:
+    """Write one recording's figure and statistics.
+
+    Arguments:
+        folder {str} -- Recording folder
+        output_folder {str} -- Folder to write `timeseries.png` and `stats.json` to
+
+    Keyword Arguments:
+        title {str} -- Title of the figure. Defaults to the folder name (default: {None})
+        dpi {int} -- Resolution of the figure (default: {100})
+
+    Returns:
+        dict -- The statistics written
+    """
+    import matplotlib.pyplot as plt
+
+    from synapp.core.plotting import plot_timeseries_dataframe
+
+    os.makedirs(output_folder, exist_ok=True)
+    recording = Recording(folder)
+    stats = recording_stats(recording)
+    stats["figure"] = None
+    if len(recording) > 0:
+        figure = plot_timeseries_dataframe(
+            recording, stats["sample_rate"], title=title or os.path.basename(folder), show=False
+        )
+        figure_path = os.path.join(output_folder, FIGURE_FILE)
+        temporary_path = f"{figure_path}.{os.getpid()}.tmp"
+        try:
+            figure.savefig(temporary_path, dpi=dpi, format="png")
+        finally:
+            plt.close(figure)
+        os.replace(temporary_path, figure_path)
+        stats["figure"] = FIGURE_FILE
+    # Last, as its modification time marks the report as complete
+    _write_json(os.path.join(output_folder, STATS_FILE), stats)
+    return stats
+
+
+def _use_agg_backend():
+    import matplotlib
+
+    matplotlib.use("Agg", force=True)
+
+
+def write_reports(
+    root: str, output_root: str = None, max_workers: int = None, force: bool = False, dpi: int = DEFAULT_DPI
+) -> Dict[str, dict]:
+    """Write a report for every recording under `root` that doesn't have an up-to-date one yet.
+
+    Arguments:
+        root {str} -- Folder to search for recordings
+
+    Keyword Arguments:
+        output_root {str} -- Folder to write the reports to. Defaults to a "reports" folder in `root` (default: {None})
+        max_workers {int} -- Worker processes. Defaults to one per CPU (default: {None})
+        force {bool} -- Whether to rewrite reports that are already up to date (default: {False})
+        dpi {int} -- Resolution of the figures (default: {100})
+
+    Returns:
+        Dict[str, dict] -- Every recording's statistics by folder relative to `root`, also written to
+                           `summary.json`. Recordings that failed have an "error" instead
+    """
+    output_root = output_root or os.path.join(root, DEFAULT_OUTPUT_FOLDER)
+    output_root_path = os.path.abspath(output_root)
+    folders = [
+        folder
+        for folder in find_recordings(root)
+        if os.path.commonpath([os.path.abspath(folder), output_root_path]) != output_root_path
+    ]
+    output_folders = {folder: os.path.join(output_root, os.path.relpath(folder, root)) for folder in folders}
+    pending = [folder for folder in folders if force or not is_up_to_date(folder, output_folders[folder])]
+    logger.info(f"Found {len(folders)} recordings, {len(folders) - len(pending)} already have up-to-date reports")
+
+    summary = {}
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_use_agg_backend) as executor:
+            futures = {
+                executor.submit(
+                    write_report, folder, output_folders[folder], os.path.relpath(folder, root), dpi
+                ): folder
+                for folder in pending
+            }
+            for future in as_completed(futures):
+                folder = futures[future]
+                try:
+                    future.result()
+                    logger.info(f"Wrote report for {folder}")
+                except Exception as e:
+                    logger.error(f"Report for {folder} failed: {e}")
+                    summary[os.path.relpath(folder, root)] = {"error": str(e)}
+
+    for folder in folders:
+        name = os.path.relpath(folder, root)
+        stats_path = os.path.join(output_folders[folder], STATS_FILE)
+        if name not in summary and os.path.exists(stats_path):
+            with open(stats_path) as f:
+                summary[name] = json.load(f)
+
+    os.makedirs(output_root, exist_ok=True)
+    _write_json(os.path.join(output_root, SUMMARY_FILE), summary)
+    return dict(sorted(summary.items()))
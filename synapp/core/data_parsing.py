@@ -1,9 +1,19 @@
 #!/usr/bin/env python
 
+import weakref
+
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from synapp.core import metrics
+from synapp.core.markers import MarkerIndex
+from synapp.core.ring_buffer import RingBuffer
+from synapp.core.spectral import amplitude_spectrum
+from synapp.core.ssvep import target_frequency_power
 
 DEFAULT_NUM_SAMPLES = 128
 DEFAULT_NUM_TILES = 5
+EPOCH_GATHER_TRIALS = 256  # trials gathered at a time by get_epochs
 
 
 def get_data_window_after_time(time, timestamps, samples, num_samples=DEFAULT_NUM_SAMPLES):
@@ -47,34 +57,88 @@ def tile_window(window, numtiles=DEFAULT_NUM_TILES):
     return np.tile(window, numtiles)
 
 
+def get_epochs(
+    event_times, timestamps, samples, samples_per_trial=DEFAULT_NUM_SAMPLES, out_of_range="pad", dtype=np.float32
+):
+    """ Gather the window of samples_per_trial samples after every event time, all at once.
+
+    Windows start at the first sample after each event time, like `get_data_window_after_time`. All events
+    are located with a single searchsorted, and in-range windows are gathered from a zero-copy sliding
+    window view into the preallocated output, `EPOCH_GATHER_TRIALS` at a time.
+
+    Arguments:
+        event_times {np.ndarray} -- Times to take windows after, e.g. marker timestamps
+        timestamps {np.ndarray} -- Timestamps of the samples, shape (samples,)
+        samples {np.ndarray} -- Data of shape (channels, samples)
+
+    Keyword Arguments:
+        samples_per_trial {int} -- Length of each window (default: {128})
+        out_of_range {str} -- "pad" to zero-fill windows that run past the end of the data,
+                              or "drop" to leave them out of the output (default: {"pad"})
+        dtype -- dtype of the output (default: {np.float32})
+
+    Returns:
+        tuple[np.ndarray, np.ndarray] -- (epochs of shape (trials, channels, samples_per_trial),
+                                          boolean mask over event_times of the complete windows)
+    """
+    if out_of_range not in ("pad", "drop"):
+        raise ValueError(f"out_of_range must be 'pad' or 'drop', got {out_of_range}")
+
+    samples = np.asarray(samples)
+    num_channels, num_samples = samples.shape
+    start_indices = np.searchsorted(timestamps, np.asarray(event_times), side="right")
+    in_range = start_indices + samples_per_trial <= num_samples
+
+    if out_of_range == "drop":
+        start_indices = start_indices[in_range]
+    epochs = np.zeros((len(start_indices), num_channels, samples_per_trial), dtype=dtype)
+    if num_samples < samples_per_trial:
+        if out_of_range == "pad":
+            _copy_partial_windows(epochs, samples, start_indices, np.arange(len(start_indices)))
+        return epochs, in_range
+
+    # (windows, channels, samples_per_trial) view, so each trial is a single index along axis 0.
+    # Fancy indexing only reads the selected windows; np.take would first copy the whole view. It makes a
+    # temporary in the samples' dtype though, so gather a block of trials at a time to keep that small
+    windows = sliding_window_view(samples, samples_per_trial, axis=1).transpose(1, 0, 2)
+    window_indices = np.minimum(start_indices, num_samples - samples_per_trial)
+    for start in range(0, len(window_indices), EPOCH_GATHER_TRIALS):
+        block = slice(start, start + EPOCH_GATHER_TRIALS)
+        epochs[block] = windows[window_indices[block]]
+
+    if out_of_range == "pad" and not in_range.all():
+        partial = np.flatnonzero(~in_range)
+        epochs[partial] = 0
+        _copy_partial_windows(epochs, samples, start_indices, partial)
+
+    return epochs, in_range
+
+
+def _copy_partial_windows(epochs, samples, start_indices, trial_indices):
+    """ Copy whatever data exists for windows running past the end, leaving the rest zero-filled """
+    for trial in trial_indices:
+        available = samples[:, start_indices[trial] : start_indices[trial] + epochs.shape[2]]
+        epochs[trial, :, : available.shape[1]] = available
+
+
 # Input: Set of markers and timestamps, as well as the data samples
 # Output: 3d array of (trials, channels, samples) where the trials index is the same index as the marker. can directly use as X_train (or X_test)
 # (so markers[5] will correspond to the chunk of data at output[5], which will be the window of data over all channels, num_samples after the marker occurs
-def get_ML_set_from_data(markers, timestamps, samples, samples_per_trial=DEFAULT_NUM_SAMPLES):
-    X_outputshape = (markers.shape[0], samples.shape[0], samples_per_trial)
-    X_output = np.zeros(X_outputshape)
-    Y_output = markers[:]["marker"]
-
-    for i in range(0, markers.shape[0]):
-        print(markers[i]["timestamp"])
-        samplewindow, s_index = get_data_window_after_time(
-            markers[i]["timestamp"], timestamps, samples, samples_per_trial
+# Trials without enough data after the marker are zero-padded, or left out with out_of_range="drop"
+def get_ML_set_from_data(
+    markers, timestamps, samples, samples_per_trial=DEFAULT_NUM_SAMPLES, out_of_range="pad", return_mask=False
+):
+    with metrics.timer("epoching_seconds"):
+        X_output, in_range = get_epochs(
+            markers["timestamp"], timestamps, samples, samples_per_trial, out_of_range=out_of_range
         )
-        print(np.shape(samplewindow))
-        # indicestoremove = []
-        if samplewindow is None:
-            print(
-                "Attempt to get data from marker {0} at timestamp {1} failed.".format(
-                    markers[i, "marker"], markers[i, "timestamp"]
-                )
-            )
-        else:
-            X_output[i] = samplewindow
+    Y_output = markers["marker"] if out_of_range == "pad" else markers["marker"][in_range]
 
+    if return_mask:
+        return X_output, Y_output, in_range
     return X_output, Y_output
 
 
-
 def untile_window(tiled_window, original_size, num_tiles=DEFAULT_NUM_TILES):
     """ Take a window of data that has been tiled and take the center to return it
         to the same size as original data with no repetition.
@@ -86,29 +150,20 @@ def untile_window(tiled_window, original_size, num_tiles=DEFAULT_NUM_TILES):
 
 
 def get_FFT_from_timeseries(data, sample_rate=256):
-    """ From a single time-series array, get the amplitudes and frequencies from performing an FFT. """
-    data = np.asarray(data)
-    fft_array = np.fft.fft(data / len(data))  # Gives complex numbers, including imaginary "phase" component
-    amplitude_array = abs(
-        fft_array
-    )  # Abs of complex number is amplitude component, gives two-sided frequency array of positive values
-    amplitude_array_range = np.arange(len(amplitude_array))  # make array from 0 to length of data
-    epoch_number = len(fft_array) / sample_rate  # divide each value by how many seconds of data
-    total_frequency = amplitude_array_range / epoch_number  # both-sided frequency range
-    positive_frequency = total_frequency[range(int(len(amplitude_array) / 2))]  # one side frequency range of frequency
-    positive_amplitudes = amplitude_array[range(int(len(amplitude_array) / 2))]  # one side array of hz power values
-
-    return positive_amplitudes, positive_frequency
+    """ From a time-series array, get the amplitudes and frequencies from performing an FFT.
+    Also accepts an array of shape (channels, samples), and transforms every channel at once.
+    """
+    return amplitude_spectrum(data, sample_rate)
 
 
 def ssvep_eval(samples, possible_freqs, sample_rate=256):
-    """ Basic heuristic estimate which SSVEP frequency is most likely from the provided data. """
-    amplitudes, frequencies = get_FFT_from_timeseries(samples, sampleRate=sample_rate)
-    closest_indices = []
-    for freq in possible_freqs:
-        closest_indices.append(nearest_index(freq, frequencies))
-    ssvep_amplitudes = amplitudes[closest_indices]
-    max_ssvep = np.argmax(ssvep_amplitudes)
+    """ Basic heuristic estimate which SSVEP frequency is most likely from the provided data.
+    Only the power at the candidate frequencies is computed, summed over channels for (channels, samples) data.
+    """
+    ssvep_power = target_frequency_power(samples, possible_freqs, sample_rate=sample_rate)
+    if ssvep_power.ndim > 1:
+        ssvep_power = ssvep_power.sum(axis=0)
+    max_ssvep = np.argmax(ssvep_power)
     predicted_freq = possible_freqs[max_ssvep]
     return predicted_freq
 
@@ -125,27 +180,98 @@ def slide_window(old_samples, new_samples):
     if you have [0, 3, 6, 1, 5] and new_samples is [2, 9], output will be [6, 1, 5, 2, 9]
     data should be of shape (channels, samples]
     """
-    output_samples = None
     window_length = np.shape(old_samples)[1]
     new_samples_length = np.shape(new_samples)[1]
-    if new_samples_length <= window_length:
-        output_samples = np.zeros(shape=(np.shape(old_samples)))
-        new_start_index = window_length - new_samples_length
-        output_samples[:, 0:new_start_index] = old_samples[:, new_samples_length:]
-        output_samples[:, new_start_index:] = new_samples
-    output_samples = new_samples[:, new_samples_length-window_length:]
-    return output_samples
+    if new_samples_length >= window_length:
+        return new_samples[:, new_samples_length - window_length :]
+    return np.concatenate((old_samples[:, new_samples_length:], new_samples), axis=1)
+
+
+def get_sliding_windows(samples, window_length=DEFAULT_NUM_SAMPLES, hop=1):
+    """ Every window of window_length samples, starting every hop samples, as a zero-copy view.
+
+    Arguments:
+        samples {np.ndarray} -- Data of shape (channels, samples)
+
+    Keyword Arguments:
+        window_length {int} -- Samples per window (default: {128})
+        hop {int} -- Samples between the starts of consecutive windows (default: {1})
+
+    Returns:
+        np.ndarray -- Read-only view of shape (windows, channels, window_length), in the same
+                      (trials, channels, samples) layout as `get_ML_set_from_data`
+    """
+    samples = np.asarray(samples)
+    if samples.shape[1] < window_length:
+        return np.empty((0, samples.shape[0], window_length), dtype=samples.dtype)
+    return sliding_window_view(samples, window_length, axis=1)[:, ::hop].transpose(1, 0, 2)
+
+
+def iter_buffer_windows(
+    buffer: RingBuffer, window_length=DEFAULT_NUM_SAMPLES, hop=DEFAULT_NUM_SAMPLES // 2, timeout=None
+):
+    """ Yield overlapping windows from a live ring buffer as samples arrive.
+
+    Each window is a zero-copy view into the buffer, valid until the buffer wraps past it, so consume
+    (or copy) it before requesting the next one. If the consumer falls so far behind that a window has
+    been overwritten, it skips ahead to the newest complete window.
+
+    Keyword Arguments:
+        window_length {int} -- Samples per window (default: {128})
+        hop {int} -- Samples between the starts of consecutive windows (default: {64})
+        timeout {float} (sec) -- Stop if no new window completes within this time. None waits forever (default: {None})
+
+    Raises:
+        ValueError: If a window plus a hop doesn't fit in the buffer, so skipping ahead could never catch up
+
+    Yields:
+        tuple[np.ndarray, np.ndarray] -- (timestamps of shape (window_length,), samples of shape (channels, window_length))
+    """
+    # Checked here rather than in the generator, so bad arguments fail when called rather than on first use
+    if window_length + hop > buffer.capacity:
+        raise ValueError(
+            f"A window of {window_length} samples plus a hop of {hop} does not fit in a buffer of {buffer.capacity}"
+        )
+    return _iter_buffer_windows(buffer, window_length, hop, timeout)
+
+
+def _iter_buffer_windows(buffer: RingBuffer, window_length, hop, timeout):
+    window_end = max(buffer.total_written, window_length)
+    while buffer.wait_for(window_end, timeout=timeout):
+        try:
+            with metrics.timer("epoching_seconds"):
+                window = buffer.span(window_end - window_length, window_end)
+        except IndexError:
+            # Overwritten before we got to it: skip to the newest window on the hop grid
+            behind = buffer.total_written - window_end
+            window_end += behind - behind % hop
+            metrics.inc("windows_skipped_total", behind // hop)
+            continue
+        yield window
+        window_end += hop
 
 
 def get_markers_between_timestamps(start, end, markers):
-    """ Returns an np array of markers objects which fall between the start and end timestamps """
-    markers_timestamps = []
-    markers_corresponding_strings = []
-    if end >= start:
-        for markerobj in markers:
-            if start <= markerobj["timestamp"] < end:
-                markers_timestamps.append(markerobj["timestamp"])
-                markers_corresponding_strings.append(markerobj["marker"])
-                print(markers_corresponding_strings)
-
-    return np.asarray(markers_timestamps), np.asarray(markers_corresponding_strings)
+    """ Returns np arrays of the timestamps and strings of markers which fall between the start and end timestamps.
+    A marker array is sorted into a `MarkerIndex` on its first query and the index reused after that, so replace
+    the array rather than editing it in place. Other sequences of markers are indexed on every call; pass a
+    `MarkerIndex` to avoid that.
+    """
+    timestamps, labels = _marker_index(markers).between(start, end)
+    # Copies, as plain arrays like np.asarray of the matching markers, e.g. string labels rather than objects
+    return np.array(timestamps), np.asarray(labels.tolist())
+
+
+# id of each marker array queried -> (weak reference to it, its MarkerIndex). Entries go with their arrays
+_marker_indexes = {}
+
+
+def _marker_index(markers) -> MarkerIndex:
+    if isinstance(markers, MarkerIndex) or not isinstance(markers, np.ndarray):
+        return MarkerIndex.from_markers(markers)
+    key = id(markers)
+    cached = _marker_indexes.get(key)
+    if cached is None or cached[0]() is not markers:
+        reference = weakref.ref(markers, lambda _, key=key: _marker_indexes.pop(key, None))
+        cached = _marker_indexes[key] = (reference, MarkerIndex.from_markers(markers))
+    return cached[1]
@@ -0,0 +1,168 @@
+"""Training datasets streamed from recording folders.
+
+Recordings are read through memory-mapped `Recording`s one block at a time, filtered with a `FilterBank`
+that carries its state across blocks, and cut into float32 epochs after each saved marker. Only one block
+per recording is in memory at once, so archives larger than RAM can be trained on. `make_dataset` wraps
+the epochs in a shuffled, batched and prefetched `tf.data.Dataset` for `getmodel` / `EEGNet_SynApp`.
+"""
+
+import numpy as np
+
+from synapp.core.data_parsing import get_epochs
+from synapp.core.filtering import FilterBank
+from synapp.core.recording import Recording
+
+DEFAULT_SAMPLES_PER_TRIAL = 128
+DEFAULT_BLOCK_DURATION = 60.0  # sec
+DEFAULT_SAMPLE_RATE = 256
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_SHUFFLE_BUFFER = 4096
+DEFAULT_CYCLE_LENGTH = 8
+
+
+def get_label_map(folders):
+    """Map every marker string found in the recordings to a class number, in sorted order"""
+    labels = set()
+    for folder in folders:
+        labels.update(Recording(folder).markers["marker"].tolist())
+    return {label: i for i, label in enumerate(sorted(labels))}
+
+
+def iter_recording_epochs(
+    folder,
+    label_map,
+    samples_per_trial=DEFAULT_SAMPLES_PER_TRIAL,
+    channels=None,
+    filter_settings=None,
+    block_duration=DEFAULT_BLOCK_DURATION,
+):
+    """Yield (epoch, label) pairs from one recording folder, in time order.
+
+    Each epoch is the samples_per_trial samples after a marker, like `data_parsing.get_ML_set_from_data`,
+    taken from the causally filtered signal. Markers without a full window of data after them, and markers
+    missing from label_map, are skipped.
+
+    Arguments:
+        folder {str} -- Recording folder with a markers file, see `recording.write_markers`
+        label_map {dict} -- Marker string to class number, e.g. from `get_label_map`
+
+    Keyword Arguments:
+        samples_per_trial {int} -- Length of each epoch (default: {128})
+        channels {list[str]} -- Channels to use, in order. Defaults to every channel (default: {None})
+        filter_settings {dict} -- Keyword arguments for `FilterBank`. The sample rate defaults to the
+                                  recording's. Pass False to skip filtering (default: {None})
+        block_duration {float} -- Seconds of data read and filtered at a time (default: {60.0})
+
+    Yields:
+        tuple[np.ndarray, int] -- (float32 epoch of shape (channels, samples_per_trial), class number)
+    """
+    recording = Recording(folder)
+    markers = recording.markers
+    known = np.isin(markers["marker"], list(label_map))
+    order = np.argsort(markers["timestamp"][known], kind="stable")
+    event_times = markers["timestamp"][known][order]
+    labels = np.array([label_map[marker] for marker in markers["marker"][known][order]], dtype=np.int64)
+    if len(event_times) == 0 or len(recording) < samples_per_trial:
+        return
+
+    channel_indices = slice(None) if channels is None else [recording.channels.index(channel) for channel in channels]
+    sample_rate = recording.sample_rate or DEFAULT_SAMPLE_RATE
+    filter_bank = None
+    if filter_settings is not False:
+        filter_bank = FilterBank(**{"sample_rate": sample_rate, **(filter_settings or {})})
+
+    # Sample index each epoch ends at (exclusive), so epochs can be emitted once their last block is read
+    epoch_ends = np.searchsorted(recording.timestamps, event_times, side="right") + samples_per_trial
+    block_size = max(int(block_duration * sample_rate), samples_per_trial)
+
+    carried_timestamps = np.empty(0)
+    carried_samples = None
+    for block_start in range(0, len(recording), block_size):
+        block_end = min(block_start + block_size, len(recording))
+        timestamps = np.asarray(recording.timestamps[block_start:block_end])
+        samples = np.asarray(recording.samples[block_start:block_end, channel_indices], dtype=np.float64).T
+        if filter_bank is not None:
+            samples = filter_bank.filter(samples)
+
+        # Keep the end of the previous block, so epochs can straddle the boundary
+        if carried_samples is not None:
+            timestamps = np.concatenate([carried_timestamps, timestamps])
+            samples = np.concatenate([carried_samples, samples], axis=1)
+
+        ready = (epoch_ends > block_start) & (epoch_ends <= block_end)
+        if ready.any():
+            epochs, _ = get_epochs(event_times[ready], timestamps, samples, samples_per_trial, out_of_range="drop")
+            yield from zip(epochs, labels[ready])
+
+        carried_timestamps = timestamps[-samples_per_trial:]
+        carried_samples = samples[:, -samples_per_trial:]
+
+
+def make_dataset(
+    folders,
+    label_map=None,
+    samples_per_trial=DEFAULT_SAMPLES_PER_TRIAL,
+    channels=None,
+    filter_settings=None,
+    batch_size=DEFAULT_BATCH_SIZE,
+    shuffle_buffer=DEFAULT_SHUFFLE_BUFFER,
+    add_channel_axis=False,
+    seed=None,
+    block_duration=DEFAULT_BLOCK_DURATION,
+    cycle_length=DEFAULT_CYCLE_LENGTH,
+):
+    """Build a `tf.data.Dataset` of (epochs, labels) batches streamed from recording folders.
+
+    Recordings are read in parallel and their epochs interleaved, then shuffled, batched and prefetched.
+    Requires TensorFlow.
+
+    Arguments:
+        folders {list[str]} -- Recording folders with markers files
+
+    Keyword Arguments:
+        label_map {dict} -- Marker string to class number. Defaults to `get_label_map(folders)` (default: {None})
+        samples_per_trial {int} -- Length of each epoch (default: {128})
+        channels {list[str]} -- Channels to use, in order. Every recording must have them (default: {None})
+        filter_settings {dict} -- See `iter_recording_epochs` (default: {None})
+        batch_size {int} -- Epochs per batch (default: {32})
+        shuffle_buffer {int} -- Epochs held in the shuffle buffer. 0 disables shuffling (default: {4096})
+        add_channel_axis {bool} -- Add a trailing axis of size 1, the input shape EEGNet_SynApp expects (default: {False})
+        seed {int} -- Shuffle seed (default: {None})
+        block_duration {float} -- Seconds of data read and filtered at a time (default: {60.0})
+        cycle_length {int} -- Recordings read concurrently, and interleaved epoch by epoch (default: {8})
+
+    Returns:
+        tf.data.Dataset -- Batches of (float32 epochs of shape (batch, channels, samples_per_trial[, 1]), int64 labels)
+    """
+    import tensorflow as tf
+
+    folders = [str(folder) for folder in folders]
+    label_map = get_label_map(folders) if label_map is None else label_map
+    num_channels = len(channels) if channels is not None else len(Recording(folders[0]).channels)
+
+    def epochs_from_folder(folder):
+        return iter_recording_epochs(
+            folder.decode(), label_map, samples_per_trial, channels, filter_settings, block_duration
+        )
+
+    def read_folder(folder):
+        return tf.data.Dataset.from_generator(
+            epochs_from_folder,
+            args=(folder,),
+            output_signature=(
+                tf.TensorSpec(shape=(num_channels, samples_per_trial), dtype=tf.float32),
+                tf.TensorSpec(shape=(), dtype=tf.int64),
+            ),
+        )
+
+    dataset = tf.data.Dataset.from_tensor_slices(folders).interleave(
+        read_folder,
+        cycle_length=min(len(folders), cycle_length),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=seed is not None,
+    )
+    if add_channel_axis:
+        dataset = dataset.map(lambda epoch, label: (epoch[..., tf.newaxis], label), num_parallel_calls=tf.data.AUTOTUNE)
+    if shuffle_buffer:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed)
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
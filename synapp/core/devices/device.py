@@ -1,20 +1,22 @@
 import asyncio
+import concurrent.futures
 import os
 import pickle
 import threading
 from abc import ABCMeta
+from contextlib import contextmanager
 from dataclasses import dataclass
-from time import time
+from time import sleep, time
 from typing import Callable, Dict, List
 
-import pandas as pd
-from muselsl.muse import Muse
-from yaml import safe_dump
+import numpy as np
 
+from synapp.core import metrics
 from synapp.core.utilities import get_time_string
 from synapp.core.logging import logger
-
-from synapp.misc.tqdm_provider import tqdm
+from synapp.core.recording import DEFAULT_FLUSH_INTERVAL, RecordingWriter, write_recording_info
+from synapp.core.ring_buffer import RingBuffer
+from synapp.core.streaming import DEFAULT_QUEUE_SIZE, ChunkQueue
 
 
 class DeviceStreamer(metaclass=ABCMeta):
@@ -26,6 +28,10 @@ class DeviceStreamer(metaclass=ABCMeta):
 
 
 class Device:
+    # What `astream` does with a full queue by default. Hardware keeps sending whether or not anyone keeps up,
+    # and stalling a driver thread can hold up other devices' samples too, so drop the oldest chunks
+    stream_overflow = "drop_oldest"
+
     def __init__(
         self,
         name: str,
@@ -37,11 +43,45 @@ class Device:
         self.channel_count_list = channel_count_list
 
     def stream(self, block=False, callback: Callable = None):
+        """Start streaming, passing each chunk to `callback(samples, timestamps)`.
+
+        Returns:
+            A streamer with a `stop_streaming` method
+        """
         pass
 
     def record(self, folder, recording_time, block=False, notes=None):
         pass
 
+    async def arecord(self, folder, recording_time, notes=None) -> str:
+        """Record without blocking the event loop. Defaults to running `record` on a worker thread."""
+        return await asyncio.to_thread(self.record, folder, recording_time, block=True, notes=notes)
+
+    async def astream(self, queue_size: int = DEFAULT_QUEUE_SIZE, overflow: str = None):
+        """Stream from the device as an async iterator of `Chunk(samples, timestamps)`.
+
+        Chunks are handed over through a bounded `ChunkQueue`, so filtering, inference and actions can run as
+        concurrent tasks in one event loop. The stream stops when the iterator is closed; wrap it in
+        `contextlib.aclosing` to stop as soon as the `async for` loop is left.
+
+        Keyword Arguments:
+            queue_size {int} -- Most chunks held while the consumer is busy (default: {64})
+            overflow {str} -- What to do with a full queue, "block" or "drop_oldest", see `ChunkQueue`.
+                              Defaults to the device's `stream_overflow` (default: {None})
+        """
+        chunks = ChunkQueue(queue_size, overflow or self.stream_overflow)
+        streamer = await asyncio.to_thread(self.stream, callback=chunks.put_threadsafe)
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            chunks.close()
+            await asyncio.to_thread(streamer.stop_streaming)
+
+    def channel_names(self) -> List[str]:
+        """Names of the channels recorded from this device, in the order its callback delivers them."""
+        return [f"channel_{i}" for i in range(self.channel_count_list[0])]
+
     def folder_label(self, time_string):
         return f"{time_string or get_time_string()}_{self._simplify_name()}"
 
@@ -63,6 +103,32 @@ class Device:
             return device
 
 
+# How many flush intervals worth of samples the recording buffer holds
+RECORDING_BUFFER_FLUSH_INTERVALS = 4
+# How often the device thread lets the driver deliver samples, and async recordings check whether to stop
+DEVICE_POLL_INTERVAL = 0.1  # sec
+# muselsl's bleak backend runs every connection on one module-level event loop, which only one thread may
+# drive at a time. Any thread pumping it delivers samples for every connected Muse.
+_MUSELSL_LOCK = threading.RLock()
+# Threads waiting to connect or disconnect. Pumping threads stand aside for them, since lock handoff isn't fair
+_muselsl_waiting = 0
+_muselsl_waiting_lock = threading.Lock()
+
+
+@contextmanager
+def _muselsl_exclusive():
+    """Hold muselsl's event loop for a connect or disconnect, ahead of threads that only pump it"""
+    global _muselsl_waiting
+    with _muselsl_waiting_lock:
+        _muselsl_waiting += 1
+    try:
+        with _MUSELSL_LOCK:
+            yield
+    finally:
+        with _muselsl_waiting_lock:
+            _muselsl_waiting -= 1
+
+
 class MuseDevice(Device):
     def __init__(self, name, mac_address):
         super().__init__(name, sampling_rate=256, channel_count_list=[4, 5])
@@ -77,28 +143,113 @@ class MuseDevice(Device):
             recording_time {float} (sec) -- Number of seconds to record for
 
         Keyword Arguments:
-            block {bool} -- Whether the script should wait for the recording to finish to continue (default: {True})
+            block {bool} -- Whether the script should wait for the recording to finish to continue. Otherwise,
+                            an `asyncio.Task` (inside a running event loop) or `concurrent.futures.Future`
+                            resolving to the folder is returned (default: {True})
             notes {str} -- Notes to store with the recording (default: {None})
 
         Returns:
-            str -- Directory that the data was stored in.
+            str -- Directory that the data was stored in, or a task/future resolving to it.
         """
         streamer = MuseStreamer()
         return streamer.record(self, folder, recording_time, block=block, notes=notes)
 
+    async def arecord(self, folder, recording_time, notes=None) -> str:
+        return await MuseStreamer().arecord(self, folder, recording_time, notes=notes)
+
+    def channel_names(self) -> List[str]:
+        configuration = DefaultConfigurations.muse
+        return [configuration.electrode_map[i] for i in range(configuration.num_active_channels)]
+
+    def stream(self, block=False, callback: Callable = None) -> "MuseStreamer":
+        streamer = MuseStreamer()
+        streamer.stream(self, callback, block=block)
+        return streamer
+
     def __str__(self):
         return f"Device: {self.name}, Mac Address: {self.mac_address}, Sampling Rate (Hz): {self.sampling_rate}"
 
 
+def _muse_class():
+    """muselsl's Muse, imported on first use since muselsl pulls in pylsl and the bluetooth backends"""
+    global Muse
+    if "Muse" not in globals():
+        from muselsl.muse import Muse
+    return Muse
+
+
+def __getattr__(name):
+    if name == "Muse":
+        return _muse_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 class MuseStreamer:
     def __init__(self):
         self.cancel_recording_event = threading.Event()
         self.muse = None
+        self.buffer: RingBuffer = None
+        self._stop_streaming_event = threading.Event()
+        self._device_thread: threading.Thread = None
 
     def stream(self, muse: MuseDevice, callback: Callable, block=False):
-        self.muse = Muse(address=muse.mac_address, callback_eeg=callback, name=muse.name)
-        self.muse.connect()
-        self.muse.start()
+        """Connect to the device and pass every chunk it sends to `callback(samples, timestamps)`.
+
+        The connection is driven from a background thread, so this works the same from synchronous code and
+        from inside a running event loop.
+
+        Keyword Arguments:
+            block {bool} -- Wait until `stop_streaming` is called, instead of returning once streaming has started (default: {False})
+
+        Raises:
+            ConnectionError -- If the device could not be connected to
+        """
+        self._stop_streaming_event.clear()
+        connected = concurrent.futures.Future()
+        self._device_thread = threading.Thread(
+            target=self._run_device, args=(muse, callback, connected), name=f"MuseStreamer-{muse.name}", daemon=True
+        )
+        self._device_thread.start()
+        # Re-raises anything that went wrong while connecting
+        connected.result()
+        if block:
+            self._device_thread.join()
+
+    def _run_device(self, device: MuseDevice, callback: Callable, connected: concurrent.futures.Future):
+        try:
+            self.muse = _muse_class()(address=device.mac_address, callback_eeg=callback, name=device.name)
+            with _muselsl_exclusive():
+                if self.muse.connect() is False:
+                    raise ConnectionError(f"Could not connect to {device.name} ({device.mac_address})")
+                self.muse.start()
+        except BaseException as e:
+            self.muse = None
+            connected.set_exception(e)
+            return
+        connected.set_result(None)
+
+        try:
+            while not self._stop_streaming_event.is_set():
+                # If another device's thread is already pumping, it delivers this device's samples too
+                if not _muselsl_waiting and _MUSELSL_LOCK.acquire(blocking=False):
+                    try:
+                        _pump_device_events(DEVICE_POLL_INTERVAL)
+                    finally:
+                        _MUSELSL_LOCK.release()
+                else:
+                    self._stop_streaming_event.wait(DEVICE_POLL_INTERVAL)
+        finally:
+            with _muselsl_exclusive():
+                self.muse.stop()
+                self.muse.disconnect()
+            self.muse = None
+
+    def stop_streaming(self):
+        """Stop streaming and disconnect, once the device thread has finished delivering its last chunk."""
+        self._stop_streaming_event.set()
+        if self._device_thread is not None and self._device_thread is not threading.current_thread():
+            self._device_thread.join()
+        self._device_thread = None
 
     def record(
         self,
@@ -106,18 +257,88 @@ class MuseStreamer:
         folder: str,
         recording_time: float = None,
         chunk_duration=None,
-        block=False,
+        block=True,
+        notes: str = None,
+    ):
+        """Record from the device, see `MuseDevice.record`.
+
+        With block=False the recording runs in the background: inside a running event loop an
+        `asyncio.Task` is returned, otherwise a `concurrent.futures.Future`. Either resolves to the folder.
+        """
+        if not block:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="MuseRecording")
+                future = executor.submit(self.record, device, folder, recording_time, chunk_duration, True, notes)
+                executor.shutdown(wait=False)
+                return future
+            return asyncio.ensure_future(self.arecord(device, folder, recording_time, chunk_duration, notes))
+
+        from synapp.misc.tqdm_provider import tqdm
+
+        recording = self._start_recording(device, folder, chunk_duration, notes)
+        start = time()
+        elapsed = 0.0
+        last_num_samples = 0
+        try:
+            with tqdm(total=recording_time, unit="s") as progress_bar:
+                while elapsed < recording_time and not self.cancel_recording_event.wait(
+                    min(1, recording_time - elapsed)
+                ):
+                    elapsed = time() - start
+                    num_samples = self.buffer.total_written
+                    samples_sec = num_samples - last_num_samples
+                    last_num_samples = num_samples
+                    metrics.set_gauge("recording_samples_per_second", samples_sec, device=device.name)
+                    # Progress bar management
+                    progress_bar.update(1)
+                    progress_bar.set_postfix(samples_recorded_sec=f"{samples_sec}", refresh=True)
+                elapsed = time() - start
+        finally:
+            self._finish_recording(*recording, elapsed)
+
+        return recording[0]
+
+    async def arecord(
+        self,
+        device: MuseDevice,
+        folder: str,
+        recording_time: float = None,
+        chunk_duration=None,
         notes: str = None,
     ) -> str:
+        """Record from the device without blocking the event loop, so other stages can run alongside."""
+        recording = await asyncio.to_thread(self._start_recording, device, folder, chunk_duration, notes)
+        start = time()
+        elapsed = 0.0
+        try:
+            while elapsed < recording_time and not self.cancel_recording_event.is_set():
+                await asyncio.sleep(min(DEVICE_POLL_INTERVAL, recording_time - elapsed))
+                elapsed = time() - start
+        finally:
+            # Shielded, so cancelling the task still leaves a complete recording on disk
+            await asyncio.shield(asyncio.to_thread(self._finish_recording, *recording, elapsed))
+
+        return recording[0]
+
+    def _start_recording(self, device: MuseDevice, folder: str, chunk_duration, notes):
+        """Create the recording folder and writer, and start streaming into the ring buffer"""
         self.cancel_recording_event.clear()
-        self.accumulated_data = []
-        self.accumulated_timestamps = []
+        channels = device.channel_names()
+        num_channels = len(channels)
+        flush_interval = chunk_duration or DEFAULT_FLUSH_INTERVAL
+        # Only a few flush intervals need to be held in memory, regardless of recording length
+        capacity = int(np.ceil(flush_interval * RECORDING_BUFFER_FLUSH_INTERVALS * device.sampling_rate))
+        self.buffer = RingBuffer(num_channels, capacity)
+        gaps = metrics.SampleGapCounter(device.sampling_rate, device=device.name)
 
         def process_sample(samples, times):
             """This function is called by the Muse driver when it processes device input."""
-            for ii in range(12):
-                self.accumulated_data.append(samples[:, ii])
-                self.accumulated_timestamps.append(times[ii])
+            with metrics.timer("device_callback_seconds", device=device.name):
+                self.buffer.append(samples[:num_channels], times)
+            metrics.inc("samples_received_total", len(times), device=device.name)
+            gaps.update(times)
 
         # Make a directory for the recordings to go into
         start_timestring = get_time_string()
@@ -128,76 +349,49 @@ class MuseStreamer:
             "device": device.name,
             "recording_started": start_timestring,
             "notes": notes,
+            "sample_rate": device.sampling_rate,
+            "channels": channels,
         }
-
-        with open(os.path.join(current_recording_folder, "recording_info.yaml"), "w") as f:
-            safe_dump(recording_info, f)
-
-        self.muse = Muse(address=device.mac_address, callback_eeg=process_sample, name=device.name)
-        self.muse.connect()
-        self.muse.start()
-        start = time()
-        elapsed = 0.0
-        last_num_samples = 0
+        write_recording_info(current_recording_folder, recording_info)
+
+        writer = RecordingWriter(current_recording_folder, self.buffer, flush_interval=flush_interval)
+        writer.start()
+        try:
+            self.stream(device, process_sample)
+        except BaseException:
+            writer.close()
+            raise
         logger.info("Recording started")
+        return current_recording_folder, recording_info, writer
 
-        with tqdm(total=recording_time, unit="s") as progress_bar:
-            while elapsed < recording_time and not self.cancel_recording_event.is_set():
-                _wait(asyncio.sleep(1))
-                elapsed = time() - start
-                num_samples = len(self.accumulated_timestamps)
-                samples_sec = num_samples - last_num_samples
-                last_num_samples = num_samples
-                # Progress bar management
-                progress_bar.update(1)
-                progress_bar.set_postfix(samples_recorded_sec=f"{samples_sec}", refresh=True)
-
+    def _finish_recording(self, current_recording_folder: str, recording_info: dict, writer: RecordingWriter, elapsed):
         logger.info("Closing recording")
+        self.stop_streaming()
 
-        self.muse.stop()
-        self.muse.disconnect()
-        self.muse = None
-
-        timestamps = self.accumulated_timestamps
-        eeg_samples = self.accumulated_data
-        recording = pd.DataFrame(data=eeg_samples, columns=["TP9", "AF7", "AF8", "TP10", "Right AUX"])
-        recording["timestamps"] = timestamps
-        recording.set_index("timestamps", drop=True, inplace=True)
-
-        # TODO: apply configuration to remove/add Right AUX channel
-        recording.drop(["Right AUX"], axis=1, inplace=True)
-
-        recording.to_pickle(os.path.join(current_recording_folder, "data.pkl"))
+        # Everything flushed so far is already on disk, so an interrupted recording is still usable
+        writer.close()
 
         recording_info.update(
             {
                 "duration (s)": elapsed,
-                "num_samples": len(recording),
-                "sample_rate": device.sampling_rate,
+                "num_samples": writer.num_samples,
             }
         )
-
-        with open(os.path.join(current_recording_folder, "recording_info.yaml"), "w") as f:
-            safe_dump(recording_info, f)
-
+        write_recording_info(current_recording_folder, recording_info)
         logger.info(f"Recording data and metadata saved to {current_recording_folder}")
 
-        return current_recording_folder
-
     def stop_recording(self):
         """If a recording is active, stop it normally. Await the result of the recording process"""
         self.cancel_recording_event.set()
 
-    def stop_streaming(self):
-        if self.muse:
-            self.muse.stop()
-            self.muse.disconnect()
-        self.muse = None
-
 
-def _wait(coroutine):
-    loop = asyncio.get_event_loop()
-    return loop.run_until_complete(coroutine)
+def _pump_device_events(seconds: float):
+    """Sleep, while letting muselsl deliver samples - its bleak backend only does so while its own event loop runs"""
+    try:
+        from muselsl import backends
+    except ImportError:
+        return sleep(seconds)
+    backends.sleep(seconds)
 
 
 class DeviceConfiguration:
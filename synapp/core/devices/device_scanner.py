@@ -1,7 +1,6 @@
 from typing import List
 from synapp.core.devices.device import Device, MuseDevice
-import pygatt
-import muselsl
+from synapp.core.devices.virtual_devices import ReplayDevice, SyntheticDevice
 from synapp.core.logging import logger
 from synapp.core.enums import DeviceType
 
@@ -25,15 +24,22 @@ class DeviceScanner:
 
 class DeviceScannerFactory:
     @staticmethod
-    def create(device_type: str) -> DeviceScanner:
+    def create(device_type: str, **scanner_options) -> DeviceScanner:
+        """Create the scanner for a device type. Options are passed on to the scanner, e.g. the folders to replay."""
         if device_type == DeviceType.muse:
             return MuseDeviceScanner()
         elif device_type == DeviceType.ganglion:
             return GanglionDeviceScanner()
+        elif device_type == DeviceType.synthetic:
+            return SyntheticDeviceScanner(**scanner_options)
+        elif device_type == DeviceType.replay:
+            return ReplayDeviceScanner(**scanner_options)
 
 
 class MuseDeviceScanner(DeviceScanner):
     def scan_for_devices(self) -> List[Device]:
+        import muselsl
+
         try:
             muses = muselsl.list_muses() or []
         except Exception as e:
@@ -52,3 +58,38 @@ class MuseDeviceScanner(DeviceScanner):
 class GanglionDeviceScanner(DeviceScanner):
     def scan_for_devices(self) -> List[Device]:
         ...
+
+
+class SyntheticDeviceScanner(DeviceScanner):
+    """Finds `count` synthetic devices. Their options are passed on to `SyntheticDevice`."""
+
+    def __init__(self, count: int = 1, **device_options):
+        self.count = count
+        self.device_options = device_options
+
+    def scan_for_devices(self) -> List[Device]:
+        options = dict(self.device_options)
+        name = options.pop("name", "Synthetic")
+        seed = options.pop("seed", None)
+        devices = []
+        for i in range(self.count):
+            devices.append(
+                SyntheticDevice(
+                    name=name if self.count == 1 else f"{name} {i + 1}",
+                    # Seeded devices still each get their own noise
+                    seed=None if seed is None else seed + i,
+                    **options,
+                )
+            )
+        return devices
+
+
+class ReplayDeviceScanner(DeviceScanner):
+    """Finds one replay device per recording folder. Their options are passed on to `ReplayDevice`."""
+
+    def __init__(self, folders: List[str] = (), **device_options):
+        self.folders = list(folders)
+        self.device_options = device_options
+
+    def scan_for_devices(self) -> List[Device]:
+        return [ReplayDevice(folder, **self.device_options) for folder in self.folders]
@@ -0,0 +1,285 @@
+"""Record several devices at once into one synchronized session folder.
+
+Each device streams on its own thread into its own `RingBuffer`, drained by its own `RecordingWriter`, so
+throughput scales with the number of devices. Every chunk's timestamps are mapped onto one shared
+monotonic clock as they arrive, so samples from different headsets can be compared directly.
+
+A session folder holds a `session_info.yaml` and one ordinary recording folder per device (readable with
+`Recording`), all timestamped in seconds since the session started.
+"""
+
+import asyncio
+import os
+import threading
+from time import monotonic
+from typing import Dict, List
+
+import numpy as np
+
+from synapp.core import metrics
+from synapp.core.devices.device import RECORDING_BUFFER_FLUSH_INTERVALS, Device
+from synapp.core.logging import logger
+from synapp.core.recording import DEFAULT_FLUSH_INTERVAL, Recording, RecordingWriter, write_recording_info
+from synapp.core.ring_buffer import RingBuffer
+from synapp.core.utilities import get_time_string
+
+SESSION_INFO_FILE = "session_info.yaml"
+SESSION_CLOCK = "monotonic"
+MAX_OFFSET_SLEW = 0.05  # sec of clock offset correction per sec
+
+
+class ClockAligner:
+    """Maps one device's timestamps onto a shared monotonic clock.
+
+    The offset between the device's clock and the shared clock is estimated from each chunk's arrival time,
+    assuming the chunk's last sample had only just been taken. Transport delays only make that estimate
+    too large, so the smallest offset seen so far is used - it converges on the least-delayed chunk.
+
+    A smaller estimate isn't applied all at once, which would step the aligned timestamps backwards. The
+    offset in use slews towards it by at most `MAX_OFFSET_SLEW` seconds per second of device time, and
+    aligned timestamps are never less than `(1 - MAX_OFFSET_SLEW)` sample periods apart.
+    """
+
+    def __init__(self, start_time: float, sample_rate: float = None, clock=monotonic):
+        """
+        Arguments:
+            start_time {float} -- Time on `clock` that aligned timestamps count from
+
+        Keyword Arguments:
+            sample_rate {float} -- Device sample rate, for the minimum spacing of aligned timestamps. Without
+                                   it, aligned timestamps are only kept from decreasing (default: {None})
+        """
+        self.start_time = start_time
+        self.clock = clock
+        self.min_step = (1 - MAX_OFFSET_SLEW) / sample_rate if sample_rate else 0.0
+        self.offset = None  # smallest offset seen
+        self.applied_offset = None  # offset in use, slewing towards `offset`
+        self._last_device_timestamp = None
+        self._last_timestamp = None
+
+    def align(self, timestamps, arrival_time: float = None) -> np.ndarray:
+        """Convert a chunk's device timestamps to seconds since `start_time` on the shared clock."""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        arrival_time = self.clock() if arrival_time is None else arrival_time
+        offset = float(arrival_time - timestamps[-1])
+        if self.offset is None:
+            self.offset = self.applied_offset = offset
+        else:
+            self.offset = min(self.offset, offset)
+            elapsed = max(timestamps[-1] - self._last_device_timestamp, 0.0)
+            self.applied_offset = max(self.offset, self.applied_offset - MAX_OFFSET_SLEW * elapsed)
+
+        aligned = timestamps + (self.applied_offset - self.start_time)
+        if self._last_timestamp is not None:
+            earliest = self._last_timestamp + self.min_step * np.arange(1, len(aligned) + 1)
+            aligned = np.maximum(aligned, earliest)
+        self._last_device_timestamp = timestamps[-1]
+        self._last_timestamp = aligned[-1]
+        return aligned
+
+
+class _DeviceRecorder:
+    """One device's share of a session: its stream, ring buffer, clock alignment and writer"""
+
+    def __init__(self, device: Device, folder: str, start_time: float, flush_interval: float, notes: str):
+        self.device = device
+        self.folder = folder
+        self.channels = device.channel_names()
+        self.aligner = ClockAligner(start_time, device.sampling_rate)
+        capacity = int(np.ceil(flush_interval * RECORDING_BUFFER_FLUSH_INTERVALS * device.sampling_rate))
+        self.buffer = RingBuffer(len(self.channels), capacity)
+        self.streamer = None
+        self._gaps = metrics.SampleGapCounter(device.sampling_rate, device=device.name)
+
+        os.makedirs(folder, exist_ok=False)
+        self.recording_info = {
+            "device": device.name,
+            "notes": notes,
+            "sample_rate": device.sampling_rate,
+            "channels": self.channels,
+            "clock": SESSION_CLOCK,
+        }
+        write_recording_info(folder, self.recording_info)
+        self.writer = RecordingWriter(folder, self.buffer, flush_interval=flush_interval)
+
+    def process_samples(self, samples, timestamps):
+        """Device callback: align the chunk to the session clock and buffer it"""
+        arrival_time = monotonic()
+        with metrics.timer("device_callback_seconds", device=self.device.name):
+            self.buffer.append(np.asarray(samples)[: len(self.channels)], self.aligner.align(timestamps, arrival_time))
+        metrics.inc("samples_received_total", len(timestamps), device=self.device.name)
+        self._gaps.update(timestamps)
+
+    def start(self):
+        self.writer.start()
+        try:
+            self.streamer = self.device.stream(callback=self.process_samples)
+        except BaseException:
+            self.writer.close()
+            raise
+
+    def stop(self, duration: float):
+        if self.streamer is not None:
+            self.streamer.stop_streaming()
+            self.streamer = None
+        self.writer.close()
+        self.recording_info.update(
+            {
+                "duration (s)": duration,
+                "num_samples": self.writer.num_samples,
+                "lost_samples": self.writer.lost_samples,
+                "clock_offset": self.aligner.applied_offset,
+            }
+        )
+        write_recording_info(self.folder, self.recording_info)
+
+
+class RecordingSession:
+    """Record from several devices concurrently into one session folder.
+
+    Use `record` for a fixed duration, or `start`/`stop` (or a `with` block) to control it directly:
+
+        with RecordingSession(devices, "user_data") as session:
+            ...
+        recordings = read_session(session.folder)
+    """
+
+    def __init__(self, devices: List[Device], folder: str, chunk_duration: float = None, notes: str = None):
+        """
+        Arguments:
+            devices {list[Device]} -- Devices to record, e.g. the results of `DeviceScanner.scan_for_devices`
+            folder {str} -- Folder to create the session folder in
+
+        Keyword Arguments:
+            chunk_duration {float} -- Seconds between flushes to disk (default: {5.0})
+            notes {str} -- Notes to store with the session (default: {None})
+        """
+        if not devices:
+            raise ValueError("A recording session needs at least one device")
+        self.devices = list(devices)
+        self.parent_folder = folder
+        self.flush_interval = chunk_duration or DEFAULT_FLUSH_INTERVAL
+        self.notes = notes
+        self.folder = None
+        self.recorders: Dict[str, _DeviceRecorder] = {}
+        self.cancel_recording_event = threading.Event()
+        self._start_time = None
+        self._session_info = None
+
+    @property
+    def buffers(self) -> Dict[str, RingBuffer]:
+        """Each device's live ring buffer, by device folder name, e.g. for online processing during the session"""
+        return {name: recorder.buffer for name, recorder in self.recorders.items()}
+
+    def start(self) -> str:
+        """Create the session folder and start every device streaming.
+
+        Returns:
+            str -- The session folder
+        """
+        start_timestring = get_time_string()
+        self.folder = os.path.join(self.parent_folder, f"{start_timestring}_session")
+        os.makedirs(self.folder, exist_ok=False)
+        self.cancel_recording_event.clear()
+        self._start_time = monotonic()
+
+        for name, device in zip(_unique_folder_names(self.devices), self.devices):
+            self.recorders[name] = _DeviceRecorder(
+                device, os.path.join(self.folder, name), self._start_time, self.flush_interval, self.notes
+            )
+        self._session_info = {
+            "recording_started": start_timestring,
+            "notes": self.notes,
+            "clock": SESSION_CLOCK,
+            "devices": {name: recorder.device.name for name, recorder in self.recorders.items()},
+        }
+        write_session_info(self.folder, self._session_info)
+
+        started = []
+        try:
+            for recorder in self.recorders.values():
+                recorder.start()
+                started.append(recorder)
+        except BaseException:
+            for recorder in started:
+                recorder.stop(monotonic() - self._start_time)
+            raise
+        logger.info(f"Recording session started with {len(self.recorders)} devices")
+        return self.folder
+
+    def stop(self) -> str:
+        """Stop every device and finish writing the session.
+
+        Returns:
+            str -- The session folder
+        """
+        duration = monotonic() - self._start_time
+        for recorder in self.recorders.values():
+            recorder.stop(duration)
+        self._session_info.update(
+            {
+                "duration (s)": duration,
+                "num_samples": {name: recorder.writer.num_samples for name, recorder in self.recorders.items()},
+            }
+        )
+        write_session_info(self.folder, self._session_info)
+        logger.info(f"Recording session saved to {self.folder}")
+        return self.folder
+
+    def record(self, recording_time: float) -> str:
+        """Record every device for recording_time seconds, or until `stop_recording` is called."""
+        self.start()
+        try:
+            self.cancel_recording_event.wait(recording_time)
+        finally:
+            self.stop()
+        return self.folder
+
+    async def arecord(self, recording_time: float) -> str:
+        """Like `record`, without blocking the event loop."""
+        await asyncio.to_thread(self.start)
+        try:
+            await asyncio.to_thread(self.cancel_recording_event.wait, recording_time)
+        finally:
+            await asyncio.shield(asyncio.to_thread(self.stop))
+        return self.folder
+
+    def stop_recording(self):
+        """End a `record` or `arecord` call early."""
+        self.cancel_recording_event.set()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def _unique_folder_names(devices: List[Device]) -> List[str]:
+    names = []
+    counts = {}
+    for device in devices:
+        name = device._simplify_name()
+        counts[name] = counts.get(name, 0) + 1
+        names.append(name if counts[name] == 1 else f"{name}_{counts[name]}")
+    return names
+
+
+def write_session_info(folder: str, session_info: dict):
+    from yaml import safe_dump
+
+    with open(os.path.join(folder, SESSION_INFO_FILE), "w") as f:
+        safe_dump(session_info, f)
+
+
+def read_session_info(folder: str) -> dict:
+    from yaml import safe_load
+
+    with open(os.path.join(folder, SESSION_INFO_FILE), "r") as f:
+        return safe_load(f)
+
+
+def read_session(folder: str) -> Dict[str, Recording]:
+    """Open every device's recording in a session folder, by device folder name."""
+    return {name: Recording(os.path.join(folder, name)) for name in read_session_info(folder)["devices"]}
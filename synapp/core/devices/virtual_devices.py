@@ -0,0 +1,281 @@
+"""Devices that need no hardware: generated signals, and replays of saved recordings.
+
+Both deliver chunks from their own thread through `callback(samples, timestamps)`, exactly like muselsl's
+`Muse(callback_eeg=...)`, so recording, streaming, filtering and inference can be exercised in CI. `speed`
+sets how many times faster than real time chunks are delivered; `float("inf")` delivers them as fast as
+the consumer accepts them, which makes end-to-end throughput benchmarks deterministic.
+"""
+
+import os
+import threading
+from abc import ABCMeta, abstractmethod
+from time import monotonic, time
+from typing import Callable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from synapp.core.devices.device import DEVICE_POLL_INTERVAL, Device, MuseStreamer
+from synapp.core.recording import Recording
+
+DEFAULT_CHUNK_SIZE = 12  # samples, the size of a Muse EEG packet
+DEFAULT_CHANNELS = ("TP9", "AF7", "AF8", "TP10")
+DEFAULT_SAMPLE_RATE = 256
+
+
+class SineSignal:
+    """Sum of sine waves, phase shifted per channel. Callable as `signal(t, num_channels)`.
+
+    The default is a 10 Hz alpha rhythm with some 60 Hz line noise on top.
+    """
+
+    def __init__(self, frequencies: Sequence[float] = (10.0, 60.0), amplitudes: Sequence[float] = (20.0, 5.0)):
+        if len(frequencies) != len(amplitudes):
+            raise ValueError("Every frequency needs an amplitude")
+        self.frequencies = tuple(frequencies)
+        self.amplitudes = tuple(amplitudes)
+
+    def __call__(self, t: np.ndarray, num_channels: int) -> np.ndarray:
+        phases = np.arange(num_channels)[:, np.newaxis] * (np.pi / 4)
+        signal = np.zeros((num_channels, len(t)))
+        for frequency, amplitude in zip(self.frequencies, self.amplitudes):
+            signal += amplitude * np.sin(2 * np.pi * frequency * t + phases)
+        return signal
+
+
+class VirtualDriver:
+    """Stands in for muselsl's Muse: delivers chunks from an iterator to `callback_eeg` on its own thread.
+
+    Each chunk is delivered once its last sample would have been taken, `speed` times faster than the
+    chunks' timestamps say.
+    """
+
+    def __init__(self, chunks: Iterator[Tuple[np.ndarray, np.ndarray]], callback_eeg: Callable, speed: float = 1.0):
+        if not speed > 0:
+            raise ValueError(f"speed must be positive, got {speed}")
+        self.chunks = chunks
+        self.callback_eeg = callback_eeg
+        self.speed = speed
+        self.chunks_sent = 0
+        self.samples_sent = 0
+        self.finished = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread = None
+
+    def connect(self) -> bool:
+        return True
+
+    def start(self):
+        self._stop_event.clear()
+        self.finished.clear()
+        self._thread = threading.Thread(target=self._run, name="VirtualDriver", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            start = None
+            for samples, timestamps in self.chunks:
+                if start is None:
+                    start = (monotonic(), timestamps[0])
+                delay = start[0] + (timestamps[-1] - start[1]) / self.speed - monotonic()
+                if delay > 0 and self._stop_event.wait(delay):
+                    break
+                if self._stop_event.is_set():
+                    break
+                self.callback_eeg(samples, timestamps)
+                self.chunks_sent += 1
+                self.samples_sent += len(timestamps)
+        finally:
+            self.finished.set()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def disconnect(self):
+        pass
+
+
+class VirtualStreamer(MuseStreamer):
+    """Streams and records a `VirtualDevice`, the same way `MuseStreamer` does a Muse"""
+
+    def __init__(self):
+        super().__init__()
+        self.driver: VirtualDriver = None
+
+    def stream(self, device: "VirtualDevice", callback: Callable, block=False):
+        """Start delivering the device's chunks to `callback(samples, timestamps)`.
+
+        Keyword Arguments:
+            block {bool} -- Wait until the device runs out of data or `stop_streaming` is called (default: {False})
+        """
+        self._stop_streaming_event.clear()
+        self.driver = device.create_driver(callback)
+        self.driver.connect()
+        self.driver.start()
+        if block:
+            while not self._stop_streaming_event.is_set() and not self.driver.finished.wait(DEVICE_POLL_INTERVAL):
+                pass
+
+    def stop_streaming(self):
+        self._stop_streaming_event.set()
+        if self.driver is not None:
+            self.driver.stop()
+            self.driver.disconnect()
+            self.driver = None
+
+
+class VirtualDevice(Device, metaclass=ABCMeta):
+    """A device whose samples come from a `VirtualDriver` rather than hardware"""
+
+    # Virtual data can wait for a slow consumer, and each device has its own driver thread
+    stream_overflow = "block"
+
+    def __init__(self, name: str, sampling_rate: int, channels: Sequence[str], chunk_size: int, speed: float):
+        super().__init__(name, sampling_rate=sampling_rate, channel_count_list=[len(channels)])
+        if not speed > 0:
+            raise ValueError(f"speed must be positive, got {speed}")
+        self.channels = list(channels)
+        self.chunk_size = chunk_size
+        self.speed = speed
+
+    def create_driver(self, callback: Callable) -> VirtualDriver:
+        return VirtualDriver(self.generate_chunks(), callback, self.speed)
+
+    @abstractmethod
+    def generate_chunks(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Yield (samples of shape (channels, n), timestamps of shape (n,)) chunks, in time order"""
+
+    def channel_names(self) -> List[str]:
+        return list(self.channels)
+
+    def stream(self, block=False, callback: Callable = None) -> VirtualStreamer:
+        streamer = VirtualStreamer()
+        streamer.stream(self, callback, block=block)
+        return streamer
+
+    def record(self, folder, recording_time, block=True, notes=None) -> str:
+        """Record for a set amount of time, see `MuseDevice.record`."""
+        return VirtualStreamer().record(self, folder, recording_time, block=block, notes=notes)
+
+    async def arecord(self, folder, recording_time, notes=None) -> str:
+        return await VirtualStreamer().arecord(self, folder, recording_time, notes=notes)
+
+    def __str__(self):
+        return f"Device: {self.name}, Sampling Rate (Hz): {self.sampling_rate}, Speed: {self.speed}x"
+
+
+class SyntheticDevice(VirtualDevice):
+    """Generates multi-channel signals, plus seeded Gaussian noise, at a fixed sample rate.
+
+    Timestamps count from the wall-clock time streaming started, like a Muse's. With a seed, every stream
+    produces the same samples.
+    """
+
+    def __init__(
+        self,
+        name: str = "Synthetic",
+        channels: Sequence[str] = DEFAULT_CHANNELS,
+        sampling_rate: int = DEFAULT_SAMPLE_RATE,
+        signal: Callable = None,
+        noise: float = 5.0,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        speed: float = 1.0,
+        duration: float = None,
+        seed: int = None,
+    ):
+        """
+        Keyword Arguments:
+            name {str} -- Device name (default: {"Synthetic"})
+            channels {list[str]} -- Channel names (default: {("TP9", "AF7", "AF8", "TP10")})
+            sampling_rate {int} -- Samples per second (default: {256})
+            signal {Callable} -- `signal(t, num_channels)`, giving (channels, len(t)) samples for times t in
+                                 seconds since the stream started. Defaults to a `SineSignal` (default: {None})
+            noise {float} -- Standard deviation of the Gaussian noise added to every sample (default: {5.0})
+            chunk_size {int} -- Samples per callback (default: {12})
+            speed {float} -- Multiple of real time to deliver chunks at (default: {1.0})
+            duration {float} -- Seconds of data to generate before stopping. None streams until stopped (default: {None})
+            seed {int} -- Noise seed (default: {None})
+        """
+        super().__init__(name, sampling_rate, channels, chunk_size, speed)
+        self.signal = signal or SineSignal()
+        self.noise = noise
+        self.duration = duration
+        self.seed = seed
+
+    def generate_chunks(self):
+        rng = np.random.default_rng(self.seed)
+        start_time = time()
+        total = None if self.duration is None else int(round(self.duration * self.sampling_rate))
+        start = 0
+        while total is None or start < total:
+            stop = start + self.chunk_size if total is None else min(start + self.chunk_size, total)
+            t = np.arange(start, stop) / self.sampling_rate
+            samples = self.signal(t, len(self.channels))
+            if self.noise:
+                samples = samples + rng.normal(0.0, self.noise, samples.shape)
+            yield samples, start_time + t
+            start = stop
+
+
+class ReplayDevice(VirtualDevice):
+    """Replays a saved recording folder (chunked, or legacy `data.pkl`) with its original timestamps.
+
+    The recording is read one chunk at a time through a memory-mapped `Recording`. When looping, each pass
+    is shifted to start one sample period after the previous one ended, so timestamps keep increasing.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        name: str = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        speed: float = 1.0,
+        loop: bool = False,
+    ):
+        """
+        Arguments:
+            source {str} -- Recording folder, or the path of its `data.pkl`
+
+        Keyword Arguments:
+            name {str} -- Device name. Defaults to the recorded device's name (default: {None})
+            chunk_size {int} -- Samples per callback (default: {12})
+            speed {float} -- Multiple of real time to replay at, e.g. 1 to 100 (default: {1.0})
+            loop {bool} -- Start again from the beginning at the end of the recording (default: {False})
+        """
+        self.folder = os.path.dirname(source) if os.path.isfile(source) else source
+        recording = Recording(self.folder)
+        if len(recording) < 2:
+            raise ValueError(f"{self.folder} has too few samples to replay")
+        sampling_rate = recording.sample_rate or int(round(1 / np.median(np.diff(recording.timestamps))))
+        name = name or recording.info.get("device") or os.path.basename(os.path.normpath(self.folder))
+        super().__init__(name, sampling_rate, recording.channels, chunk_size, speed)
+        self.loop = loop
+
+    def generate_chunks(self):
+        recording = Recording(self.folder)
+        shift = 0.0
+        while True:
+            for start in range(0, len(recording), self.chunk_size):
+                indices = slice(start, start + self.chunk_size)
+                yield np.array(recording.samples[indices].T), recording.timestamps[indices] + shift
+            if not self.loop:
+                return
+            shift += recording.duration + 1 / self.sampling_rate
+
+
+def run_device(device: VirtualDevice, callback: Callable, timeout: float = None) -> VirtualDriver:
+    """Stream a device on the calling thread until it runs out of data, e.g. for a throughput benchmark.
+
+    Returns:
+        VirtualDriver -- The finished driver, with its `chunks_sent` and `samples_sent` counts
+    """
+    streamer = device.stream(callback=callback)
+    driver = streamer.driver
+    try:
+        driver.finished.wait(timeout)
+    finally:
+        streamer.stop_streaming()
+    return driver
+
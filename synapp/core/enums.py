@@ -4,3 +4,5 @@ from enum import StrEnum
 class DeviceType(StrEnum):
     muse = "MUSE"
     ganglion = "GANGLION"
+    synthetic = "SYNTHETIC"
+    replay = "REPLAY"
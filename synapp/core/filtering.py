@@ -1,7 +1,20 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
 from scipy import signal as sps
 import pandas as pd
 
+from synapp.core import metrics
+
+FILTER_CACHE_SIZE = 64
+DEFAULT_NOTCH_QUALITY = 30.0  # notch frequency / -3dB bandwidth
+DEFAULT_NOTCH_HARMONICS = 1
+DEFAULT_BLOCK_DURATION = 300.0  # sec
+DEFAULT_BLOCK_WARMUP = 30.0  # sec, enough for the 0.1Hz highpass to settle
 
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
 def butter_bandpass(lowcut, highcut, fs, order=2):
     nyq = 0.5 * fs
     low = lowcut / nyq
@@ -10,6 +23,16 @@ def butter_bandpass(lowcut, highcut, fs, order=2):
     return b, a
 
 
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def butter_sos(low, high, fs, order=2, btype="band"):
+    """Design (and cache) a Butterworth filter in second-order-section form.
+
+    Coefficients are keyed by (band, fs, order, btype), so repeated designs for the same filter are free.
+    The returned array is shared between every caller, so it must not be modified.
+    """
+    return sps.butter(order, [low, high], btype=btype, fs=fs, output="sos")
+
+
 def butter_bandpass_filter(data, lowcut=0.01, highcut=30, fs=256, order=2):
     b, a = butter_bandpass(lowcut, highcut, fs, order)
     y = sps.lfilter(b, a, data)
@@ -17,14 +40,114 @@ def butter_bandpass_filter(data, lowcut=0.01, highcut=30, fs=256, order=2):
 
 
 def notch_filter(data, q=100, w0=60, delta=0.5, fs=256):
-    nyq = 0.5 * fs
-    low = (w0 - delta) / nyq
-    high = (w0 + delta) / nyq
-    b, a = sps.butter(q, [low, high], btype="bandstop")
-    y = sps.lfilter(b, a, data)
+    """Butterworth bandstop of order `q` between w0 +/- delta.
+    Designed as second-order sections, since the (b, a) form is unstable at high orders.
+    """
+    sos = butter_sos(w0 - delta, w0 + delta, fs, q, "bandstop")
+    y = sps.sosfilt(sos, data)
     return y
 
 
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def iir_notch_sos(notch_frequency=60, fs=256, quality=DEFAULT_NOTCH_QUALITY, harmonics=DEFAULT_NOTCH_HARMONICS):
+    """Design (and cache) a cascade of second-order IIR notches at `notch_frequency` and its multiples.
+
+    Each notch is a single biquad, so the cascade stays cheap and numerically stable no matter how narrow
+    it is. Harmonics at or above the Nyquist frequency are skipped.
+    """
+    sections = []
+    for harmonic in range(1, harmonics + 1):
+        frequency = notch_frequency * harmonic
+        if frequency >= fs / 2:
+            break
+        b, a = sps.iirnotch(frequency, quality, fs=fs)
+        sections.append(sps.tf2sos(b, a))
+    return np.vstack(sections)
+
+
+def iir_notch_filter(
+    data,
+    w0=60,
+    fs=256,
+    quality=DEFAULT_NOTCH_QUALITY,
+    harmonics=DEFAULT_NOTCH_HARMONICS,
+    zero_phase=False,
+    axis=-1,
+):
+    """Remove power line noise at `w0` (50/60 Hz) and optionally its harmonics.
+
+    Keyword Arguments:
+        quality {float} -- Notch frequency divided by the -3dB bandwidth (default: {30})
+        harmonics {int} -- Number of multiples of w0 to notch, including w0 itself (default: {1})
+        zero_phase {bool} -- Filter forwards and backwards for no phase distortion. Offline use only (default: {False})
+        axis {int} -- Time axis of `data` (default: {-1})
+    """
+    sos = iir_notch_sos(w0, fs, quality, harmonics)
+    if zero_phase:
+        return sps.sosfiltfilt(sos, data, axis=axis)
+    return sps.sosfilt(sos, data, axis=axis)
+
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def bandpass_notch_sos(
+    lowcut=0.1,
+    highcut=30,
+    notch_frequency=60,
+    filter_order=2,
+    sample_rate=256,
+    notch_quality=DEFAULT_NOTCH_QUALITY,
+    notch_harmonics=DEFAULT_NOTCH_HARMONICS,
+):
+    """SOS cascade of IIR notches at `notch_frequency` (and harmonics) followed by a Butterworth bandpass.
+    Set `notch_frequency` to None to skip the notch.
+    """
+    stages = []
+    if notch_frequency:
+        stages.append(iir_notch_sos(notch_frequency, sample_rate, notch_quality, notch_harmonics))
+    stages.append(butter_sos(lowcut, highcut, sample_rate, filter_order, "band"))
+    return np.vstack(stages)
+
+
+def sosfilt_blocks(sos, data, num_workers=None, block_size=None, warmup=None, zero_phase=False):
+    """Filter `data` of shape (samples, channels) along axis 0, optionally in parallel time blocks.
+
+    With `num_workers` > 1, the samples are split into blocks of `block_size` that are filtered on a thread
+    pool (scipy releases the GIL while filtering). Each block starts filtering `warmup` samples early, so its
+    state has settled by the time its own samples begin; the output matches a single pass to within the
+    filter's decay over `warmup` samples. Without workers, this is exactly one `sosfilt` call.
+
+    With `zero_phase`, the data is filtered forwards and backwards (`sosfiltfilt`), and blocks are padded
+    with `warmup` samples on both sides.
+    """
+    filter_function = _sosfiltfilt if zero_phase else _sosfilt
+    num_samples = data.shape[0]
+    if not num_workers or num_workers <= 1 or not block_size or num_samples <= block_size:
+        return filter_function(sos, data)
+
+    filtered = np.empty_like(data)
+
+    def filter_block(start):
+        end = min(start + block_size, num_samples)
+        padded_start = max(0, start - warmup)
+        padded_end = min(num_samples, end + warmup) if zero_phase else end
+        padded = filter_function(sos, data[padded_start:padded_end])
+        filtered[start:end] = padded[start - padded_start : end - padded_start]
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        # Consume the results so exceptions from the workers are raised here
+        list(executor.map(filter_block, range(0, num_samples, block_size)))
+
+    return filtered
+
+
+def _sosfilt(sos, data):
+    return sps.sosfilt(sos, data, axis=0)
+
+
+def _sosfiltfilt(sos, data):
+    return sps.sosfiltfilt(sos, data, axis=0)
+
+
 def bandpass_notch_filter_dataframe(
     dataframe: pd.DataFrame,
     lowcut=0.1,
@@ -32,20 +155,93 @@ def bandpass_notch_filter_dataframe(
     notch_frequency=60,
     filter_order=2,
     sample_rate=256,
+    zero_phase=False,
+    notch_quality=DEFAULT_NOTCH_QUALITY,
+    notch_harmonics=DEFAULT_NOTCH_HARMONICS,
+    num_workers=None,
+    block_duration=DEFAULT_BLOCK_DURATION,
+    block_warmup=DEFAULT_BLOCK_WARMUP,
 ):
     """Essential filter for EEG data. Bandpass filter between 0.1-30Hz,
     and a notch filter at 60/50 Hz for power line noise.
+
+    All channels are filtered together in a single pass over a float64 (samples, channels) array.
+
+    Keyword Arguments:
+        zero_phase {bool} -- Filter forwards and backwards, so the output isn't delayed or phase-distorted.
+                             The default causal mode matches what `FilterBank` produces on a live stream
+                             (default: {False})
+        notch_quality {float} -- Notch frequency divided by the notch's -3dB bandwidth (default: {30})
+        notch_harmonics {int} -- Number of multiples of `notch_frequency` to notch, below Nyquist (default: {1})
+        num_workers {int} -- If more than 1, long recordings are split into time blocks of `block_duration`
+                             seconds and filtered on a thread pool (default: {None})
+        block_duration {float} (sec) -- Length of each parallel time block (default: {300})
+        block_warmup {float} (sec) -- Extra data filtered around each block so the filter state settles
+                                      (default: {30})
     """
+    sos = bandpass_notch_sos(
+        lowcut, highcut, notch_frequency, filter_order, sample_rate, notch_quality, notch_harmonics
+    )
+    filtered = sosfilt_blocks(
+        sos,
+        dataframe.to_numpy(dtype=np.float64),
+        num_workers=num_workers,
+        block_size=int(block_duration * sample_rate),
+        warmup=int(block_warmup * sample_rate),
+        zero_phase=zero_phase,
+    )
+    return pd.DataFrame(filtered, index=dataframe.index, columns=dataframe.columns)
+
 
-    out_dataframe = pd.DataFrame(index=dataframe.index, columns=dataframe.keys())
+class FilterBank:
+    """Cascade of a notch and a bandpass filter that carries its state between calls.
 
-    for col_name, col in dataframe.items():
-        out_dataframe[col_name] = butter_bandpass_filter(
-            notch_filter(col, q=6, w0=notch_frequency, fs=sample_rate),
-            lowcut=lowcut,
-            highcut=highcut,
-            order=filter_order,
-            fs=sample_rate,
+    Consecutive chunks of a stream can be filtered incrementally, and the result is the same as filtering
+    the whole stream at once - so there are no edge transients at chunk boundaries and no need to tile windows.
+    The filter state is initialized from the first chunk's values to avoid a startup transient.
+
+    Data is (channels, samples), matching `data_parsing`. Set `notch_frequency` to None to skip the notch.
+    """
+
+    def __init__(
+        self,
+        lowcut=0.1,
+        highcut=30,
+        notch_frequency=60,
+        filter_order=2,
+        sample_rate=256,
+        notch_quality=DEFAULT_NOTCH_QUALITY,
+        notch_harmonics=DEFAULT_NOTCH_HARMONICS,
+    ):
+        self.sos = bandpass_notch_sos(
+            lowcut, highcut, notch_frequency, filter_order, sample_rate, notch_quality, notch_harmonics
         )
+        self.sample_rate = sample_rate
+        self._zi = None
+
+    def reset(self):
+        """Forget the carried state, e.g. when the stream is interrupted."""
+        self._zi = None
+
+    def filter(self, chunk):
+        """Filter the next chunk of the stream.
+
+        Arguments:
+            chunk {np.ndarray} -- Array of shape (channels, samples), or (samples,) for a single channel
 
-    return out_dataframe
+        Returns:
+            np.ndarray -- Filtered chunk, same shape as the input
+        """
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if chunk.shape[-1] == 0:
+            return chunk
+        if self._zi is None or self._zi.shape[1:-1] != chunk.shape[:-1]:
+            steady_state = sps.sosfilt_zi(self.sos)
+            first_samples = chunk[..., 0]
+            self._zi = (
+                steady_state.reshape((len(self.sos),) + (1,) * first_samples.ndim + (2,))
+                * first_samples[np.newaxis, ..., np.newaxis]
+            )
+        with metrics.timer("filter_seconds"):
+            filtered, self._zi = sps.sosfilt(self.sos, chunk, axis=-1, zi=self._zi)
+        return filtered
@@ -1,9 +1,6 @@
 import logging
 import colorama
-from colorama import Fore
-
-# Initialize Colorama
-colorama.init(autoreset=True)
+from colorama import Fore, Style
 
 
 class ColorFormatter(logging.Formatter):
@@ -21,16 +18,35 @@ class ColorFormatter(logging.Formatter):
         self.formatter = logging.Formatter(log_fmt, datefmt="%Y-%m-%d %H:%M:%S")
 
     def format(self, record):
-        return self.COLORS.get(record.levelname, "") + self.formatter.format(record)
+        return self.COLORS.get(record.levelname, "") + self.formatter.format(record) + Style.RESET_ALL
+
+
+class DefaultHandler(logging.StreamHandler):
+    """Prints synapp's messages in color until the application configures logging itself.
+
+    Once the root logger has handlers (e.g. after `logging.basicConfig` or `configure_logging`), messages
+    are left to propagate to them instead, so they aren't printed twice.
+    """
+
+    def __init__(self):
+        super().__init__()
+        colorama.just_fix_windows_console()
+        self.setFormatter(ColorFormatter())
 
+    def emit(self, record):
+        if not logging.root.handlers:
+            super().emit(record)
 
-# Configure the basic settings for logging
-logging.basicConfig(level=logging.INFO)
 
-# Apply color formatter to all handlers
-for handler in logging.root.handlers:
-    handler.setFormatter(ColorFormatter())
+def configure_logging(level=logging.INFO):
+    """Configure the root logger, and color every root handler's output by level."""
+    logging.basicConfig(level=level)
+    for handler in logging.root.handlers:
+        handler.setFormatter(ColorFormatter())
 
 
-# create logger
+# create logger. Nothing global is configured at import time, only this logger's own handler
 logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+if not any(isinstance(handler, DefaultHandler) for handler in logger.handlers):
+    logger.addHandler(DefaultHandler())
@@ -1,8 +1,23 @@
 #!/usr/bin/env python
 
 import numpy as np
-import tensorflow as tf
-from synapp.core.EEGNet_Modify import EEGNet_SynApp
+from synapp.core.model_runtime import DEFAULT_LATENCY_HISTORY, DEFAULT_MAX_BATCH_SIZE, BatchPredictor
+from synapp.core.model_runtime import get_predictions  # noqa: F401 -- part of this module's API
+
+
+# TensorFlow takes seconds to import, so it's only loaded once a model is built or run.
+# `machine_learning.tf` and `machine_learning.EEGNet_SynApp` still work, and trigger the import
+def __getattr__(name):
+    if name == "tf":
+        import tensorflow as tf
+
+        return tf
+    if name == "EEGNet_SynApp":
+        from synapp.core.EEGNet_Modify import EEGNet_SynApp
+
+        return EEGNet_SynApp
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Input: model prediction array
 # Output: Index/class number of the most confident predicted class
@@ -22,7 +37,7 @@ def get_prediction(prediction_array, minimum_confidence, default) :
 
     confidence_val = prediction_array[max_index]
 
-    if confidence_val < minimum_confidence:
+    if confidence_val >= minimum_confidence:
         prediction = max_index
     else:
         # not confident enough - output the default class ("rest")
@@ -31,8 +46,10 @@ def get_prediction(prediction_array, minimum_confidence, default) :
     return prediction
 
 
-
 def getmodel(num_classes, num_channels, window_length, eegnet=False) :
+    import tensorflow as tf
+    from synapp.core.EEGNet_Modify import EEGNet_SynApp
+
     if not eegnet :
         model = tf.keras.models.Sequential([
         tf.keras.layers.Flatten(input_shape=(num_channels, window_length)),
@@ -66,3 +83,50 @@ def getWinkBlinkPredictionMapping():
                      1: 'winkright',
                      2: 'winkleft'}
     return predictionmap
+
+
+class InferenceRunner(BatchPredictor):
+    """Low-latency inference loop around a Keras model.
+
+    The model is wrapped in a `tf.function` with a fixed input signature (any batch size, fixed window
+    shape), so it is traced once and warmed up at construction instead of on the first live window.
+    Windows can be predicted directly with `predict`, or queued as they arrive with `submit` and
+    predicted together as one micro-batch by `flush`. Latency of every model call is recorded.
+    """
+
+    backend = "tensorflow"
+
+    def __init__(
+        self,
+        model,
+        input_shape=None,
+        max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+        minimum_confidence=0.0,
+        default=-1,
+        latency_history=DEFAULT_LATENCY_HISTORY,
+    ):
+        """
+        Arguments:
+            model {tf.keras.Model} -- Model mapping windows to class probabilities, e.g. from `getmodel`
+
+        Keyword Arguments:
+            input_shape {tuple} -- Shape of one window. Defaults to the model's input shape (default: {None})
+            max_batch_size {int} -- Most windows passed to the model in one call (default: {32})
+            minimum_confidence {float} -- Confidence below which `default` is predicted (default: {0.0})
+            default {int} -- Class predicted when the model isn't confident enough (default: {-1})
+            latency_history {int} -- Number of recent model calls kept for latency statistics (default: {1000})
+        """
+        super().__init__(max_batch_size, minimum_confidence, default, latency_history)
+        self.model = model
+        self.input_shape = tuple(input_shape or model.input_shape[1:])
+
+        import tensorflow as tf
+
+        self._predict = tf.function(
+            lambda windows: model(windows, training=False),
+            input_signature=[tf.TensorSpec(shape=(None,) + self.input_shape, dtype=tf.float32)],
+        )
+        self.warm_up()
+
+    def _predict_batch(self, windows):
+        return self._predict(windows).numpy()
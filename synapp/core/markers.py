@@ -0,0 +1,106 @@
+import threading
+
+import numpy as np
+
+DEFAULT_MARKER_CAPACITY = 64
+
+
+class MarkerIndex:
+    """Markers sorted by timestamp in NumPy arrays, for O(log n) time range queries.
+
+    Build it once per recording with `from_markers`, then query it with `between` as often as needed.
+    Markers from a live stream can be added with `add` or `extend`; storage grows geometrically, and
+    markers arriving in timestamp order are appended without shifting anything.
+    """
+
+    def __init__(self, timestamps=(), labels=(), capacity=DEFAULT_MARKER_CAPACITY):
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        labels = np.asarray(labels, dtype=object)
+        if timestamps.shape != labels.shape:
+            raise ValueError(f"Got {len(timestamps)} timestamps for {len(labels)} labels")
+
+        order = np.argsort(timestamps, kind="stable")
+        capacity = max(capacity, len(timestamps))
+        self._timestamps = np.empty(capacity, dtype=np.float64)
+        self._labels = np.empty(capacity, dtype=object)
+        self._timestamps[: len(order)] = timestamps[order]
+        self._labels[: len(order)] = labels[order]
+        self._size = len(order)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_markers(cls, markers):
+        """Build an index from a record array with "marker" and "timestamp" fields,
+        or from a sequence of (marker, timestamp) pairs.
+        """
+        if isinstance(markers, MarkerIndex):
+            return markers
+        if getattr(markers, "dtype", None) is not None and markers.dtype.names:
+            return cls(markers["timestamp"], markers["marker"])
+        if len(markers) == 0:
+            return cls()
+        labels, timestamps = zip(*markers)
+        return cls(timestamps, labels)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._timestamps[: self._size]
+
+    @property
+    def labels(self) -> np.ndarray:
+        return self._labels[: self._size]
+
+    def __len__(self):
+        return self._size
+
+    def add(self, timestamp: float, label):
+        """Insert a single marker, keeping the index sorted."""
+        with self._lock:
+            self._reserve(self._size + 1)
+            position = int(np.searchsorted(self._timestamps[: self._size], timestamp, side="right"))
+            # Shift later markers along by one - a no-op for markers that arrive in order
+            self._timestamps[position + 1 : self._size + 1] = self._timestamps[position : self._size]
+            self._labels[position + 1 : self._size + 1] = self._labels[position : self._size]
+            self._timestamps[position] = timestamp
+            self._labels[position] = label
+            self._size += 1
+
+    def extend(self, timestamps, labels):
+        """Insert a batch of markers, keeping the index sorted."""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        labels = np.asarray(labels, dtype=object)
+        with self._lock:
+            new_size = self._size + len(timestamps)
+            self._reserve(new_size)
+            self._timestamps[self._size : new_size] = timestamps
+            self._labels[self._size : new_size] = labels
+            # Only re-sort if the batch is out of order, either internally or relative to the existing markers
+            if np.any(np.diff(self._timestamps[max(self._size - 1, 0) : new_size]) < 0):
+                order = np.argsort(self._timestamps[:new_size], kind="stable")
+                self._timestamps[:new_size] = self._timestamps[order]
+                self._labels[:new_size] = self._labels[order]
+            self._size = new_size
+
+    def between(self, start: float, end: float):
+        """Markers with start <= timestamp < end. The results are views into the index.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray] -- (timestamps, labels) of the matching markers
+        """
+        with self._lock:
+            timestamps = self._timestamps[: self._size]
+            if end < start:
+                return timestamps[:0], self._labels[:0]
+            first = np.searchsorted(timestamps, start, side="left")
+            last = np.searchsorted(timestamps, end, side="left")
+            return timestamps[first:last], self._labels[first:last]
+
+    def _reserve(self, size: int):
+        if size <= len(self._timestamps):
+            return
+        capacity = max(size, 2 * len(self._timestamps))
+        timestamps = np.empty(capacity, dtype=np.float64)
+        labels = np.empty(capacity, dtype=object)
+        timestamps[: self._size] = self._timestamps[: self._size]
+        labels[: self._size] = self._labels[: self._size]
+        self._timestamps, self._labels = timestamps, labels
@@ -0,0 +1,348 @@
+"""Low-overhead metrics for the online hot paths: counters, gauges and latency histograms.
+
+Metrics are off by default. While off, every recording call returns after a single flag check, so the
+instrumentation around device callbacks, filtering, epoching, inference and action dispatch costs close to
+nothing. Turn them on with `enable()`, or by setting the SYNAPP_METRICS environment variable to 1.
+
+Read them with `snapshot`. `log_metrics` writes them as one structured (JSON) log line, and
+`write_prometheus` writes a Prometheus text file, e.g. for node_exporter's textfile collector.
+`MetricsReporter` does either periodically from a background thread:
+
+    from synapp.core import metrics
+
+    metrics.enable()
+    with metrics.MetricsReporter(interval=10, path="synapp.prom"):
+        device.record("user_data", recording_time=600)
+
+Durations are in seconds. Histograms keep their most recent observations for the p50/p95/p99 quantiles,
+plus an all-time count and sum.
+"""
+
+import json
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
+from time import perf_counter
+from typing import Dict
+
+import numpy as np
+
+from synapp.core.logging import logger
+
+ENVIRONMENT_VARIABLE = "SYNAPP_METRICS"
+PROMETHEUS_PREFIX = "synapp_"
+QUANTILES = (0.5, 0.95, 0.99)
+DEFAULT_HISTORY = 1024  # observations kept per histogram
+DEFAULT_REPORT_INTERVAL = 10.0  # sec
+DEFAULT_GAP_TOLERANCE = 1.5  # sample periods between timestamps before samples count as dropped
+
+_enabled = os.environ.get(ENVIRONMENT_VARIABLE, "0") not in ("", "0")
+_registry: Dict[tuple, "Metric"] = {}
+_registry_lock = threading.Lock()
+_NULL_TIMER = nullcontext()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    """Forget every metric recorded so far."""
+    with _registry_lock:
+        _registry.clear()
+
+
+class Metric(ABC):
+    kind = None
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    @property
+    def key(self) -> str:
+        """Name and labels, like `name{label="value"}`"""
+        if not self.labels:
+            return self.name
+        return self.name + "{" + ",".join(f'{k}="{v}"' for k, v in sorted(self.labels.items())) + "}"
+
+    @abstractmethod
+    def value(self):
+        """The metric's current value, for reports"""
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, labels: dict):
+        super().__init__(name, labels)
+        self.total = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.total += amount
+
+    def value(self):
+        return self.total
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, labels: dict):
+        super().__init__(name, labels)
+        self.current = 0.0
+
+    def set(self, value):
+        self.current = value
+
+    def value(self):
+        return self.current
+
+
+class Histogram(Metric):
+    """Recent observations in a fixed-size ring, for quantiles, plus an all-time count and sum"""
+
+    kind = "summary"
+
+    def __init__(self, name: str, labels: dict, history: int = DEFAULT_HISTORY):
+        super().__init__(name, labels)
+        self._values = np.empty(history)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        with self._lock:
+            self._values[self.count % len(self._values)] = value
+            self.count += 1
+            self.sum += value
+
+    def quantiles(self) -> Dict[float, float]:
+        with self._lock:
+            recent = self._values[: min(self.count, len(self._values))].copy()
+        if len(recent) == 0:
+            return {q: float("nan") for q in QUANTILES}
+        return dict(zip(QUANTILES, np.quantile(recent, QUANTILES).tolist()))
+
+    def value(self):
+        summary = {"count": self.count, "sum": self.sum}
+        summary.update({f"p{round(q * 100)}": v for q, v in self.quantiles().items()})
+        return summary
+
+
+def _get(cls, name: str, labels: dict) -> Metric:
+    key = (name, tuple(sorted(labels.items())))
+    metric = _registry.get(key)
+    if metric is None:
+        with _registry_lock:
+            metric = _registry.setdefault(key, cls(name, labels))
+    if not isinstance(metric, cls):
+        raise TypeError(f"Metric {name} is a {metric.kind}, not a {cls.kind}")
+    return metric
+
+
+def inc(name: str, amount=1, **labels):
+    """Add to a counter."""
+    if not _enabled:
+        return
+    _get(Counter, name, labels).inc(amount)
+
+
+def set_gauge(name: str, value, **labels):
+    """Set a gauge, e.g. a queue depth."""
+    if not _enabled:
+        return
+    _get(Gauge, name, labels).set(value)
+
+
+def observe(name: str, value: float, **labels):
+    """Add an observation to a histogram, e.g. a duration in seconds."""
+    if not _enabled:
+        return
+    _get(Histogram, name, labels).observe(value)
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.histogram.observe(perf_counter() - self.start)
+
+
+def timer(name: str, **labels):
+    """Context manager that observes how long its block took, in seconds, in a histogram.
+
+        with metrics.timer("filter_seconds"):
+            filtered = filter_bank.filter(chunk)
+    """
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(_get(Histogram, name, labels))
+
+
+def count_missing_samples(
+    timestamps, sample_rate: float, tolerance=DEFAULT_GAP_TOLERANCE, previous_timestamp: float = None
+) -> int:
+    """Number of samples missing from gaps between consecutive timestamps.
+
+    A gap longer than `tolerance` sample periods counts as the samples that would have filled it.
+
+    Keyword Arguments:
+        previous_timestamp {float} -- Last timestamp before these, to also check the gap leading up to them (default: {None})
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if len(timestamps) == 0:
+        return 0
+    previous = timestamps[0] if previous_timestamp is None else previous_timestamp
+    periods = np.diff(timestamps, prepend=previous) * sample_rate
+    gaps = periods[periods > tolerance]
+    return int((np.round(gaps) - 1).sum())
+
+
+class SampleGapCounter:
+    """Counts samples missing from a stream as it arrives, see `count_missing_samples`."""
+
+    def __init__(
+        self, sample_rate: float, name: str = "dropped_samples_total", tolerance=DEFAULT_GAP_TOLERANCE, **labels
+    ):
+        self.sample_rate = sample_rate
+        self.name = name
+        self.tolerance = tolerance
+        self.labels = labels
+        self._last_timestamp = None
+
+    def update(self, timestamps):
+        """Check the next chunk's timestamps. Returns the number of samples found missing."""
+        if not _enabled:
+            # Gaps while disabled aren't known, so don't count them once re-enabled
+            self._last_timestamp = None
+            return 0
+        if len(timestamps) == 0:
+            return 0
+        missing = count_missing_samples(timestamps, self.sample_rate, self.tolerance, self._last_timestamp)
+        self._last_timestamp = timestamps[-1]
+        # Counted even when nothing is missing, so the metric exists from the first chunk
+        inc(self.name, missing, **self.labels)
+        return missing
+
+
+def snapshot() -> dict:
+    """Every metric's current value, by `name{labels}`. Histograms give their count, sum, p50, p95 and p99."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {metric.key: metric.value() for metric in sorted(metrics, key=lambda m: m.key)}
+
+
+def log_metrics():
+    """Log every metric as one JSON line."""
+    logger.info("metrics " + json.dumps(snapshot(), sort_keys=True))
+
+
+def _prometheus_name(name: str) -> str:
+    return PROMETHEUS_PREFIX + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _prometheus_labels(labels: dict, **extra) -> str:
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    escaped = {k: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for k, v in labels.items()}
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(escaped.items())) + "}"
+
+
+def format_prometheus() -> str:
+    """Every metric in the Prometheus text exposition format. Histograms are exported as summaries."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    typed = set()
+    for metric in sorted(metrics, key=lambda m: (m.name, m.key)):
+        name = _prometheus_name(metric.name)
+        if name not in typed:
+            lines.append(f"# TYPE {name} {metric.kind}")
+            typed.add(name)
+        if isinstance(metric, Histogram):
+            for quantile, value in metric.quantiles().items():
+                lines.append(f"{name}{_prometheus_labels(metric.labels, quantile=quantile)} {value!r}")
+            lines.append(f"{name}_sum{_prometheus_labels(metric.labels)} {metric.sum!r}")
+            lines.append(f"{name}_count{_prometheus_labels(metric.labels)} {metric.count}")
+        else:
+            lines.append(f"{name}{_prometheus_labels(metric.labels)} {metric.value()!r}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str):
+    """Write `format_prometheus` to a file, atomically so a scraper never reads half of it."""
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as f:
+        f.write(format_prometheus())
+    os.replace(temporary_path, path)
+
+
+class MetricsReporter:
+    """Logs the metrics, and/or writes them to a Prometheus text file, every `interval` seconds.
+
+    A final report is made when it stops.
+    """
+
+    def __init__(self, interval: float = DEFAULT_REPORT_INTERVAL, path: str = None, log: bool = True):
+        """
+        Keyword Arguments:
+            interval {float} -- Seconds between reports (default: {10.0})
+            path {str} -- Prometheus text file to write (default: {None})
+            log {bool} -- Whether to log each report as a JSON line (default: {True})
+        """
+        self.interval = interval
+        self.path = path
+        self.log = log
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def report(self):
+        if self.log:
+            log_metrics()
+        if self.path:
+            write_prometheus(self.path)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.report()
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="MetricsReporter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.report()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
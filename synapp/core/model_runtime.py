@@ -0,0 +1,288 @@
+"""Lightweight CPU inference for exported models, without importing TensorFlow.
+
+`export_tflite` and `export_onnx` convert a trained Keras model (`getmodel` or `EEGNet_SynApp`) once, on a
+machine with TensorFlow installed. `LiteModel` then runs the exported file using only the TFLite
+interpreter (`ai_edge_litert` or `tflite_runtime`) or `onnxruntime`, and predicts like
+`machine_learning.InferenceRunner`, so closed-loop machines don't pay TensorFlow's startup time and memory.
+The runtimes come with the `lite` (TFLite) and `onnx` (onnxruntime, plus tf2onnx for exporting) extras.
+"""
+
+import os
+from abc import ABC, abstractmethod
+from collections import deque
+from time import perf_counter
+
+import numpy as np
+
+from synapp.core import metrics
+
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_LATENCY_HISTORY = 1000
+DEFAULT_CALIBRATION_WINDOWS = 100
+
+
+# Input: 2d array of (windows, classes) model predictions, minimum confidence and default class
+# Output: (predicted classes, confidences) arrays, with the default class wherever the model was not confident enough
+def get_predictions(prediction_arrays, minimum_confidence=0.0, default=-1):
+    prediction_arrays = np.asarray(prediction_arrays)
+    max_indices = np.argmax(prediction_arrays, axis=-1)
+    confidences = np.take_along_axis(prediction_arrays, max_indices[..., np.newaxis], axis=-1)[..., 0]
+    predictions = np.where(confidences >= minimum_confidence, max_indices, default)
+    return predictions, confidences
+
+
+def as_window_batch(windows, input_shape) -> np.ndarray:
+    """Check a batch of windows against a model's input shape, as a float32 array.
+
+    Arguments:
+        windows {np.ndarray} -- Array of shape (windows, *input_shape). A missing trailing axis of size 1 (the
+                                channel axis EEGNet expects) is added
+        input_shape {tuple} -- Shape of one window
+
+    Raises:
+        ValueError: If the windows don't have the model's input shape
+
+    Returns:
+        np.ndarray -- The windows, of shape (windows, *input_shape)
+    """
+    windows = np.asarray(windows, dtype=np.float32)
+    input_shape = tuple(input_shape)
+    if windows.shape[1:] == input_shape:
+        return windows
+    if input_shape[-1:] == (1,) and windows.ndim >= 1 and windows.shape[1:] == input_shape[:-1]:
+        return windows[..., np.newaxis]
+    raise ValueError(f"Expected windows of shape (n, {', '.join(map(str, input_shape))}), got {windows.shape}")
+
+
+def latency_stats(latencies):
+    """Percentiles of a sequence of call durations (in seconds), in milliseconds."""
+    if not latencies:
+        return {"calls": 0, "p50_ms": None, "p99_ms": None}
+    p50, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 99])
+    return {"calls": len(latencies), "p50_ms": float(p50), "p99_ms": float(p99)}
+
+
+def _concrete_function(model, input_shape=None):
+    """The model's inference function, traced for any batch size"""
+    import tensorflow as tf
+
+    input_shape = tuple(input_shape or model.input_shape[1:])
+    input_signature = [tf.TensorSpec(shape=(None,) + input_shape, dtype=tf.float32, name="windows")]
+    function = tf.function(lambda windows: model(windows, training=False), input_signature=input_signature)
+    return function, input_signature
+
+
+def export_tflite(model, path, quantize=False, calibration_windows=None):
+    """Convert a Keras model to a TFLite flatbuffer. Requires TensorFlow.
+
+    Arguments:
+        model {tf.keras.Model} -- Trained model, e.g. from `machine_learning.getmodel`
+        path {str} -- File to write, usually ending in ".tflite"
+
+    Keyword Arguments:
+        quantize {bool} -- Quantize weights and activations to int8. Inputs and outputs stay float32 (default: {False})
+        calibration_windows {np.ndarray} -- Representative windows of shape (n, *input_shape) used to choose the
+                                            int8 ranges. Random noise is used if not given (default: {None})
+
+    Returns:
+        str -- The path written
+    """
+    import tensorflow as tf
+
+    # Converting a traced tf.function leaves the weights as resource variables the interpreter can't read,
+    # converting the Keras model freezes them into the flatbuffer
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if quantize:
+        window_shape = tuple(model.input_shape[1:])
+        if calibration_windows is None:
+            calibration_windows = np.random.default_rng(0).normal(size=(DEFAULT_CALIBRATION_WINDOWS,) + window_shape)
+        calibration_windows = np.asarray(calibration_windows, dtype=np.float32).reshape((-1,) + window_shape)
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([window[np.newaxis]] for window in calibration_windows)
+
+    with open(path, "wb") as file:
+        file.write(converter.convert())
+    return path
+
+
+def export_onnx(model, path, input_shape=None, opset=None):
+    """Convert a Keras model to ONNX. Requires TensorFlow and tf2onnx.
+
+    Arguments:
+        model {tf.keras.Model} -- Trained model, e.g. from `machine_learning.getmodel`
+        path {str} -- File to write, usually ending in ".onnx"
+
+    Keyword Arguments:
+        input_shape {tuple} -- Shape of one window. Defaults to the model's input shape (default: {None})
+        opset {int} -- ONNX opset to target. Defaults to tf2onnx's choice (default: {None})
+
+    Returns:
+        str -- The path written
+    """
+    import tf2onnx
+
+    function, input_signature = _concrete_function(model, input_shape)
+    tf2onnx.convert.from_function(function, input_signature=input_signature, opset=opset, output_path=path)
+    return path
+
+
+def _load_tflite_interpreter(path, num_threads):
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            # Fall back to the interpreter bundled with full TensorFlow
+            from tensorflow.lite import Interpreter
+    return Interpreter(model_path=path, num_threads=num_threads)
+
+
+class BatchPredictor(ABC):
+    """Batching and latency bookkeeping shared by `machine_learning.InferenceRunner` and `LiteModel`.
+
+    `predict` returns (classes, confidences) arrays, windows can be queued with `submit` and predicted together
+    by `flush`, and every model call is timed. Subclasses set `input_shape` and `backend`, and implement
+    `_predict_batch` for their runtime.
+    """
+
+    backend = None
+
+    def __init__(self, max_batch_size, minimum_confidence, default, latency_history):
+        self.max_batch_size = max_batch_size
+        self.minimum_confidence = minimum_confidence
+        self.default = default
+        self.latencies = deque(maxlen=latency_history)
+        self._pending = []
+
+    @abstractmethod
+    def _predict_batch(self, windows) -> np.ndarray:
+        """Class probabilities of up to `max_batch_size` contiguous float32 windows of shape (n, *input_shape)."""
+
+    def warm_up(self):
+        """Run the model at the batch sizes it will see, outside the timed path."""
+        for batch_size in {1, self.max_batch_size}:
+            self._predict_batch(np.zeros((batch_size,) + self.input_shape, dtype=np.float32))
+
+    def predict_probabilities(self, windows):
+        """Class probabilities of shape (windows, classes).
+
+        Raises:
+            ValueError: If the windows don't have the model's input shape, see `as_window_batch`
+        """
+        windows = np.ascontiguousarray(as_window_batch(windows, self.input_shape))
+        probabilities = []
+        for start in range(0, len(windows), self.max_batch_size):
+            call_start = perf_counter()
+            probabilities.append(np.asarray(self._predict_batch(windows[start : start + self.max_batch_size])))
+            self.latencies.append(perf_counter() - call_start)
+            metrics.observe("inference_seconds", self.latencies[-1], backend=self.backend)
+            metrics.inc("inference_windows_total", len(probabilities[-1]), backend=self.backend)
+        return np.concatenate(probabilities) if probabilities else np.empty((0, 0), dtype=np.float32)
+
+    def predict(self, windows):
+        """Predict a batch of windows.
+
+        Arguments:
+            windows {np.ndarray} -- Array of shape (windows, *input_shape). A trailing channel axis of size 1
+                                    (as EEGNet expects) is added if missing.
+
+        Raises:
+            ValueError: If the windows don't have the model's input shape
+
+        Returns:
+            tuple[np.ndarray, np.ndarray] -- (predicted classes, confidences), one per window
+        """
+        windows = np.asarray(windows)
+        if windows.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return get_predictions(self.predict_probabilities(windows), self.minimum_confidence, self.default)
+
+    def submit(self, window):
+        """Queue a window to be predicted by the next `flush`."""
+        self._pending.append(window)
+
+    def flush(self):
+        """Predict every queued window as one micro-batch."""
+        windows, self._pending = self._pending, []
+        return self.predict(np.stack(windows) if windows else np.empty((0,) + self.input_shape))
+
+    def latency_stats(self):
+        """Latency percentiles of recent model calls, in milliseconds."""
+        return latency_stats(self.latencies)
+
+
+class LiteModel(BatchPredictor):
+    """Run an exported ".tflite" or ".onnx" model on the CPU with only the light runtime loaded.
+
+    Predicts the same way as `machine_learning.InferenceRunner`, see `BatchPredictor`.
+    """
+
+    def __init__(
+        self,
+        path,
+        max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+        minimum_confidence=0.0,
+        default=-1,
+        num_threads=None,
+        latency_history=DEFAULT_LATENCY_HISTORY,
+    ):
+        """
+        Arguments:
+            path {str} -- Model written by `export_tflite` or `export_onnx`
+
+        Keyword Arguments:
+            max_batch_size {int} -- Most windows passed to the model in one call (default: {32})
+            minimum_confidence {float} -- Confidence below which `default` is predicted (default: {0.0})
+            default {int} -- Class predicted when the model isn't confident enough (default: {-1})
+            num_threads {int} -- CPU threads used by the runtime. Defaults to the runtime's choice (default: {None})
+            latency_history {int} -- Number of recent model calls kept for latency statistics (default: {1000})
+        """
+        super().__init__(max_batch_size, minimum_confidence, default, latency_history)
+        self.path = path
+
+        if os.path.splitext(path)[1].lower() == ".onnx":
+            self.backend = "onnx"
+            self._load_onnx(num_threads)
+        else:
+            self.backend = "tflite"
+            self._load_tflite(num_threads)
+        self.warm_up()
+
+    def _load_onnx(self, num_threads):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self._session = onnxruntime.InferenceSession(
+            self.path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        self.input_shape = tuple(model_input.shape[1:])
+        self._run = lambda windows: self._session.run(None, {self._input_name: windows})[0]
+
+    def _load_tflite(self, num_threads):
+        self._interpreter = _load_tflite_interpreter(self.path, num_threads)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self.input_shape = tuple(int(size) for size in self._input["shape"][1:])
+        self._batch_size = int(self._input["shape"][0])
+        self._run = self._run_tflite
+
+    def _run_tflite(self, windows):
+        if len(windows) != self._batch_size:
+            # Resizing reallocates the interpreter's tensors, so only do it when the batch size changes
+            self._interpreter.resize_tensor_input(self._input["index"], (len(windows),) + self.input_shape)
+            self._interpreter.allocate_tensors()
+            self._batch_size = len(windows)
+        self._interpreter.set_tensor(self._input["index"], windows)
+        self._interpreter.invoke()
+        return self._interpreter.get_tensor(self._output["index"])
+
+    def _predict_batch(self, windows):
+        return self._run(windows)
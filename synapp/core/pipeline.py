@@ -0,0 +1,372 @@
+"""Online BCI pipeline: device samples in, actions out.
+
+An `OnlinePipeline` runs five stages on their own threads, connected by bounded queues:
+
+    acquire -> filter -> window -> infer -> debounce/dispatch
+
+- acquire: `feed` is the device callback (`callback(samples, timestamps)`, like `Muse(callback_eeg=...)`).
+  It only stamps the chunk's arrival time and queues it, so the device thread is never held up.
+- filter: a `FilterBank`, which carries its state between chunks.
+- window: filtered samples go into a `RingBuffer`, and a window of `window_length` samples is cut every
+  `hop` samples.
+- infer: queued windows are predicted together as one micro-batch, by a `model_runtime.LiteModel`
+  (exported TFLite/ONNX model, no TensorFlow) or a `machine_learning.InferenceRunner` (Keras model).
+- debounce/dispatch: a class's label must be predicted `consecutive` times in a row, and at most once per
+  `refractory_period`, before its `Action` is handed to an `ActionDispatcher`, which presses keys on its
+  own worker so a slow key press never holds up the predictions behind it.
+
+A full queue drops its oldest item, so a slow stage sheds stale data rather than falling further behind.
+The latency from a window's last chunk arriving to its action finishing is recorded for every dispatch.
+"""
+
+import queue
+import threading
+from collections import deque
+from time import perf_counter
+from typing import Callable, Dict, NamedTuple, Optional
+
+import numpy as np
+
+from synapp.core import metrics
+from synapp.core.action_management import Action, ActionDispatcher, getaction, getBlinkRightLeftActions
+from synapp.core.filtering import FilterBank
+from synapp.core.logging import logger
+from synapp.core.machine_learning import InferenceRunner, getWinkBlinkPredictionMapping
+from synapp.core.model_runtime import latency_stats
+from synapp.core.ring_buffer import RingBuffer
+
+DEFAULT_WINDOW_LENGTH = 128  # samples
+DEFAULT_HOP = 32  # samples
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_MAX_BATCH_SIZE = 8
+DEFAULT_CONSECUTIVE = 2
+DEFAULT_REFRACTORY_PERIOD = 1.0  # sec
+DEFAULT_LATENCY_HISTORY = 1000
+LITE_MODEL_EXTENSIONS = (".tflite", ".onnx")
+
+
+class Window(NamedTuple):
+    samples: np.ndarray  # float32 (channels, window_length)
+    timestamp: float  # timestamp of the window's last sample
+    arrival_time: float  # perf_counter() when the chunk completing the window was received
+
+
+class Prediction(NamedTuple):
+    label: str
+    confidence: float
+    timestamp: float
+    arrival_time: float
+
+
+def make_runner(model, max_batch_size=DEFAULT_MAX_BATCH_SIZE, minimum_confidence=0.0, default=-1):
+    """Wrap a model in the fastest available runner.
+
+    Arguments:
+        model -- Path of a model exported with `model_runtime.export_tflite`/`export_onnx` (run without
+                 TensorFlow), path of a saved Keras model, a Keras model, or an already constructed runner
+                 with a `predict(windows) -> (classes, confidences)` method
+
+    Returns:
+        A `LiteModel` or `InferenceRunner`
+    """
+    if isinstance(model, str):
+        if model.lower().endswith(LITE_MODEL_EXTENSIONS):
+            from synapp.core.model_runtime import LiteModel
+
+            return LiteModel(
+                model, max_batch_size=max_batch_size, minimum_confidence=minimum_confidence, default=default
+            )
+        import tensorflow as tf
+
+        model = tf.keras.models.load_model(model, compile=False)
+    elif hasattr(model, "predict") and hasattr(model, "latency_stats"):
+        return model
+
+    return InferenceRunner(model, max_batch_size=max_batch_size, minimum_confidence=minimum_confidence, default=default)
+
+
+class Debouncer:
+    """Passes a label on once it has been seen `consecutive` times in a row, at most once per refractory period.
+
+    After firing, the label needs a fresh run of `consecutive` predictions to fire again. `None` breaks a run.
+    """
+
+    def __init__(self, consecutive: int = DEFAULT_CONSECUTIVE, refractory_period: float = DEFAULT_REFRACTORY_PERIOD):
+        self.consecutive = consecutive
+        self.refractory_period = refractory_period
+        self._label = None
+        self._count = 0
+        self._last_fired = None
+
+    def update(self, label: Optional[str], now: float) -> Optional[str]:
+        """Add the next prediction, made at time `now` (sec). Returns the label if it should fire."""
+        if label is None or label != self._label:
+            self._label = label
+            self._count = 0
+        if label is None:
+            return None
+        self._count += 1
+        if self._count < self.consecutive:
+            return None
+        if self._last_fired is not None and now - self._last_fired < self.refractory_period:
+            return None
+        self._count = 0
+        self._last_fired = now
+        return label
+
+
+def _put_dropping_oldest(destination: queue.Queue, item, stage: str):
+    """Queue an item, discarding the oldest one if the queue is full"""
+    while True:
+        try:
+            destination.put_nowait(item)
+            break
+        except queue.Full:
+            try:
+                destination.get_nowait()
+                metrics.inc("pipeline_dropped_total", stage=stage)
+            except queue.Empty:
+                pass
+    metrics.set_gauge("pipeline_queue_depth", destination.qsize(), stage=stage)
+
+
+_STOP = None
+
+
+class OnlinePipeline:
+    """Streams a device through filtering, windowing, inference and debouncing to `Action`s.
+
+    Start it with a device, or without one and call `feed` with chunks yourself:
+
+        pipeline = OnlinePipeline("model.tflite", num_channels=4)
+        with pipeline.start(device):
+            time.sleep(60)
+        print(pipeline.latency_stats())
+    """
+
+    def __init__(
+        self,
+        model,
+        num_channels: int,
+        sample_rate: int = 256,
+        window_length: int = DEFAULT_WINDOW_LENGTH,
+        hop: int = DEFAULT_HOP,
+        filter_settings: dict = None,
+        prediction_map: Dict[int, str] = None,
+        actions: Dict[str, Action] = None,
+        minimum_confidence: float = 0.0,
+        consecutive: int = DEFAULT_CONSECUTIVE,
+        refractory_period: float = DEFAULT_REFRACTORY_PERIOD,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        on_prediction: Callable = None,
+        latency_history: int = DEFAULT_LATENCY_HISTORY,
+    ):
+        """
+        Arguments:
+            model -- Model or runner to predict with, see `make_runner`
+            num_channels {int} -- Channels delivered to `feed`. Extra rows (e.g. a Muse's AUX channel) are dropped
+
+        Keyword Arguments:
+            sample_rate {int} -- Sample rate of the device (default: {256})
+            window_length {int} -- Samples per window, as the model expects (default: {128})
+            hop {int} -- Samples between the starts of consecutive windows (default: {32})
+            filter_settings {dict} -- Keyword arguments for `FilterBank`. False skips filtering (default: {None})
+            prediction_map {dict} -- Class number to label. Defaults to `getWinkBlinkPredictionMapping` (default: {None})
+            actions {dict} -- Label to `Action`. Defaults to `getBlinkRightLeftActions` (default: {None})
+            minimum_confidence {float} -- Confidence below which no class is predicted (default: {0.0})
+            consecutive {int} -- Predictions of the same label in a row needed to act on it (default: {2})
+            refractory_period {float} -- Shortest time between two actions, in seconds (default: {1.0})
+            max_batch_size {int} -- Most windows predicted in one model call (default: {8})
+            queue_size {int} -- Capacity of each queue between stages (default: {64})
+            on_prediction {Callable} -- Called with every `Prediction`, from the dispatch thread (default: {None})
+            latency_history {int} -- Number of recent dispatches kept for latency statistics (default: {1000})
+        """
+        if hop <= 0 or window_length <= 0:
+            raise ValueError(f"window_length and hop must be positive, got {window_length}, {hop}")
+        self.runner = make_runner(model, max_batch_size, minimum_confidence)
+        self.num_channels = num_channels
+        self.sample_rate = sample_rate
+        self.window_length = window_length
+        self.hop = hop
+        self.filter_settings = filter_settings
+        self.prediction_map = prediction_map if prediction_map is not None else getWinkBlinkPredictionMapping()
+        self.actions = actions if actions is not None else getBlinkRightLeftActions()
+        self.max_batch_size = max_batch_size
+        self.queue_size = queue_size
+        self.on_prediction = on_prediction
+        self.debouncer = Debouncer(consecutive, refractory_period)
+        self.latencies = deque(maxlen=latency_history)
+        self.dispatched = deque(maxlen=latency_history)  # (label, latency in seconds) of recent actions
+
+        # Rate limiting is the debouncer's job, the dispatcher only coalesces and runs actions off-thread
+        self.dispatcher = ActionDispatcher(refractory_period=0.0, on_executed=self._on_executed)
+
+        self.errors = []  # (stage, exception) of stages that failed
+
+        self._queues = {}
+        self._threads = []
+        self._streamer = None
+        self._running = False
+        # Held while feeding, so stop() can't queue the end marker in the middle of a feed
+        self._feed_lock = threading.Lock()
+
+    def start(self, device=None) -> "OnlinePipeline":
+        """Start the stage threads, and stream from `device` into `feed` if one is given."""
+        if self._running:
+            raise RuntimeError("Pipeline is already running")
+        self._queues = {stage: queue.Queue(self.queue_size) for stage in ("filter", "window", "infer", "dispatch")}
+        stages = {
+            "filter": self._filter_stage,
+            "window": self._window_stage,
+            "infer": self._infer_stage,
+            "dispatch": self._dispatch_stage,
+        }
+        self._threads = [
+            threading.Thread(target=target, name=f"Pipeline-{stage}", daemon=True) for stage, target in stages.items()
+        ]
+        self.dispatcher.start()
+        for thread in self._threads:
+            thread.start()
+        self._running = True
+        if device is not None:
+            self._streamer = device.stream(callback=self.feed)
+        logger.info("Online pipeline started")
+        return self
+
+    def feed(self, samples, timestamps):
+        """Acquire stage: queue a chunk of shape (channels, n). Has the signature of a device callback."""
+        chunk = (np.asarray(samples)[: self.num_channels], np.asarray(timestamps), perf_counter())
+        with self._feed_lock:
+            if not self._running:
+                return
+            _put_dropping_oldest(self._queues["filter"], chunk, "filter")
+
+    def stop(self):
+        """Stop the device, let the stages finish what is already queued, and wait for them."""
+        with self._feed_lock:
+            if not self._running:
+                return
+            # No chunk is queued after this, so nothing can drop the end marker once it is in the queue
+            self._running = False
+        if self._streamer is not None:
+            self._streamer.stop_streaming()
+            self._streamer = None
+        # Blocking put, so a full queue delays the end marker instead of dropping it
+        self._queues["filter"].put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.dispatcher.stop()
+        logger.info(f"Online pipeline stopped, end-to-end latency: {self.latency_stats()}")
+
+    def latency_stats(self) -> dict:
+        """End-to-end latency percentiles, from chunk arrival to action finished, in milliseconds."""
+        return latency_stats(self.latencies)
+
+    def _filter_stage(self):
+        source, destination = self._queues["filter"], self._queues["window"]
+        try:
+            filter_bank = None
+            if self.filter_settings is not False:
+                filter_bank = FilterBank(**{"sample_rate": self.sample_rate, **(self.filter_settings or {})})
+            while (chunk := source.get()) is not _STOP:
+                samples, timestamps, arrival_time = chunk
+                if filter_bank is not None:
+                    with metrics.timer("pipeline_stage_seconds", stage="filter"):
+                        samples = filter_bank.filter(samples)
+                _put_dropping_oldest(destination, (samples, timestamps, arrival_time), "window")
+        except Exception as e:
+            self._stage_failed("filter", e, source)
+        finally:
+            destination.put(_STOP)
+
+    def _window_stage(self):
+        source, destination = self._queues["window"], self._queues["infer"]
+        try:
+            buffer = RingBuffer(self.num_channels, 4 * max(self.window_length, self.hop))
+            window_end = self.window_length
+            while (chunk := source.get()) is not _STOP:
+                samples, timestamps, arrival_time = chunk
+                buffer.append(samples, timestamps)
+                while buffer.total_written >= window_end:
+                    try:
+                        window_timestamps, window_samples = buffer.span(window_end - self.window_length, window_end)
+                    except IndexError:
+                        # A chunk larger than the buffer: skip to the newest window on the hop grid
+                        behind = buffer.total_written - window_end
+                        window_end += behind - behind % self.hop
+                        continue
+                    window = Window(window_samples.astype(np.float32), float(window_timestamps[-1]), arrival_time)
+                    _put_dropping_oldest(destination, window, "infer")
+                    window_end += self.hop
+        except Exception as e:
+            self._stage_failed("window", e, source)
+        finally:
+            destination.put(_STOP)
+
+    def _infer_stage(self):
+        source, destination = self._queues["infer"], self._queues["dispatch"]
+        stopping = False
+        try:
+            while not stopping:
+                windows = [source.get()]
+                # Micro-batch whatever else has queued up meanwhile
+                while len(windows) < self.max_batch_size:
+                    try:
+                        windows.append(source.get_nowait())
+                    except queue.Empty:
+                        break
+                if windows[-1] is _STOP:
+                    windows.pop()
+                    stopping = True
+                if not windows:
+                    continue
+                with metrics.timer("pipeline_stage_seconds", stage="infer"):
+                    classes, confidences = self.runner.predict(np.stack([window.samples for window in windows]))
+                for window, predicted_class, confidence in zip(windows, classes, confidences):
+                    label = self.prediction_map.get(int(predicted_class))
+                    prediction = Prediction(label, float(confidence), window.timestamp, window.arrival_time)
+                    _put_dropping_oldest(destination, prediction, "dispatch")
+        except Exception as e:
+            # The end marker may already have been taken with the failing batch
+            self._stage_failed("infer", e, None if stopping else source)
+        finally:
+            destination.put(_STOP)
+
+    def _dispatch_stage(self):
+        source = self._queues["dispatch"]
+        try:
+            while (prediction := source.get()) is not _STOP:
+                if self.on_prediction is not None:
+                    self.on_prediction(prediction)
+                action = getaction(prediction.label, self.actions)
+                label = self.debouncer.update(prediction.label if action is not None else None, perf_counter())
+                if label is not None:
+                    self.dispatcher.submit(action, key=label, submitted_at=prediction.arrival_time)
+        except Exception as e:
+            self._stage_failed("dispatch", e, source)
+
+    def _stage_failed(self, stage: str, error: Exception, source: Optional[queue.Queue]):
+        """Log a stage's failure, then discard its input until the end marker arrives.
+
+        Draining keeps the stages upstream, and `stop`, from blocking on a queue nothing reads any more.
+        """
+        logger.error(f"Pipeline {stage} stage failed: {error}", exc_info=1)
+        metrics.inc("pipeline_stage_errors_total", stage=stage)
+        self.errors.append((stage, error))
+        if source is not None:
+            while source.get() is not _STOP:
+                pass
+
+    def _on_executed(self, label, action, arrival_time):
+        latency = perf_counter() - arrival_time
+        self.latencies.append(latency)
+        self.dispatched.append((label, latency))
+        metrics.observe("pipeline_latency_seconds", latency)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
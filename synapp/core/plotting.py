@@ -1,15 +1,267 @@
 #!/usr/bin/env python
 
+from time import perf_counter
+from typing import Union
+
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
+from matplotlib.collections import LineCollection
 
-from synapp.core import data_parsing as data_parsing
-from synapp.core.data_parsing import get_FFT_from_timeseries
+from synapp.core.markers import MarkerIndex
+from synapp.core.recording import Recording
+from synapp.core.ring_buffer import RingBuffer
+from synapp.core.spectral import amplitude_spectrum, welch_psd
 
 DEFAULT_PLAYBACK_SPEED = 1.0
 DEFAULT_STEP_SIZE = 64
-DEFAULT_SAMPLE_RATE = 2
+DEFAULT_SAMPLE_RATE = 256
+DEFAULT_MAX_POINTS = 1000
+DECIMATION_BLOCK_SIZE = 1 << 20  # samples per channel read at a time
+DEFAULT_PSD_SEGMENT_DURATION = 2.0  # sec per Welch segment
+DEFAULT_FPS = 30
+DEFAULT_FREQUENCY_LIMIT = 40  # Hz
+FOURIER_TICKS = np.asarray([0, 5, 10, 12, 15, 20, 25, 30, 35, 40])
+Y_MARGIN = 0.25  # headroom added to a channel's range when it is rescaled
+Y_SHRINK = 0.25  # a channel is rescaled when it fills less than this fraction of its range
+
+
+def minmax_decimate(timestamps, samples, max_points=DEFAULT_MAX_POINTS):
+    """Reduce samples to at most `max_points` per channel for display, keeping each bucket's min and max
+    so spikes and blinks stay visible. If the buckets don't divide evenly, the oldest samples form a shorter
+    first bucket, so every sample is represented.
+
+    Samples are read `DECIMATION_BLOCK_SIZE` at a time, so a memory-mapped recording is never loaded whole.
+
+    Arguments:
+        timestamps {np.ndarray} -- Timestamps of shape (n,)
+        samples {np.ndarray} -- Samples of shape (channels, n)
+
+    Keyword Arguments:
+        max_points {int} -- Most points kept per channel (default: {1000})
+
+    Returns:
+        tuple[np.ndarray, np.ndarray] -- (timestamps, samples), unchanged if already short enough
+    """
+    num_channels, num_samples = samples.shape
+    max_buckets = max_points // 2
+    if num_samples <= max_points or max_buckets == 0:
+        return timestamps, samples
+    # Rounded up, so the full buckets plus a partial one still fit in max_points
+    bucket_size = -(-num_samples // max_buckets)
+    full_buckets = num_samples // bucket_size
+    start = num_samples - full_buckets * bucket_size
+    partial = 1 if start else 0
+
+    decimated = np.empty((num_channels, 2 * (partial + full_buckets)), dtype=samples.dtype)
+    times = np.empty(2 * (partial + full_buckets), dtype=np.float64)
+    if partial:
+        oldest = np.asarray(samples[:, :start])
+        decimated[:, 0] = oldest.min(axis=1)
+        decimated[:, 1] = oldest.max(axis=1)
+        times[0], times[1] = timestamps[0], timestamps[start - 1]
+
+    buckets_per_block = max(1, DECIMATION_BLOCK_SIZE // bucket_size)
+    for first in range(0, full_buckets, buckets_per_block):
+        last = min(first + buckets_per_block, full_buckets)
+        block = np.asarray(samples[:, start + first * bucket_size : start + last * bucket_size])
+        block = block.reshape(num_channels, last - first, bucket_size)
+        decimated[:, 2 * (partial + first) : 2 * (partial + last) : 2] = block.min(axis=2)
+        decimated[:, 2 * (partial + first) + 1 : 2 * (partial + last) : 2] = block.max(axis=2)
+
+    times[2 * partial :: 2] = timestamps[start::bucket_size]
+    times[2 * partial + 1 :: 2] = timestamps[start + bucket_size - 1 :: bucket_size]
+    return times, decimated
+
+
+class SignalPlot:
+    """Fast redrawing of a sliding window of EEG, for playback and live streams.
+
+    Channels are stacked on one time axis, each scaled to its own band, and drawn as one `LineCollection`.
+    The figure is drawn in full once; each `update` then only replaces the artists' data and blits them
+    over the cached background, instead of clearing and re-plotting every axis. Channels are rescaled in
+    NumPy, so only a resized figure or a growing spectrum needs a full redraw. Time is shown relative to
+    the newest sample, so the x axis never has to move, and long windows are min/max decimated to about
+    one point per pixel.
+    """
+
+    def __init__(
+        self,
+        num_channels,
+        window_length,
+        sample_rate=DEFAULT_SAMPLE_RATE,
+        fourier_channel=0,
+        channel_names=None,
+        max_points=None,
+        amplitude_limits=None,
+        frequency_limit=DEFAULT_FREQUENCY_LIMIT,
+        title="Playback",
+        figure=None,
+    ):
+        """
+        Arguments:
+            num_channels {int} -- Channels to show
+            window_length {int} -- Samples in each window shown
+
+        Keyword Arguments:
+            sample_rate {int} -- Sample rate of the data (default: {256})
+            fourier_channel {int} -- Row of the samples passed to `update` whose amplitude spectrum is shown, which
+                                     may be past `num_channels`. None for no spectrum (default: {0})
+            channel_names {list} -- Labels of the channels (default: {None})
+            max_points {int} -- Most points drawn per channel. Defaults to the plot's width in pixels (default: {None})
+            amplitude_limits {tuple} -- Fixed (low, high) amplitude shown for every channel. Autoscaled if None (default: {None})
+            frequency_limit {float} -- Highest frequency shown in the spectrum, in Hz (default: {40})
+            title {str} -- Title of the figure (default: {"Playback"})
+            figure {plt.Figure} -- Figure to draw in. A new one is created if None (default: {None})
+        """
+        self.num_channels = num_channels
+        self.window_length = window_length
+        self.sample_rate = sample_rate
+        self.fourier_channel = fourier_channel
+        self.max_points = max_points
+        self.frames = 0
+
+        # Channel i is drawn around offset num_channels - 1 - i, so the first channel is at the top
+        self._offsets = np.arange(num_channels - 1, -1, -1, dtype=np.float64)[:, np.newaxis]
+        if amplitude_limits is None:
+            self._centers = None
+            self._scales = np.zeros(num_channels)
+        else:
+            low, high = amplitude_limits
+            self._centers = np.full(num_channels, (low + high) / 2)
+            self._scales = np.full(num_channels, (high - low) / 2)
+
+        self.figure = figure or plt.figure(figsize=(12, max(4, 0.3 * num_channels)))
+        self.figure.suptitle(title)
+        if fourier_channel is None:
+            grid = self.figure.add_gridspec(1, 1)
+        else:
+            grid = self.figure.add_gridspec(1, 2, width_ratios=[3, 1])
+        self.ax = self.figure.add_subplot(grid[0, 0])
+        self.ax.set_xlim(-window_length / sample_rate, 0)
+        self.ax.set_ylim(-0.5, num_channels - 0.5)
+        self.ax.set_yticks(self._offsets[:, 0])
+        self.ax.set_yticklabels(channel_names if channel_names is not None else range(1, num_channels + 1))
+        self.ax.set_xlabel("Time (sec)")
+        self.ax.grid(axis="x")
+
+        self.lines = LineCollection([], colors="blue", linewidths=0.5, animated=True)
+        self.ax.add_collection(self.lines)
+        # Marker positions are in data coordinates along x, and span the whole axis vertically
+        self.marker_lines = LineCollection([], colors="red", linewidths=0.75, animated=True)
+        self.marker_lines.set_transform(self.ax.get_xaxis_transform())
+        self.ax.add_collection(self.marker_lines)
+        self._artists = [self.lines, self.marker_lines]
+
+        self.fourier_ax = None
+        self.fourier_line = None
+        if fourier_channel is not None:
+            self.fourier_ax = self.figure.add_subplot(grid[0, 1])
+            self.fourier_ax.set_xlim(1, frequency_limit)
+            self.fourier_ax.set_ylim(0, 10)
+            self.fourier_ax.set_xticks(FOURIER_TICKS[FOURIER_TICKS <= frequency_limit])
+            self.fourier_ax.set_xlabel("Frequency (Hz)")
+            (self.fourier_line,) = self.fourier_ax.plot([], [], color="green", linewidth=0.33, animated=True)
+            self._artists.append(self.fourier_line)
+
+        self._background = None
+        self.figure.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def update(self, timestamps, samples, marker_timestamps=()):
+        """Show a new window.
+
+        Arguments:
+            timestamps {np.ndarray} -- Timestamps of shape (n,)
+            samples {np.ndarray} -- Samples of shape (channels, n). Rows past `num_channels` are ignored
+
+        Keyword Arguments:
+            marker_timestamps {np.ndarray} -- Timestamps of markers to draw as vertical lines (default: {()})
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if len(timestamps) == 0:
+            return
+        all_samples = np.asarray(samples)
+        samples = all_samples[: self.num_channels]
+        newest = timestamps[-1]
+        max_points = self.max_points or max(int(self.ax.bbox.width), 2)
+        times, values = minmax_decimate(timestamps - newest, samples, max_points)
+
+        # A new array every frame, as the collection keeps it, so it never holds the caller's (e.g. ring buffer) memory
+        segments = np.empty((self.num_channels, len(times), 2))
+        segments[:, :, 0] = times
+        segments[:, :, 1] = self._scaled(values)
+        self.lines.set_segments(segments)
+
+        marker_times = np.asarray(marker_timestamps, dtype=np.float64) - newest
+        marker_segments = np.empty((len(marker_times), 2, 2))
+        marker_segments[:, :, 0] = marker_times[:, np.newaxis]
+        marker_segments[:, 0, 1] = 0
+        marker_segments[:, 1, 1] = 1
+        self.marker_lines.set_segments(marker_segments)
+
+        redraw = False
+        if self.fourier_line is not None:
+            amplitudes, frequencies = amplitude_spectrum(all_samples[self.fourier_channel], self.sample_rate)
+            self.fourier_line.set_data(frequencies, amplitudes)
+            # Grow the spectrum's axis if needed, but never shrink it, so it doesn't keep jumping around
+            peak = amplitudes[frequencies >= 1].max(initial=0)
+            if peak > self.fourier_ax.get_ylim()[1]:
+                self.fourier_ax.set_ylim(0, peak * (1 + Y_MARGIN))
+                redraw = True
+
+        if redraw:
+            self.figure.canvas.draw()
+        else:
+            self.blit()
+        self.frames += 1
+
+    def _scaled(self, values):
+        """Map each channel into its band: offset +/- 0.45 for the channel's range"""
+        if self._centers is None:
+            centers = values.mean(axis=1)
+            half_ranges = np.abs(values - centers[:, np.newaxis]).max(axis=1)
+            # Rescale channels outside, or much smaller than, their current range, with some headroom
+            rescale = (half_ranges > self._scales) | (half_ranges < Y_SHRINK * self._scales) | (self._scales == 0)
+            self._scales[rescale] = np.maximum(half_ranges[rescale] * (1 + Y_MARGIN), 1e-12)
+        else:
+            centers = self._centers
+        return self._offsets + 0.45 * (values - centers[:, np.newaxis]) / self._scales[:, np.newaxis]
+
+    def blit(self):
+        """Draw the artists over the cached background, without redrawing anything else."""
+        canvas = self.figure.canvas
+        if self._background is None:
+            canvas.draw()
+            return
+        canvas.restore_region(self._background)
+        self._draw_artists()
+        canvas.blit(self.figure.bbox)
+
+    def _on_draw(self, event):
+        # A full draw skips the animated artists, so this is the background to blit them over
+        self._background = self.figure.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in self._artists:
+            self.figure.draw_artist(artist)
+
+    def is_open(self) -> bool:
+        """Whether the figure's window is still open. Figures not made through pyplot are always open."""
+        manager = self.figure.canvas.manager
+        return manager is None or plt.fignum_exists(manager.num)
+
+    def show(self):
+        """Show the figure's window without blocking, if it has one."""
+        if self.figure.canvas.manager is not None:
+            plt.show(block=False)
+
+    def wait(self, seconds):
+        """Handle GUI events for `seconds`, without the full redraw `plt.pause` would do."""
+        if seconds > 0:
+            self.figure.canvas.start_event_loop(seconds)
+        else:
+            self.figure.canvas.flush_events()
 
 
 def playback_data(
@@ -21,66 +273,141 @@ def playback_data(
     step_size=DEFAULT_STEP_SIZE,
     num_channels=5,
     fourier_channel=5,
+    sample_rate=DEFAULT_SAMPLE_RATE,
+    max_points=None,
+    show=True,
 ):
-    curr_start = 0
-    curr_end = display_window_length
-    display_timestamps = timestamps[curr_start:curr_end]
-    display_samples = samples[:, curr_start:curr_end]
-
-    display_amp, display_freq = data_parsing.get_FFT_from_timeseries(display_samples, DEFAULT_SAMPLE_RATE)
-
-    fig = plt.figure(constrained_layout=True)
-    gs = fig.add_gridspec(5, 2)
-    axes = []
-    for i in range(0, num_channels):
-        axes.append(fig.add_subplot(gs[i, 0]))
-    fourier_ax = fig.add_subplot(gs[:, 1])
-
-    fig.suptitle("Playback")
-
-    fourierticks = np.asarray([0, 5, 10, 12, 15, 20, 25, 30, 35, 40])
+    """Play a recording back as a sliding window, with its markers and one channel's amplitude spectrum
 
-    for i in range(0, num_channels):
-        axes[i].plot(display_timestamps, display_samples[i, :], color="blue", linewidth=0.25)
-    fourier_ax.set_xlim([0.2, 40])
-    fourier_ax.set_ylim([0, 10])
-    fourier_ax.plot(display_freq, display_amp, color="green", linewidth=0.25)
-
-    plt.pause(0.1)
+    Arguments:
+        timestamps {np.ndarray} -- Timestamps of shape (n,)
+        samples {np.ndarray} -- Samples of shape (channels, n)
+        markers -- Markers, as accepted by `MarkerIndex.from_markers`
+        display_window_length {int} -- Samples shown at once
 
-    while curr_end + step_size <= np.shape(timestamps)[0]:
-        curr_start += step_size
-        curr_end += step_size
+    Keyword Arguments:
+        playback_speed {float} -- Steps per second (default: {1.0})
+        step_size {int} -- Samples the window moves each step (default: {64})
+        num_channels {int} -- Channels shown (default: {5})
+        fourier_channel {int} -- Channel whose spectrum is shown, counting from 1 (default: {5})
+        sample_rate {int} -- Sample rate of the data (default: {256})
+        max_points {int} -- Most points drawn per channel. Defaults to the plot's width in pixels (default: {None})
+        show {bool} -- Whether to call `plt.show()` once playback ends (default: {True})
+
+    Returns:
+        SignalPlot -- The plot that was played back
+    """
+    timestamps = np.asarray(timestamps)
+    plot = SignalPlot(
+        num_channels,
+        display_window_length,
+        sample_rate,
+        fourier_channel=fourier_channel - 1,
+        max_points=max_points,
+    )
+
+    # Every window's markers at once, rather than a query per frame
+    marker_index = MarkerIndex.from_markers(markers)
+    starts = np.arange(0, max(len(timestamps) - display_window_length + 1, 0), step_size)
+    ends = starts + display_window_length
+    marker_timestamps = marker_index.timestamps
+    first_markers = np.searchsorted(marker_timestamps, timestamps[starts], side="left")
+    last_markers = np.searchsorted(marker_timestamps, timestamps[ends - 1], side="left")
+
+    plot.show()
+    frame_interval = 1 / playback_speed
+    next_frame = perf_counter()
+    for start, end, first, last in zip(starts, ends, first_markers, last_markers):
+        if not plot.is_open():
+            break
+        plot.update(timestamps[start:end], samples[:, start:end], marker_timestamps[first:last])
+        next_frame += frame_interval
+        plot.wait(next_frame - perf_counter())
 
-        display_timestamps = timestamps[curr_start:curr_end]
-        display_samples = samples[:, curr_start:curr_end]
+    if show:
+        plt.show()
+    return plot
 
-        display_amp, display_freq = data_parsing.get_FFT_from_timeseries(display_samples[fourier_channel - 1], 256)
 
-        fourier_ax.cla()
+def playback_ring_buffer(
+    buffer: RingBuffer,
+    display_window_length,
+    sample_rate=DEFAULT_SAMPLE_RATE,
+    fps=DEFAULT_FPS,
+    duration=None,
+    markers: MarkerIndex = None,
+    fourier_channel=1,
+    **plot_options,
+):
+    """Show the newest samples of a `RingBuffer` that another thread (e.g. a device callback) is filling,
+    until the figure is closed or `duration` has passed.
 
-        fourier_ax.set_xlim([1, 40])
-        fourier_ax.set_ylim([0, 10])
-        fourier_ax.set_xticks(fourierticks)
+    Arguments:
+        buffer {RingBuffer} -- Buffer being filled
+        display_window_length {int} -- Samples shown at once
 
-        display_marker_timestamps, display_marker_strings = data_parsing.get_markers_between_timestamps(
-            display_timestamps[0],
-            display_timestamps[-1],
-            markers,
-        )
+    Keyword Arguments:
+        sample_rate {int} -- Sample rate of the data (default: {256})
+        fps {float} -- Frames drawn per second (default: {30})
+        duration {float} -- Seconds to run for. Runs until the figure is closed if None (default: {None})
+        markers {MarkerIndex} -- Markers to draw, which may be added to while playing (default: {None})
+        fourier_channel {int} -- Channel whose spectrum is shown, counting from 1. None for no spectrum (default: {1})
+        **plot_options -- Passed on to `SignalPlot`
+
+    Returns:
+        SignalPlot -- The plot that was shown
+    """
+    plot = SignalPlot(
+        buffer.num_channels,
+        display_window_length,
+        sample_rate,
+        fourier_channel=None if fourier_channel is None else fourier_channel - 1,
+        **plot_options,
+    )
+    plot.show()
+    frame_interval = 1 / fps
+    end_time = None if duration is None else perf_counter() + duration
+    next_frame = perf_counter()
+    last_written = -1
+    while plot.is_open() and (end_time is None or perf_counter() < end_time):
+        if buffer.total_written != last_written:
+            last_written = buffer.total_written
+            timestamps, samples = buffer.latest(display_window_length)
+            # Copied before drawing, as the writer may wrap around onto these views
+            timestamps, samples = timestamps.copy(), samples.copy()
+            marker_timestamps = (
+                () if markers is None or len(timestamps) == 0 else markers.between(timestamps[0], timestamps[-1])[0]
+            )
+            plot.update(timestamps, samples, marker_timestamps)
+        next_frame += frame_interval
+        plot.wait(next_frame - perf_counter())
+    return plot
+
+
+def playback_device(device, display_window_length, num_channels=None, **playback_options):
+    """Stream from a device and show it live, see `playback_ring_buffer`.
 
-        for i in range(0, num_channels):
-            axes[i].cla()
-            axes[i].grid()
-            axes[i].plot(display_timestamps, display_samples[i, :], color="blue", linewidth=0.25)
-            plot_vertical_markers(axis=axes[0], markers=display_marker_timestamps, strings=display_marker_strings)
-        fourier_ax.plot(display_freq, display_amp, color="green", linewidth=0.33)
+    Arguments:
+        device {Device} -- Device to stream from
+        display_window_length {int} -- Samples shown at once
 
-        fig.canvas.draw()
+    Keyword Arguments:
+        num_channels {int} -- Channels shown. Defaults to every channel the device records (default: {None})
+        **playback_options -- Passed on to `playback_ring_buffer`
+    """
+    channel_names = device.channel_names()
+    num_channels = num_channels or len(channel_names)
+    buffer = RingBuffer(num_channels, 4 * display_window_length)
+    playback_options.setdefault("channel_names", channel_names[:num_channels])
 
-        plt.pause(1 / playback_speed)
+    def append(samples, timestamps):
+        buffer.append(np.asarray(samples)[:num_channels], timestamps)
 
-    plt.show()
+    streamer = device.stream(callback=append)
+    try:
+        return playback_ring_buffer(buffer, display_window_length, device.sampling_rate, **playback_options)
+    finally:
+        streamer.stop_streaming()
 
 
 def plot_vertical_markers(axis, markers, strings):
@@ -88,29 +415,54 @@ def plot_vertical_markers(axis, markers, strings):
         axis.vlines(markers, -1, 1, linestyles="-", label=strings[0])
 
 
-def plot_timeseries_dataframe(dataframe: pd.DataFrame, sample_rate, plot_fft=True, title="", show=True):
+def plot_timeseries_dataframe(
+    dataframe: Union[pd.DataFrame, Recording], sample_rate, plot_fft=True, title="", show=True, max_points=None
+):
     """Plot a dataframe representing an EEG recording
 
+    Each channel is min/max decimated to one bucket per pixel column, which looks the same as plotting every
+    sample, and spectra are Welch PSDs. Both read the samples a block at a time, so an hour-long `Recording`
+    is plotted in seconds without being loaded into memory.
+
     Arguments:
-        dataframe {pd.DataFrame} -- Time-series dataframe with
+        dataframe {pd.DataFrame} -- Time-series dataframe indexed by timestamp, or a `Recording`
 
     Keyword Arguments:
-        plot_fft {bool} -- Whether to also show Fourier Transform plots (default: {True})
+        plot_fft {bool} -- Whether to also show power spectral density plots (default: {True})
         title {str} -- Title of the entire figure (default: {""})
         show {bool} -- Whether to automatically call `plt.show()` (default: {True})
-    """
-    fig, axs = plt.subplots(len(dataframe.keys()), 2 if plot_fft else 1, figsize=(10, 15), sharex="col")
+        max_points {int} -- Most points plotted per channel. Defaults to two per pixel column (default: {None})
 
-    normalized_time = dataframe.index - dataframe.index[0]
+    Returns:
+        plt.Figure -- The figure
+    """
+    if isinstance(dataframe, Recording):
+        channels = dataframe.channels
+        timestamps = dataframe.timestamps
+        # (channels, samples) view of the memory map
+        samples = dataframe.samples.T
+    else:
+        channels = list(dataframe.keys())
+        timestamps = dataframe.index.to_numpy(dtype=np.float64)
+        samples = dataframe.to_numpy(dtype=np.float64).T
+
+    fig, axs = plt.subplots(len(channels), 2 if plot_fft else 1, figsize=(10, 15), sharex="col", squeeze=False)
 
     fig.suptitle(title)
 
-    cmap = plt.get_cmap("viridis", len(dataframe.keys()))
+    cmap = plt.get_cmap("viridis", len(channels))
+
+    max_points = max_points or 2 * int(np.ceil(axs[0, 0].bbox.width))
+    normalized_time, decimated = minmax_decimate(timestamps - timestamps[0], samples, max_points)
 
-    for i, (col_name, column) in enumerate(dataframe.items()):
+    if plot_fft:
+        # Every channel at once, a block of segments at a time
+        psd, frequency = welch_psd(samples, sample_rate, segment_length=int(DEFAULT_PSD_SEGMENT_DURATION * sample_rate))
+
+    for i, col_name in enumerate(channels):
         # Plot the time series dataframe
-        ax = axs[i] if not plot_fft else axs[i, 0]
-        ax.plot(normalized_time, column, color=cmap(i))
+        ax = axs[i, 0]
+        ax.plot(normalized_time, decimated[i], color=cmap(i))
         ax.set_ylabel(f"{col_name}\nAmplitude (mv)")
         ax.spines["right"].set_visible(False)
         ax.spines["top"].set_visible(False)
@@ -120,23 +472,22 @@ def plot_timeseries_dataframe(dataframe: pd.DataFrame, sample_rate, plot_fft=Tru
         if i == 0:
             ax.set_title("Time-Series Voltage")
 
-        if i == len(dataframe.keys()) - 1:
+        if i == len(channels) - 1:
             ax.set_xlabel("Time (sec)")
         else:
             ax.spines["bottom"].set_visible(False)
 
         if plot_fft:
-            # Compute and plot the Fourier Transform
-            amplitudes, frequency = get_FFT_from_timeseries(column, 256)
+            # Plot the power spectral density
             ax = axs[i, 1]
-            ax.plot(frequency, amplitudes)
+            ax.plot(frequency, psd[i])
             ax.set_xlim(-0.1, 65)
 
             if i == 0:
-                ax.set_title("FFT")
+                ax.set_title("Power Spectral Density")
 
             ax.set_xlabel("Frequency (Hz)")
-            ax.set_ylabel(f"{col_name}\nMagnitude")
+            ax.set_ylabel(f"{col_name}\nPSD (mv²/Hz)")
 
     # Adjust layout to prevent overlap
     plt.tight_layout(rect=[0, 0.03, 1, 0.95])  # Adjust the rect parameter as needed
@@ -144,3 +495,5 @@ def plot_timeseries_dataframe(dataframe: pd.DataFrame, sample_rate, plot_fft=Tru
 
     if show:
         plt.show()
+
+    return fig
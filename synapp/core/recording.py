@@ -0,0 +1,315 @@
+""" Reading and writing recording folders.
+
+A recording folder contains a `recording_info.yaml` metadata file, and the samples in one of two layouts:
+
+- Chunked (written by `RecordingWriter`): `samples.bin` holds raw little-endian float64 samples in
+  (samples, channels) row-major order, `timestamps.bin` holds one float64 timestamp per sample, and
+  `chunk_index.csv` records each flushed block. Only samples covered by the index are considered valid,
+  so a recording interrupted mid-write is still readable up to the last completed flush.
+- Legacy: a single `data.pkl` DataFrame indexed by timestamp.
+
+Either layout may also have a `markers.csv` with one `timestamp,marker` row per event.
+"""
+
+import os
+import threading
+from typing import TYPE_CHECKING, List
+
+import numpy as np
+
+from synapp.core import metrics
+from synapp.core.logging import logger
+from synapp.core.ring_buffer import RingBuffer
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+RECORDING_INFO_FILE = "recording_info.yaml"
+SAMPLES_FILE = "samples.bin"
+TIMESTAMPS_FILE = "timestamps.bin"
+CHUNK_INDEX_FILE = "chunk_index.csv"
+LEGACY_DATA_FILE = "data.pkl"
+MARKERS_FILE = "markers.csv"
+
+SAMPLE_DTYPE = np.dtype("<f8")
+CHUNK_INDEX_HEADER = "chunk,start_sample,num_samples,first_timestamp,last_timestamp\n"
+DEFAULT_FLUSH_INTERVAL = 5.0  # sec
+
+
+def write_recording_info(folder: str, recording_info: dict):
+    from yaml import safe_dump
+
+    with open(os.path.join(folder, RECORDING_INFO_FILE), "w") as f:
+        safe_dump(recording_info, f)
+
+
+def read_recording_info(folder: str) -> dict:
+    from yaml import safe_load
+
+    with open(os.path.join(folder, RECORDING_INFO_FILE), "r") as f:
+        return safe_load(f)
+
+
+def is_chunked_recording(folder: str) -> bool:
+    return os.path.exists(os.path.join(folder, CHUNK_INDEX_FILE))
+
+
+def is_recording(folder: str) -> bool:
+    """Whether a folder holds a recording, in either layout."""
+    return is_chunked_recording(folder) or os.path.exists(os.path.join(folder, LEGACY_DATA_FILE))
+
+
+def find_recordings(root: str) -> List[str]:
+    """Every recording folder under `root` (including `root` itself), sorted by path.
+
+    Finds both single-device recordings and the device folders inside recording sessions.
+    """
+    folders = []
+    for folder, subfolders, _ in os.walk(root):
+        if is_recording(folder):
+            folders.append(folder)
+            # Recordings don't nest
+            subfolders.clear()
+        else:
+            subfolders.sort()
+    return sorted(folders)
+
+
+def write_markers(folder: str, markers):
+    """Save markers alongside a recording.
+
+    Arguments:
+        folder {str} -- Recording folder
+        markers -- Record array with "marker" and "timestamp" fields, or (marker, timestamp) pairs
+    """
+    import pandas as pd
+
+    if not isinstance(markers, np.ndarray) or markers.dtype.names is None:
+        markers = list(markers)
+        markers = np.rec.fromrecords(markers, names=["marker", "timestamp"]) if markers else _empty_markers()
+    pd.DataFrame({"timestamp": markers["timestamp"], "marker": markers["marker"]}).to_csv(
+        os.path.join(folder, MARKERS_FILE), index=False, float_format="%.17g"
+    )
+
+
+def read_markers(folder: str) -> np.recarray:
+    """Markers saved with a recording, as a record array with "marker" and "timestamp" fields.
+    Empty if the recording has no markers file.
+    """
+    path = os.path.join(folder, MARKERS_FILE)
+    if not os.path.exists(path):
+        return _empty_markers()
+    import pandas as pd
+
+    dataframe = pd.read_csv(
+        path, dtype={"marker": str, "timestamp": np.float64}, keep_default_na=False, float_precision="round_trip"
+    )
+    return np.rec.fromarrays(
+        [dataframe["marker"].to_numpy(dtype=str), dataframe["timestamp"].to_numpy()], names=["marker", "timestamp"]
+    )
+
+
+def _empty_markers() -> np.recarray:
+    return np.rec.fromarrays([np.array([], dtype=str), np.array([], dtype=np.float64)], names=["marker", "timestamp"])
+
+
+class RecordingWriter:
+    """Append-only writer that drains a `RingBuffer` into a chunked recording folder.
+
+    Once `start` is called, a background thread flushes every `flush_interval` seconds, so memory use is
+    bounded by the ring buffer and a crash loses at most one interval of data. The ring buffer must hold
+    comfortably more than one interval of samples, otherwise samples are lost (and counted in `lost_samples`).
+    """
+
+    def __init__(self, folder: str, buffer: RingBuffer, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.folder = folder
+        self.buffer = buffer
+        self.flush_interval = flush_interval
+        self.num_samples = 0
+        self.lost_samples = 0
+        self._num_chunks = 0
+        self._read_position = buffer.total_written
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self._samples_file = open(os.path.join(folder, SAMPLES_FILE), "wb")
+        self._timestamps_file = open(os.path.join(folder, TIMESTAMPS_FILE), "wb")
+        self._index_file = open(os.path.join(folder, CHUNK_INDEX_FILE), "w")
+        self._index_file.write(CHUNK_INDEX_HEADER)
+        self._index_file.flush()
+
+    def start(self):
+        """Start flushing periodically on a background thread."""
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name="RecordingWriter", daemon=True)
+        self._thread.start()
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self) -> int:
+        """Write every sample appended to the buffer since the last flush.
+
+        Returns:
+            int -- Number of samples written
+        """
+        with self._flush_lock, metrics.timer("recording_flush_seconds"):
+            metrics.set_gauge("recording_buffer_depth", self.buffer.total_written - self._read_position)
+            timestamps, samples, lost = self.buffer.since(self._read_position)
+            samples = np.ascontiguousarray(samples.T, dtype=SAMPLE_DTYPE)
+            timestamps = np.ascontiguousarray(timestamps, dtype=SAMPLE_DTYPE)
+            num_new = len(timestamps)
+            self._read_position += lost + num_new
+
+            if lost:
+                self.lost_samples += lost
+                metrics.inc("recording_lost_samples_total", lost)
+                logger.warning(f"Recording writer fell behind, {lost} samples were lost")
+            if num_new == 0:
+                return 0
+
+            samples.tofile(self._samples_file)
+            timestamps.tofile(self._timestamps_file)
+            for f in (self._samples_file, self._timestamps_file):
+                f.flush()
+                os.fsync(f.fileno())
+
+            # The index is only extended once the data it points to is on disk
+            self._index_file.write(
+                f"{self._num_chunks},{self.num_samples},{num_new},{float(timestamps[0])!r},{float(timestamps[-1])!r}\n"
+            )
+            self._index_file.flush()
+            os.fsync(self._index_file.fileno())
+
+            self._num_chunks += 1
+            self.num_samples += num_new
+            return num_new
+
+    def close(self):
+        """Stop the background thread, write any remaining samples and close the files."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        for f in (self._samples_file, self._timestamps_file, self._index_file):
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_chunk_index(folder: str) -> "pd.DataFrame":
+    import pandas as pd
+
+    return pd.read_csv(os.path.join(folder, CHUNK_INDEX_FILE))
+
+
+def _count_indexed_samples(folder: str) -> int:
+    """Total of the chunk index's num_samples column, without loading pandas"""
+    with open(os.path.join(folder, CHUNK_INDEX_FILE)) as f:
+        next(f)
+        return sum(int(line.split(",")[2]) for line in f if line.strip())
+
+
+class Recording:
+    """Lazy, read-only view of a recording folder.
+
+    Chunked recordings are memory-mapped, so opening one is cheap and slicing only touches the pages that
+    are actually read. Legacy `data.pkl` recordings are loaded fully, since pickles can't be mapped.
+
+    Index with a time range to get a DataFrame, e.g. `recording[10.0:20.0]` returns every sample with a
+    timestamp in [10, 20). Use `arrays` to get the same range in the (timestamps, (channels, samples)) form
+    used by `data_parsing`.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        has_info = os.path.exists(os.path.join(folder, RECORDING_INFO_FILE))
+        self.info = read_recording_info(folder) if has_info else {}
+
+        if is_chunked_recording(folder):
+            self.channels = list(self.info["channels"])
+            num_samples = _count_indexed_samples(folder)
+            self.timestamps = _map_array(os.path.join(folder, TIMESTAMPS_FILE), (num_samples,))
+            self.samples = _map_array(os.path.join(folder, SAMPLES_FILE), (num_samples, len(self.channels)))
+        else:
+            import pandas as pd
+
+            dataframe = pd.read_pickle(os.path.join(folder, LEGACY_DATA_FILE))
+            self.channels = list(dataframe.columns)
+            self.timestamps = dataframe.index.to_numpy()
+            self.samples = dataframe.to_numpy()
+
+    @property
+    def sample_rate(self):
+        return self.info.get("sample_rate")
+
+    @property
+    def markers(self) -> np.recarray:
+        return read_markers(self.folder)
+
+    @property
+    def duration(self) -> float:
+        """Seconds between the first and last sample."""
+        return float(self.timestamps[-1] - self.timestamps[0]) if len(self) else 0.0
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def index_range(self, start_time: float = None, end_time: float = None) -> slice:
+        """Sample indices covering timestamps in [start_time, end_time). `None` leaves that side open."""
+        start = 0 if start_time is None else int(np.searchsorted(self.timestamps, start_time, side="left"))
+        end = len(self) if end_time is None else int(np.searchsorted(self.timestamps, end_time, side="left"))
+        return slice(start, max(start, end))
+
+    def arrays(self, start_time: float = None, end_time: float = None):
+        """Get a time range as arrays, without copying.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray] -- (timestamps of shape (n,), samples of shape (channels, n))
+        """
+        indices = self.index_range(start_time, end_time)
+        return self.timestamps[indices], self.samples[indices].T
+
+    def to_dataframe(self, start_time: float = None, end_time: float = None) -> "pd.DataFrame":
+        import pandas as pd
+
+        indices = self.index_range(start_time, end_time)
+        return pd.DataFrame(
+            data=np.asarray(self.samples[indices]),
+            columns=self.channels,
+            index=pd.Index(np.asarray(self.timestamps[indices]), name="timestamps"),
+        )
+
+    def __getitem__(self, key) -> "pd.DataFrame":
+        if not isinstance(key, slice) or key.step is not None:
+            raise TypeError(f"Recordings can only be indexed by a time range, like recording[t0:t1], got {key}")
+        return self.to_dataframe(key.start, key.stop)
+
+    def __repr__(self):
+        return f"Recording({self.folder!r}, channels={self.channels}, samples={len(self)})"
+
+
+def _map_array(file_path: str, shape: tuple) -> np.ndarray:
+    if shape[0] == 0:
+        # Memory-mapping an empty region isn't allowed
+        return np.zeros(shape, dtype=SAMPLE_DTYPE)
+    return np.memmap(file_path, dtype=SAMPLE_DTYPE, mode="r", shape=shape)
+
+
+def read_recording(folder: str) -> "pd.DataFrame":
+    """Load a recording folder, in either the chunked or the legacy pickle layout.
+
+    Arguments:
+        folder {str} -- Recording folder, as returned by `Device.record`
+
+    Returns:
+        pd.DataFrame -- Samples with one column per channel, indexed by timestamp
+    """
+    return Recording(folder).to_dataframe()
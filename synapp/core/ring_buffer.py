@@ -0,0 +1,143 @@
+import threading
+
+import numpy as np
+
+
+class RingBuffer:
+    """Preallocated (channels x capacity) sample store with a matching timestamp array.
+
+    The storage is mirrored: every sample is written at position ``i`` and ``i + capacity``,
+    so the most recent ``n`` samples are always one contiguous slice and can be returned
+    as zero-copy views. Writes are one slice copy per half, regardless of chunk size.
+
+    Views returned by `latest` are only valid until the buffer wraps past them; copy them
+    if they need to outlive the next ``capacity - n`` appended samples.
+    """
+
+    def __init__(self, num_channels: int, capacity: int, dtype=np.float64):
+        if num_channels <= 0 or capacity <= 0:
+            raise ValueError(f"num_channels and capacity must be positive, got {num_channels}, {capacity}")
+        self.num_channels = num_channels
+        self.capacity = capacity
+        self._samples = np.zeros((num_channels, 2 * capacity), dtype=dtype)
+        self._timestamps = np.zeros(2 * capacity, dtype=np.float64)
+        self._write_index = 0
+        self._total_written = 0
+        self._lock = threading.Condition()
+
+    @property
+    def total_written(self) -> int:
+        """Number of samples appended since creation (or the last `clear`)."""
+        return self._total_written
+
+    @property
+    def overflowed(self) -> bool:
+        """Whether samples have been overwritten before they could be read."""
+        return self._total_written > self.capacity
+
+    def __len__(self):
+        return min(self._total_written, self.capacity)
+
+    def append(self, samples, timestamps):
+        """Append a chunk of samples.
+
+        Arguments:
+            samples {np.ndarray} -- Array of shape (channels, n)
+            timestamps {np.ndarray} -- Array of shape (n,)
+        """
+        samples = np.asarray(samples)
+        timestamps = np.asarray(timestamps)
+        num_new = timestamps.shape[0]
+        if samples.shape != (self.num_channels, num_new):
+            raise ValueError(f"Expected samples of shape {(self.num_channels, num_new)}, got {samples.shape}")
+
+        with self._lock:
+            self._total_written += num_new
+            if num_new > self.capacity:
+                # Only the newest `capacity` samples can be kept
+                skipped = num_new - self.capacity
+                self._write_index = (self._write_index + skipped) % self.capacity
+                samples = samples[:, skipped:]
+                timestamps = timestamps[skipped:]
+                num_new = self.capacity
+
+            start = self._write_index
+            end = start + num_new
+            self._samples[:, start:end] = samples
+            self._timestamps[start:end] = timestamps
+
+            # Mirror the written region into the other half of the storage
+            if end <= self.capacity:
+                self._samples[:, start + self.capacity : end + self.capacity] = samples
+                self._timestamps[start + self.capacity : end + self.capacity] = timestamps
+            else:
+                split = self.capacity - start
+                self._samples[:, start + self.capacity :] = samples[:, :split]
+                self._timestamps[start + self.capacity :] = timestamps[:split]
+                self._samples[:, : end - self.capacity] = samples[:, split:]
+                self._timestamps[: end - self.capacity] = timestamps[split:]
+
+            self._write_index = end % self.capacity
+            self._lock.notify_all()
+
+    def latest(self, num_samples: int = None):
+        """Get zero-copy views of the most recent samples.
+
+        Keyword Arguments:
+            num_samples {int} -- Number of samples to return. Defaults to everything available (default: {None})
+
+        Returns:
+            tuple[np.ndarray, np.ndarray] -- (timestamps of shape (n,), samples of shape (channels, n))
+        """
+        with self._lock:
+            available = min(self._total_written, self.capacity)
+            if num_samples is None or num_samples > available:
+                num_samples = available
+            end = self._write_index + self.capacity
+            start = end - num_samples
+            return self._timestamps[start:end], self._samples[:, start:end]
+
+    def since(self, position: int):
+        """Get copies of every sample appended after the absolute sample `position`.
+
+        Intended for consumers that track how far they have read using `total_written`. The samples are
+        copied while the buffer is locked, so a concurrent `append` can't overwrite them before they are read.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, int] -- (timestamps, samples, number of samples lost to overflow)
+        """
+        with self._lock:
+            pending = self._total_written - position
+            lost = max(0, pending - self.capacity)
+            pending -= lost
+            end = self._write_index + self.capacity
+            start = end - pending
+            return self._timestamps[start:end].copy(), self._samples[:, start:end].copy(), lost
+
+    def span(self, start: int, end: int):
+        """Get views of the samples between absolute sample positions `start` and `end`.
+
+        Positions count every sample appended, as in `total_written`.
+
+        Raises:
+            IndexError -- If the range has not been written yet, or has already been overwritten
+        """
+        with self._lock:
+            if start < self._total_written - self.capacity or end > self._total_written or start > end:
+                raise IndexError(f"Samples [{start}, {end}) are not in the buffer (written: {self._total_written})")
+            stop = self._write_index + self.capacity - (self._total_written - end)
+            return self._timestamps[stop - (end - start) : stop], self._samples[:, stop - (end - start) : stop]
+
+    def wait_for(self, total_written: int, timeout: float = None) -> bool:
+        """Block until at least `total_written` samples have been appended.
+
+        Returns:
+            bool -- False if the timeout expired first
+        """
+        with self._lock:
+            return self._lock.wait_for(lambda: self._total_written >= total_written, timeout=timeout)
+
+    def clear(self):
+        with self._lock:
+            self._write_index = 0
+            self._total_written = 0
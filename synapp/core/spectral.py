@@ -0,0 +1,142 @@
+""" Spectral analysis of (channels, samples) blocks.
+
+Everything here works on a whole block of channels at once with a real FFT, and caches the window
+functions and frequency axes for each (length, sample rate), so repeated calls on same-sized windows -
+like the frames of a live display - don't reallocate them. SciPy is only imported when a named window or
+`band_power` is first used, so importing this module (and `data_parsing`) stays cheap.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+SPECTRAL_CACHE_SIZE = 32
+DEFAULT_SEGMENT_LENGTH = 256
+WELCH_BLOCK_SEGMENTS = 256  # segments per channel transformed at a time, bounding memory on long recordings
+
+EEG_BANDS = {
+    "delta": (1, 4),
+    "theta": (4, 8),
+    "alpha": (8, 13),
+    "beta": (13, 30),
+    "gamma": (30, 45),
+}
+
+
+@lru_cache(maxsize=SPECTRAL_CACHE_SIZE)
+def rfft_frequencies(num_samples, sample_rate=256):
+    """ Cached (read-only) frequency axis of an rfft of num_samples samples """
+    frequencies = np.fft.rfftfreq(num_samples, d=1 / sample_rate)
+    frequencies.flags.writeable = False
+    return frequencies
+
+
+@lru_cache(maxsize=SPECTRAL_CACHE_SIZE)
+def get_window(window, num_samples):
+    """ Cached (read-only) window function, by any name `scipy.signal.get_window` accepts """
+    from scipy.signal import get_window as scipy_get_window
+
+    values = scipy_get_window(window, num_samples)
+    values.flags.writeable = False
+    return values
+
+
+def amplitude_spectrum(data, sample_rate=256, window=None):
+    """ One-sided amplitude spectrum along the last axis.
+
+    Scaled like `data_parsing.get_FFT_from_timeseries`: the magnitude of the FFT of data / len(data),
+    for the num_samples // 2 bins below Nyquist.
+
+    Arguments:
+        data {np.ndarray} -- A single time series, or an array of shape (channels, samples)
+
+    Keyword Arguments:
+        sample_rate {float} -- Sample rate of the data in Hz (default: {256})
+        window {str} -- Window function to apply before the FFT, if any (default: {None})
+
+    Returns:
+        tuple[np.ndarray, np.ndarray] -- (amplitudes of shape (..., num_samples // 2), frequencies)
+    """
+    data = np.asarray(data, dtype=np.float64)
+    num_samples = data.shape[-1]
+    if window is not None:
+        data = data * get_window(window, num_samples)
+    spectrum = np.fft.rfft(data, axis=-1)[..., : num_samples // 2]
+    amplitudes = np.abs(spectrum)
+    amplitudes /= num_samples
+    return amplitudes, rfft_frequencies(num_samples, sample_rate)[: num_samples // 2]
+
+
+def welch_psd(data, sample_rate=256, segment_length=DEFAULT_SEGMENT_LENGTH, overlap=None, window="hann"):
+    """ Welch power spectral density along the last axis, for every channel at once.
+
+    Matches `scipy.signal.welch` with its default constant detrending and density scaling, but reuses
+    cached windows and frequency axes, and transforms `WELCH_BLOCK_SEGMENTS` segments of every channel
+    per rfft. Memory use doesn't grow with the data's length, so this also works on an hour-long
+    memory-mapped `Recording`, of which only the block being transformed is read at a time.
+
+    Arguments:
+        data {np.ndarray} -- A single time series, or an array of shape (channels, samples)
+
+    Keyword Arguments:
+        sample_rate {float} -- Sample rate of the data in Hz (default: {256})
+        segment_length {int} -- Samples per segment, shortened to the data length if needed (default: {256})
+        overlap {int} -- Samples shared by consecutive segments. Defaults to half a segment (default: {None})
+        window {str} -- Window function applied to each segment (default: {"hann"})
+
+    Raises:
+        ValueError: If the overlap isn't shorter than a segment, so consecutive segments would never advance
+
+    Returns:
+        tuple[np.ndarray, np.ndarray] -- (psd of shape (..., segment_length // 2 + 1) in units^2/Hz, frequencies)
+    """
+    data = np.asarray(data, dtype=np.float64)
+    segment_length = min(segment_length, data.shape[-1])
+    overlap = segment_length // 2 if overlap is None else overlap
+    if overlap >= segment_length:
+        raise ValueError(f"An overlap of {overlap} samples must be shorter than a segment of {segment_length}")
+    window_values = get_window(window, segment_length)
+
+    # (..., segments, segment_length) view of the data
+    segments = np.lib.stride_tricks.sliding_window_view(data, segment_length, axis=-1)[
+        ..., :: segment_length - overlap, :
+    ]
+    num_segments = segments.shape[-2]
+    psd = np.zeros(segments.shape[:-2] + (segment_length // 2 + 1,))
+    for first in range(0, num_segments, WELCH_BLOCK_SEGMENTS):
+        # Detrend and window a block of segments, then add up their power
+        block = segments[..., first : first + WELCH_BLOCK_SEGMENTS, :]
+        block = block - block.mean(axis=-1, keepdims=True)
+        block *= window_values
+        psd += (np.abs(np.fft.rfft(block, axis=-1)) ** 2).sum(axis=-2)
+    psd /= num_segments
+    psd /= sample_rate * np.sum(window_values**2)
+    # One-sided: double everything except DC (and Nyquist, for even lengths)
+    if segment_length % 2 == 0:
+        psd[..., 1:-1] *= 2
+    else:
+        psd[..., 1:] *= 2
+    return psd, rfft_frequencies(segment_length, sample_rate)
+
+
+def band_power(psd, frequencies, bands=None):
+    """ Integrate a PSD over frequency bands.
+
+    Arguments:
+        psd {np.ndarray} -- Power spectral density of shape (..., frequencies), e.g. from `welch_psd`
+        frequencies {np.ndarray} -- Frequency of each PSD bin
+
+    Keyword Arguments:
+        bands {dict} -- Band name to (low, high) Hz. Defaults to the standard EEG bands (default: {None})
+
+    Returns:
+        dict -- Band name to power, of shape psd.shape[:-1]
+    """
+    from scipy.integrate import trapezoid
+
+    bands = EEG_BANDS if bands is None else bands
+    powers = {}
+    for name, (low, high) in bands.items():
+        in_band = (frequencies >= low) & (frequencies <= high)
+        powers[name] = trapezoid(psd[..., in_band], frequencies[in_band], axis=-1)
+    return powers
@@ -0,0 +1,137 @@
+"""SSVEP detection from power at the stimulus frequencies.
+
+Instead of a full FFT, power is only computed at the target frequencies and their harmonics, by
+projecting the data onto complex exponentials at exactly those frequencies (the same quantity Goertzel's
+algorithm computes, but for every channel and frequency in one matrix product).
+`SSVEPDetector` keeps those projections as a sliding DFT, so each new chunk costs O(chunk) regardless
+of the window length.
+"""
+
+import numpy as np
+
+from synapp.core.ring_buffer import RingBuffer
+
+DEFAULT_HARMONICS = 2
+DEFAULT_WINDOW_LENGTH = 512
+# Recompute the projections from scratch this often (in windows) to stop rounding error accumulating
+DEFAULT_RESYNC_WINDOWS = 64
+
+
+def harmonic_frequencies(target_frequencies, harmonics=DEFAULT_HARMONICS):
+    """Array of shape (targets, harmonics) with every multiple of each target frequency"""
+    return np.outer(np.asarray(target_frequencies, dtype=np.float64), np.arange(1, harmonics + 1))
+
+
+def _phasors(frequencies, sample_indices, sample_rate):
+    """exp(-2j pi f n / fs) for every frequency and sample index, shape (*frequencies.shape, samples)"""
+    return np.exp(np.multiply.outer(frequencies, sample_indices) * (-2j * np.pi / sample_rate))
+
+
+def target_frequency_power(samples, target_frequencies, sample_rate=256, harmonics=1):
+    """Power at each target frequency (summed over its harmonics) for every channel.
+
+    Arguments:
+        samples {np.ndarray} -- A single time series, or an array of shape (channels, samples)
+        target_frequencies {list[float]} -- Candidate stimulus frequencies in Hz
+
+    Returns:
+        np.ndarray -- Power of shape (..., targets)
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    phasors = _phasors(harmonic_frequencies(target_frequencies, harmonics), np.arange(samples.shape[-1]), sample_rate)
+    projections = np.einsum("...n,thn->...th", samples, phasors)
+    return (np.abs(projections) ** 2).sum(axis=-1) / samples.shape[-1] ** 2
+
+
+class SSVEPDetector:
+    """Streaming SSVEP detector over a sliding window of the most recent samples.
+
+    Each call to `update` folds a chunk of samples into a sliding DFT at the target frequencies and their
+    harmonics, for all channels at once, and returns the current score of each target.
+    """
+
+    def __init__(
+        self,
+        target_frequencies,
+        num_channels,
+        sample_rate=256,
+        window_length=DEFAULT_WINDOW_LENGTH,
+        harmonics=DEFAULT_HARMONICS,
+        resync_windows=DEFAULT_RESYNC_WINDOWS,
+    ):
+        self.target_frequencies = np.asarray(target_frequencies, dtype=np.float64)
+        self.sample_rate = sample_rate
+        self.window_length = window_length
+        self.frequencies = harmonic_frequencies(self.target_frequencies, harmonics)
+        self.resync_interval = resync_windows * window_length
+        # The window of samples, "timestamped" with their absolute sample index
+        self.history = RingBuffer(num_channels, window_length)
+        # Projections onto exp(-2j pi f n / fs), with n counted from the start of the stream
+        self._projections = np.zeros((num_channels,) + self.frequencies.shape, dtype=np.complex128)
+        self._since_resync = 0
+
+    def reset(self):
+        self.history.clear()
+        self._projections[:] = 0
+        self._since_resync = 0
+
+    def update(self, chunk):
+        """Add the next chunk of the stream and score the targets.
+
+        Arguments:
+            chunk {np.ndarray} -- New samples of shape (channels, samples)
+
+        Returns:
+            np.ndarray -- Score of each target frequency, see `scores`
+        """
+        chunk = np.asarray(chunk, dtype=np.float64)
+        num_new = chunk.shape[1]
+        start = self.history.total_written
+        self._since_resync += num_new
+
+        if num_new >= self.window_length or self._since_resync >= self.resync_interval:
+            self.history.append(chunk, np.arange(start, start + num_new))
+            self._resync()
+        else:
+            # Samples about to slide out of the window
+            num_leaving = max(0, len(self.history) + num_new - self.window_length)
+            leaving_indices, leaving = self.history.latest(len(self.history))
+            leaving_indices, leaving = leaving_indices[:num_leaving], leaving[:, :num_leaving]
+
+            new_indices = np.arange(start, start + num_new)
+            self._projections += np.einsum(
+                "cn,thn->cth", chunk, _phasors(self.frequencies, new_indices, self.sample_rate)
+            )
+            if num_leaving:
+                self._projections -= np.einsum(
+                    "cn,thn->cth", leaving, _phasors(self.frequencies, leaving_indices, self.sample_rate)
+                )
+            self.history.append(chunk, new_indices)
+
+        return self.scores()
+
+    def _resync(self):
+        indices, window = self.history.latest()
+        self._projections = np.einsum("cn,thn->cth", window, _phasors(self.frequencies, indices, self.sample_rate))
+        self._since_resync = 0
+
+    def power(self):
+        """Power at each target frequency and harmonic, of shape (channels, targets, harmonics)."""
+        num_samples = max(len(self.history), 1)
+        return np.abs(self._projections) ** 2 / num_samples**2
+
+    def scores(self):
+        """Power at each target summed over harmonics and averaged over channels, normalized to sum to 1."""
+        target_power = self.power().sum(axis=-1).mean(axis=0)
+        total = target_power.sum()
+        return target_power / total if total > 0 else target_power
+
+    def predict(self, minimum_score=0.0):
+        """The target frequency with the highest score, or None if the window isn't full yet
+        or no target scores at least `minimum_score`.
+        """
+        if len(self.history) < self.window_length:
+            return None
+        scores = self.scores()
+        best = np.argmax(scores)
+        return self.target_frequencies[best] if scores[best] >= minimum_score else None
@@ -0,0 +1,131 @@
+"""Hand device samples from driver threads to asyncio code.
+
+Device drivers deliver samples on their own threads through a `callback(samples, timestamps)`, like
+`Muse(callback_eeg=...)`. A `ChunkQueue` is such a callback on one side and an async iterator of `Chunk`s on
+the other, bounded so a slow consumer can't grow memory without limit.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import NamedTuple
+
+import numpy as np
+
+from synapp.core import metrics
+from synapp.core.logging import logger
+
+DEFAULT_QUEUE_SIZE = 64  # chunks
+OVERFLOW_POLICIES = ("block", "drop_oldest")
+
+
+class Chunk(NamedTuple):
+    samples: np.ndarray  # (channels, n)
+    timestamps: np.ndarray  # (n,)
+
+
+class ChunkQueue:
+    """Bounded `asyncio.Queue` of chunks that device threads can put into.
+
+    When the queue is full, `overflow` decides what happens to the next chunk:
+
+    - "block": the device thread waits for the consumer to catch up (backpressure). Use this for sources
+      that can be slowed down, like replayed or synthetic data.
+    - "drop_oldest": the oldest queued chunk is discarded and counted in `dropped_chunks`, so the device
+      thread never stalls. Use this for live hardware, where stalling only moves the loss elsewhere.
+
+    Create it from inside the event loop that will consume it.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_QUEUE_SIZE, overflow: str = "block"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, got {overflow}")
+        self.overflow = overflow
+        self.dropped_chunks = 0
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._closed = threading.Event()
+        self._pending_puts = set()
+        self._pending_lock = threading.Lock()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def put_threadsafe(self, samples, timestamps):
+        """Queue a chunk from any thread. Has the signature of a device callback. Ignored once closed."""
+        if self.closed:
+            return
+        chunk = Chunk(np.asarray(samples), np.asarray(timestamps))
+        if self.overflow == "drop_oldest":
+            try:
+                self._loop.call_soon_threadsafe(self._put_dropping_oldest, chunk)
+            except RuntimeError:
+                # The event loop is already closed
+                self._closed.set()
+        elif threading.get_ident() == self._loop_thread:
+            raise RuntimeError("ChunkQueue.put_threadsafe would deadlock when called from its own event loop")
+        else:
+            try:
+                put = asyncio.run_coroutine_threadsafe(self._queue.put(chunk), self._loop)
+            except RuntimeError:
+                # The event loop is already closed
+                self._closed.set()
+                return
+            with self._pending_lock:
+                self._pending_puts.add(put)
+            if self.closed:
+                # close may have run before this put was registered
+                put.cancel()
+            try:
+                put.result()
+            except concurrent.futures.CancelledError:
+                # Released by close while waiting for space
+                pass
+            finally:
+                with self._pending_lock:
+                    self._pending_puts.discard(put)
+
+    def _put_dropping_oldest(self, chunk):
+        if self.closed:
+            return
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped_chunks += 1
+            metrics.inc("stream_dropped_chunks_total")
+            if self.dropped_chunks == 1 or self.dropped_chunks % 100 == 0:
+                logger.warning(f"Stream consumer fell behind, {self.dropped_chunks} chunks dropped")
+        self._queue.put_nowait(chunk)
+        metrics.set_gauge("stream_queue_depth", self._queue.qsize())
+
+    def close(self):
+        """Stop accepting chunks, and end iteration once the queued ones are consumed.
+
+        Must be called from the event loop. Producers blocked on a full queue are released, and their chunks
+        discarded. If the queue is full, its oldest chunk makes way for the end-of-stream marker.
+        """
+        if self.closed:
+            return
+        self._closed.set()
+        with self._pending_lock:
+            for put in self._pending_puts:
+                put.cancel()
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Chunk:
+        chunk = await self._queue.get()
+        metrics.set_gauge("stream_queue_depth", self._queue.qsize())
+        if chunk is None:
+            # Leave the marker for any other consumers
+            self._queue.put_nowait(None)
+            raise StopAsyncIteration
+        return chunk
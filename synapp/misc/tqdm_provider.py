@@ -17,6 +17,6 @@ try:
         tqdm = tqdm_cli
     else:  # Jupyter notebook
         tqdm = tqdm_notebook
-except ImportError as e:  # If IPython is not installed at all
+except (ImportError, AttributeError):  # If IPython is not installed at all, or isn't running (get_ipython() is None)
     from tqdm import tqdm as tqdm_cli
     tqdm = tqdm_cli
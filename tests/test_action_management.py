@@ -0,0 +1,132 @@
+#!/bin/python3
+# Test file for action dispatch
+
+import threading
+import unittest
+from time import perf_counter
+
+from synapp.core.action_management import Action, ActionDispatcher, getaction
+
+
+class BlockingAction(Action):
+    """Counts its runs, and blocks each run until released"""
+
+    def __init__(self, name):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        super().__init__(name, self.run)
+
+    def run(self):
+        self.started.set()
+        self.release.wait(5)
+        self.calls += 1
+
+
+def counting_action(name, calls):
+    return Action(name, lambda: calls.append(name))
+
+
+class TestActionDispatcher(unittest.TestCase):
+    def test_submit_does_not_wait_for_the_action(self):
+        action = BlockingAction("slow")
+        with ActionDispatcher(refractory_period=0) as dispatcher:
+            start = perf_counter()
+            dispatcher.submit(action)
+            self.assertTrue(action.started.wait(5))
+            submitted_in = perf_counter() - start
+            action.release.set()
+
+        self.assertLess(submitted_in, 1)
+        self.assertEqual(action.calls, 1)
+
+    def test_pending_duplicates_are_coalesced(self):
+        blocker = BlockingAction("blocker")
+        calls = []
+        with ActionDispatcher(refractory_period=0) as dispatcher:
+            dispatcher.submit(blocker)
+            self.assertTrue(blocker.started.wait(5))
+            # The worker is busy, so these wait, and the repeats merge into the first
+            queued = [dispatcher.submit(counting_action(name, calls)) for name in ["a", "a", "b", "a"]]
+            blocker.release.set()
+
+        self.assertListEqual(queued, [True, False, True, False])
+        self.assertListEqual(calls, ["a", "b"])
+        self.assertEqual(dispatcher.coalesced, 2)
+
+    def test_refractory_period(self):
+        calls = []
+        executed = threading.Semaphore(0)
+        dispatcher = ActionDispatcher(refractory_period=60, on_executed=lambda *args: executed.release())
+        with dispatcher:
+            action = counting_action("a", calls)
+            dispatcher.submit(action)
+            self.assertTrue(executed.acquire(timeout=5))
+            dispatcher.submit(action)
+            dispatcher.submit(counting_action("b", calls))
+            self.assertTrue(executed.acquire(timeout=5))
+
+        self.assertListEqual(calls, ["a", "b"])
+        self.assertEqual(dispatcher.rate_limited, 1)
+
+    def test_oldest_pending_is_dropped_when_full(self):
+        blocker = BlockingAction("blocker")
+        calls = []
+        with ActionDispatcher(refractory_period=0, max_pending=2) as dispatcher:
+            dispatcher.submit(blocker)
+            self.assertTrue(blocker.started.wait(5))
+            for name in ["a", "b", "c"]:
+                dispatcher.submit(counting_action(name, calls))
+            blocker.release.set()
+
+        self.assertListEqual(calls, ["b", "c"])
+        self.assertEqual(dispatcher.dropped, 1)
+
+    def test_failing_action_does_not_stop_the_worker(self):
+        calls = []
+
+        def fail():
+            raise OSError("no display")
+
+        with self.assertLogs("synapp.core.logging", level="ERROR"):
+            with ActionDispatcher(refractory_period=0) as dispatcher:
+                dispatcher.submit(Action("broken", fail))
+                dispatcher.submit(counting_action("a", calls))
+
+        self.assertListEqual(calls, ["a"])
+        self.assertEqual(dispatcher.executed, 1)
+
+    def test_on_executed_gets_key_and_submit_time(self):
+        executed = []
+        with ActionDispatcher(on_executed=lambda *args: executed.append(args)) as dispatcher:
+            action = counting_action("a", [])
+            dispatcher.submit(action, key="winkright", submitted_at=12.5)
+
+        self.assertListEqual(executed, [("winkright", action, 12.5)])
+
+    def test_failing_on_executed_does_not_stop_the_worker(self):
+        calls = []
+
+        def on_executed(key, action, submitted_at):
+            if action.name == "a":
+                raise ValueError("bad callback")
+
+        with self.assertLogs("synapp.core.logging", level="ERROR"):
+            with ActionDispatcher(refractory_period=0, on_executed=on_executed) as dispatcher:
+                dispatcher.submit(counting_action("a", calls))
+                dispatcher.submit(counting_action("b", calls))
+
+        self.assertListEqual(calls, ["a", "b"])
+        self.assertEqual(dispatcher.executed, 2)
+
+
+class TestGetAction(unittest.TestCase):
+    def test_getaction(self):
+        action = counting_action("command1", [])
+
+        self.assertIs(getaction("winkright", {"winkright": action}), action)
+        self.assertIsNone(getaction("still", {"winkright": action}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/bin/python3
+# Test file for batch reports over a folder of recordings
+
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from synapp.core import batch_report, recording
+from tests import test_utils
+from tests.test_utils import CHANNELS
+
+SAMPLE_RATE = 256
+
+
+def write_noise_recording(folder, duration=20.0, line_noise=0.0, drop=()):
+    """Write a chunked recording of noise, with optional 60 Hz line noise and a range of samples left out"""
+    os.makedirs(folder)
+    timestamps = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+    samples = np.random.default_rng(0).normal(800, 10, (len(CHANNELS), len(timestamps)))
+    samples += line_noise * np.sin(2 * np.pi * 60 * timestamps)
+    kept = np.ones(len(timestamps), dtype=bool)
+    kept[slice(*drop) if drop else slice(0)] = False
+    test_utils.write_recording(folder, samples[:, kept], timestamps[kept], SAMPLE_RATE, device="Muse")
+
+
+class TestRecordingStats(unittest.TestCase):
+    def test_stats(self):
+        with tempfile.TemporaryDirectory() as folder:
+            write_noise_recording(os.path.join(folder, "noisy"), line_noise=50, drop=(1000, 1100))
+            write_noise_recording(os.path.join(folder, "clean"))
+
+            noisy = batch_report.recording_stats(recording.Recording(os.path.join(folder, "noisy")))
+            clean = batch_report.recording_stats(recording.Recording(os.path.join(folder, "clean")))
+
+        self.assertEqual(noisy["dropped_samples"], 100)
+        self.assertEqual(clean["dropped_samples"], 0)
+        # RMS is about the mean, so the 800 offset doesn't count
+        self.assertAlmostEqual(clean["channels"]["TP9"]["rms"], 10, delta=0.5)
+        self.assertGreater(
+            noisy["channels"]["TP9"]["line_noise_power"]["60Hz"],
+            100 * clean["channels"]["TP9"]["line_noise_power"]["60Hz"],
+        )
+
+
+class TestWriteReports(unittest.TestCase):
+    def test_reports_every_recording_once(self):
+        with tempfile.TemporaryDirectory() as root:
+            write_noise_recording(os.path.join(root, "2024-01-01_muse"))
+            # Device folders inside a recording session
+            write_noise_recording(os.path.join(root, "session", "muse"))
+            write_noise_recording(os.path.join(root, "session", "muse_2"))
+
+            summary = batch_report.write_reports(root, max_workers=2)
+
+            self.assertListEqual(list(summary), ["2024-01-01_muse", "session/muse", "session/muse_2"])
+            for name in summary:
+                output_folder = os.path.join(root, "reports", name)
+                self.assertTrue(os.path.exists(os.path.join(output_folder, batch_report.FIGURE_FILE)))
+                self.assertTrue(os.path.exists(os.path.join(output_folder, batch_report.STATS_FILE)))
+            with open(os.path.join(root, "reports", batch_report.SUMMARY_FILE)) as f:
+                self.assertDictEqual(json.load(f), summary)
+
+            # Nothing changed, so nothing is rewritten
+            stats_path = os.path.join(root, "reports", "session", "muse", batch_report.STATS_FILE)
+            written = os.path.getmtime(stats_path)
+            with self.assertLogs("synapp.core.logging", level="INFO") as logs:
+                batch_report.write_reports(root, max_workers=2)
+            self.assertIn("3 already have up-to-date reports", logs.output[0])
+            self.assertEqual(os.path.getmtime(stats_path), written)
+
+            # A recording that changes after its report is reported again
+            time.sleep(0.01)
+            recording.write_recording_info(
+                os.path.join(root, "session", "muse"), {"channels": CHANNELS, "sample_rate": SAMPLE_RATE}
+            )
+            self.assertFalse(
+                batch_report.is_up_to_date(os.path.join(root, "session", "muse"), os.path.dirname(stats_path))
+            )
+            with self.assertLogs("synapp.core.logging", level="INFO") as logs:
+                batch_report.write_reports(root, max_workers=2)
+            self.assertIn("2 already have up-to-date reports", logs.output[0])
+
+    def test_failures_are_reported(self):
+        with tempfile.TemporaryDirectory() as root:
+            write_noise_recording(os.path.join(root, "good"))
+            broken = os.path.join(root, "broken")
+            write_noise_recording(broken)
+            os.remove(os.path.join(broken, recording.RECORDING_INFO_FILE))
+
+            with self.assertLogs("synapp.core.logging", level="INFO"):
+                summary = batch_report.write_reports(root, max_workers=1)
+
+        self.assertIn("error", summary["broken"])
+        self.assertNotIn("error", summary["good"])
+
+
+if __name__ == "__main__":
+    unittest.main()
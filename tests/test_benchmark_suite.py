@@ -0,0 +1,74 @@
+#!/bin/python3
+# Test file for the benchmark suite's regression checks, and that its cases still run
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from benchmarks import suite
+
+
+def result(best_s):
+    return {"best_s": best_s, "median_s": best_s, "samples_per_s": 1 / best_s}
+
+
+class TestCompare(unittest.TestCase):
+    def test_flags_regressions(self):
+        baseline = {"results": {"a[x]": result(1.0), "b[x]": result(1.0), "c[x]": result(1.0)}}
+        results = {"a[x]": result(1.5), "b[x]": result(1.1), "c[x]": result(0.5), "d[x]": result(1.0)}
+
+        comparison = suite.compare(results, baseline, threshold=0.25)
+
+        self.assertEqual(comparison["a[x]"][0], "regression")
+        self.assertAlmostEqual(comparison["a[x]"][1], 1.5)
+        self.assertEqual(comparison["b[x]"][0], "ok")
+        self.assertEqual(comparison["c[x]"][0], "faster")
+        self.assertTupleEqual(comparison["d[x]"], ("new", None))
+
+    def test_baseline_round_trip(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "baselines", "smoke.json")
+            suite.save_baseline(path, {"a[x]": result(1.0)})
+            baseline = suite.load_baseline(path)
+
+        self.assertDictEqual(baseline["results"], {"a[x]": result(1.0)})
+        self.assertDictEqual(baseline["environment"], suite.environment())
+
+
+class TestLocalBaseline(unittest.TestCase):
+    def run_main(self, *args):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return suite.main(["--scale", "smoke", "--repeats", "1", "--min-time", "0", "--threshold", "1000", *args])
+
+    def test_first_run_saves_the_baseline(self):
+        with tempfile.TemporaryDirectory() as folder, mock.patch.object(suite, "LOCAL_BASELINE_FOLDER", folder):
+            path = suite.local_baseline_path("smoke")
+
+            self.assertEqual(self.run_main("-k", "markers"), 0)
+            first = suite.load_baseline(path)
+            self.assertEqual(self.run_main("-k", "markers", "slide_window"), 0)
+            second = suite.load_baseline(path)
+
+        # Compared against, rather than overwritten, and only cases it didn't have yet were added
+        self.assertTrue(all("markers" in key for key in first["results"]))
+        for key, result in first["results"].items():
+            self.assertDictEqual(second["results"][key], result)
+        self.assertTrue(any("slide_window" in key for key in second["results"]))
+
+
+class TestSuiteRuns(unittest.TestCase):
+    def test_smoke_scale(self):
+        cases = ["filtering", "data_parsing", "markers", "recording"]
+
+        results = suite.run_suite(suite.SCALES["smoke"], cases, repeats=1, min_time=0, log=lambda line: None)
+
+        expected = [name for name in suite.CASES if any(case in name for case in cases)]
+        self.assertListEqual(list(results), [f"{name}[4ch_256Hz_10s]" for name in expected])
+        self.assertTrue(all(r["samples_per_s"] > 0 for r in results.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/bin/python3
+# Test file for the data_parsing utility file
+
+import unittest
+
+import numpy as np
+
+from synapp.core import data_parsing
+from synapp.core.ring_buffer import RingBuffer
+from tests import test_utils
+
+
+class TestEpoching(unittest.TestCase):
+    def setUp(self):
+        self.timestamps, self.samples, self.markers = test_utils.create_timestamps_samples_markers_arrays(
+            1000, 4, 256, generator_function=lambda length: np.random.default_rng(0).normal(size=length)
+        )
+
+    def test_matches_per_marker_windows(self):
+        X, Y = data_parsing.get_ML_set_from_data(self.markers, self.timestamps, self.samples, samples_per_trial=64)
+
+        self.assertEqual(X.dtype, np.float32)
+        self.assertTupleEqual(X.shape, (2, 4, 64))
+        np.testing.assert_array_equal(Y, self.markers["marker"])
+        for i, marker in enumerate(self.markers):
+            window, _ = data_parsing.get_data_window_after_time(marker["timestamp"], self.timestamps, self.samples, 64)
+            np.testing.assert_allclose(X[i], window, rtol=1e-6)
+
+    def test_out_of_range_trials_are_padded_or_dropped(self):
+        event_times = self.timestamps[[10, 500, 980, 999]]
+
+        padded, mask = data_parsing.get_epochs(event_times, self.timestamps, self.samples, 64)
+        dropped, _ = data_parsing.get_epochs(event_times, self.timestamps, self.samples, 64, out_of_range="drop")
+
+        np.testing.assert_array_equal(mask, [True, True, False, False])
+        self.assertTupleEqual(padded.shape, (4, 4, 64))
+        self.assertTupleEqual(dropped.shape, (2, 4, 64))
+        np.testing.assert_array_equal(padded[:2], dropped)
+        # Only the 19 samples after index 980 exist, the rest of the window is zero-filled
+        np.testing.assert_allclose(padded[2, :, :19], self.samples[:, 981:], rtol=1e-6)
+        self.assertFalse(padded[2, :, 19:].any())
+        self.assertFalse(padded[3].any())
+
+    def test_gathers_in_blocks(self):
+        # More trials than are gathered at once, with the last block partly full
+        indices = np.arange(0, 930, 3)[: data_parsing.EPOCH_GATHER_TRIALS + 10]
+
+        epochs, _ = data_parsing.get_epochs(self.timestamps[indices], self.timestamps, self.samples, 64)
+
+        self.assertEqual(len(epochs), data_parsing.EPOCH_GATHER_TRIALS + 10)
+        for trial, index in enumerate(indices):
+            np.testing.assert_allclose(epochs[trial], self.samples[:, index + 1 : index + 65], rtol=1e-6)
+
+
+class TestSlidingWindows(unittest.TestCase):
+    def test_slide_window(self):
+        old = np.array([[0, 3, 6, 1, 5]])
+
+        np.testing.assert_array_equal(data_parsing.slide_window(old, np.array([[2, 9]])), [[6, 1, 5, 2, 9]])
+        np.testing.assert_array_equal(data_parsing.slide_window(old, np.arange(7)[np.newaxis, :]), [[2, 3, 4, 5, 6]])
+
+    def test_sliding_windows_are_views(self):
+        samples = np.arange(40, dtype=np.float64).reshape(2, 20)
+
+        windows = data_parsing.get_sliding_windows(samples, window_length=8, hop=4)
+
+        self.assertTupleEqual(windows.shape, (4, 2, 8))
+        self.assertTrue(np.shares_memory(windows, samples))
+        np.testing.assert_array_equal(windows[2], samples[:, 8:16])
+
+    def test_iter_buffer_windows(self):
+        buffer = RingBuffer(num_channels=1, capacity=64)
+        windows = data_parsing.iter_buffer_windows(buffer, window_length=16, hop=8, timeout=0)
+        buffer.append(np.arange(12)[np.newaxis, :], np.arange(12))
+        self.assertEqual(len(list(windows)), 0)
+
+        windows = data_parsing.iter_buffer_windows(buffer, window_length=16, hop=8, timeout=0)
+        for i, start in enumerate(range(12, 48, 12)):
+            buffer.append(np.arange(start, start + 12)[np.newaxis, :], np.arange(start, start + 12))
+            timestamps, samples = next(windows)
+            # Starts from the newest complete window, then advances by one hop at a time
+            np.testing.assert_array_equal(timestamps, np.arange(8 + 8 * i, 24 + 8 * i))
+            np.testing.assert_array_equal(samples[0], timestamps)
+
+        # Windows lost to overflow are skipped, resuming at the newest complete window
+        buffer.append(np.arange(48, 148)[np.newaxis, :], np.arange(48, 148))
+        timestamps, _ = next(windows)
+        np.testing.assert_array_equal(timestamps, np.arange(128, 144))
+
+    def test_iter_buffer_windows_needs_room_to_skip_ahead(self):
+        buffer = RingBuffer(num_channels=1, capacity=64)
+
+        # After falling behind, the newest window on the hop grid can start up to a hop before the newest window
+        with self.assertRaises(ValueError):
+            data_parsing.iter_buffer_windows(buffer, window_length=48, hop=24)
+        data_parsing.iter_buffer_windows(buffer, window_length=48, hop=16)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/bin/python3
+# Test file for streaming training datasets from recording folders
+
+import tempfile
+import unittest
+
+import numpy as np
+
+from synapp.core import data_parsing, datasets, recording
+from synapp.core.filtering import FilterBank
+from tests import test_utils
+from tests.test_utils import CHANNELS
+
+SAMPLE_RATE = 256
+
+
+def write_recording_with_markers(folder, num_samples, labels, seed=0):
+    """ Write a chunked recording of noise, with a marker every 100 samples cycling through labels """
+    rng = np.random.default_rng(seed)
+    samples = rng.normal(size=(len(CHANNELS), num_samples))
+    timestamps = 1000 + np.arange(num_samples) / SAMPLE_RATE
+    test_utils.write_recording(folder, samples, timestamps, SAMPLE_RATE)
+
+    marker_indices = np.arange(50, num_samples, 100)
+    markers = [(labels[i % len(labels)], timestamps[index]) for i, index in enumerate(marker_indices)]
+    recording.write_markers(folder, markers)
+    return timestamps, samples, np.rec.fromrecords(markers, names=["marker", "timestamp"])
+
+
+class TestRecordingEpochs(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.timestamps, self.samples, self.markers = write_recording_with_markers(
+            self.folder.name, 3000, ["left", "right"]
+        )
+        self.label_map = {"left": 0, "right": 1}
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_matches_get_ML_set_from_data(self):
+        # Blocks of 300 samples, so many epochs straddle a block boundary
+        epochs = list(
+            datasets.iter_recording_epochs(
+                self.folder.name, self.label_map, samples_per_trial=128, filter_settings=False, block_duration=300 / 256
+            )
+        )
+        X, Y = data_parsing.get_ML_set_from_data(
+            self.markers, self.timestamps, self.samples, samples_per_trial=128, out_of_range="drop"
+        )
+
+        self.assertEqual(len(epochs), len(X))
+        np.testing.assert_allclose(np.stack([epoch for epoch, _ in epochs]), X)
+        np.testing.assert_array_equal([label for _, label in epochs], [self.label_map[marker] for marker in Y])
+
+    def test_blockwise_filtering_matches_whole_signal(self):
+        epochs = [
+            epoch
+            for epoch, _ in datasets.iter_recording_epochs(
+                self.folder.name, self.label_map, channels=["AF8", "TP9"], block_duration=1.0
+            )
+        ]
+        filtered = FilterBank(sample_rate=SAMPLE_RATE).filter(self.samples[[2, 0]])
+        expected, _ = data_parsing.get_epochs(self.markers["timestamp"], self.timestamps, filtered, out_of_range="drop")
+
+        self.assertEqual(epochs[0].dtype, np.float32)
+        np.testing.assert_allclose(np.stack(epochs), expected, rtol=1e-5, atol=1e-6)
+
+
+class TestMakeDataset(unittest.TestCase):
+    def test_batches_every_epoch(self):
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            write_recording_with_markers(first, 2000, ["left", "right"])
+            write_recording_with_markers(second, 2000, ["rest"], seed=1)
+
+            dataset = datasets.make_dataset([first, second], batch_size=8, add_channel_axis=True, seed=0)
+            batches = list(dataset.as_numpy_iterator())
+
+        labels = np.concatenate([labels for _, labels in batches])
+        self.assertTupleEqual(batches[0][0].shape, (8, 4, 128, 1))
+        self.assertEqual(batches[0][0].dtype, np.float32)
+        # 20 markers per recording, the last one has no full window after it
+        self.assertEqual(len(labels), 38)
+        np.testing.assert_array_equal(np.bincount(labels), [10, 19, 9])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/bin/python3
+# Test file for the filtering utility file
+
+import unittest
+
+import numpy as np
+import pandas as pd
+from scipy import signal as sps
+
+from synapp.core import filtering
+from tests import test_utils
+
+
+class TestFilterBank(unittest.TestCase):
+    def setUp(self):
+        _, self.samples, _ = test_utils.create_timestamps_samples_markers_arrays(
+            2048, 4, 256, generator_function=lambda length: np.random.default_rng(0).normal(size=length)
+        )
+
+    def test_chunked_filtering_matches_one_shot(self):
+        one_shot = filtering.FilterBank().filter(self.samples)
+
+        bank = filtering.FilterBank()
+        chunked = np.hstack([bank.filter(self.samples[:, i : i + 12]) for i in range(0, 2048, 12)])
+
+        np.testing.assert_allclose(chunked, one_shot, atol=1e-10)
+
+    def test_filter_matches_scipy_cascade(self):
+        bank = filtering.FilterBank(notch_frequency=None)
+        sos = filtering.butter_sos(0.1, 30, 256, 2, "band")
+        zi = sps.sosfilt_zi(sos)[:, np.newaxis, :] * self.samples[np.newaxis, :, 0, np.newaxis]
+        expected, _ = sps.sosfilt(sos, self.samples, axis=-1, zi=zi)
+
+        np.testing.assert_allclose(bank.filter(self.samples), expected)
+
+    def test_coefficients_are_cached(self):
+        filtering.bandpass_notch_sos.cache_clear()
+        first = filtering.FilterBank(lowcut=1, highcut=40)
+        second = filtering.FilterBank(lowcut=1, highcut=40)
+
+        self.assertIs(first.sos, second.sos)
+        self.assertEqual(filtering.bandpass_notch_sos.cache_info().hits, 1)
+
+
+class TestBandpassNotchFilterDataframe(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.dataframe = pd.DataFrame(
+            rng.normal(size=(256 * 60, 4)), columns=["TP9", "AF7", "AF8", "TP10"], index=np.arange(256 * 60) / 256
+        )
+
+    def test_matches_per_column_filtering(self):
+        filtered = filtering.bandpass_notch_filter_dataframe(self.dataframe)
+
+        self.assertTrue(all(dtype == np.float64 for dtype in filtered.dtypes))
+        for col_name, col in self.dataframe.items():
+            expected = filtering.butter_bandpass_filter(filtering.iir_notch_filter(col.to_numpy()), lowcut=0.1)
+            np.testing.assert_allclose(filtered[col_name].to_numpy(), expected, atol=1e-8)
+
+    def test_parallel_blocks_match_single_pass(self):
+        serial = filtering.bandpass_notch_filter_dataframe(self.dataframe)
+        parallel = filtering.bandpass_notch_filter_dataframe(
+            self.dataframe, num_workers=4, block_duration=10, block_warmup=30
+        )
+
+        np.testing.assert_allclose(parallel.to_numpy(), serial.to_numpy(), atol=1e-6)
+
+    def test_zero_phase_does_not_delay_signal(self):
+        time = self.dataframe.index.to_numpy()
+        sine = pd.DataFrame({"TP9": np.sin(2 * np.pi * 10 * time)}, index=self.dataframe.index)
+        causal = filtering.bandpass_notch_filter_dataframe(sine)["TP9"].to_numpy()
+        zero_phase = filtering.bandpass_notch_filter_dataframe(sine, zero_phase=True)["TP9"].to_numpy()
+
+        middle = slice(256 * 20, 256 * 40)
+        np.testing.assert_allclose(zero_phase[middle], sine["TP9"].to_numpy()[middle], atol=0.05)
+        self.assertGreater(np.abs(causal[middle] - sine["TP9"].to_numpy()[middle]).max(), 0.1)
+
+    def test_parallel_zero_phase_matches_single_pass(self):
+        serial = filtering.bandpass_notch_filter_dataframe(self.dataframe, zero_phase=True)
+        parallel = filtering.bandpass_notch_filter_dataframe(
+            self.dataframe, zero_phase=True, num_workers=4, block_duration=10, block_warmup=30
+        )
+
+        np.testing.assert_allclose(parallel.to_numpy(), serial.to_numpy(), atol=1e-5)
+
+
+class TestNotch(unittest.TestCase):
+    def setUp(self):
+        time = np.arange(256 * 20) / 256
+        self.line_noise = np.sin(2 * np.pi * 60 * time) + np.sin(2 * np.pi * 120 * time)
+        self.settled = slice(256 * 5, None)
+
+    def test_high_order_bandstop_is_stable(self):
+        filtered = filtering.notch_filter(self.line_noise[np.newaxis, :], q=100)
+
+        self.assertTrue(np.isfinite(filtered).all())
+        self.assertLess(np.abs(filtered[0, self.settled]).max(), 1.5)
+
+    def test_iir_notch_harmonics(self):
+        fundamental_only = filtering.iir_notch_filter(self.line_noise, harmonics=1)
+        with_harmonics = filtering.iir_notch_filter(self.line_noise, harmonics=2)
+
+        self.assertGreater(np.abs(fundamental_only[self.settled]).max(), 0.9)
+        self.assertLess(np.abs(with_harmonics[self.settled]).max(), 0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
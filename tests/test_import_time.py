@@ -0,0 +1,50 @@
+#!/bin/python3
+# Test that importing synapp stays fast, by not loading heavy dependencies until they're used
+
+import subprocess
+import sys
+import unittest
+
+# Seconds allowed for `import synapp.core.data_parsing` in a fresh interpreter (numpy alone is ~0.1 s)
+IMPORT_TIME_BUDGET = 1.0
+IMPORT_TIME_RUNS = 3
+
+
+def run_fresh(script):
+    """Run a script in a new interpreter, so nothing is already imported, and return its last output line"""
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+
+def modules_loaded_by(module, candidates):
+    script = f"import sys\nimport {module}\nprint([m for m in {candidates!r} if m in sys.modules])"
+    return run_fresh(script)
+
+
+class TestImportTime(unittest.TestCase):
+    def test_data_parsing_import_budget(self):
+        script = "from time import perf_counter\nstart = perf_counter()\nimport synapp.core.data_parsing\nprint(perf_counter() - start)"
+        best = min(float(run_fresh(script)) for _ in range(IMPORT_TIME_RUNS))
+
+        self.assertLess(best, IMPORT_TIME_BUDGET)
+
+    def test_heavy_dependencies_are_deferred(self):
+        expectations = {
+            "synapp.core.data_parsing": ["scipy", "pandas", "matplotlib"],
+            "synapp.core.devices.device": ["pandas", "muselsl", "yaml", "tqdm"],
+            "synapp.core.devices.device_scanner": ["muselsl", "pygatt"],
+            "synapp.core.machine_learning": ["tensorflow"],
+            "synapp.core.action_management": ["pynput", "PyQt5"],
+        }
+        for module, deferred in expectations.items():
+            with self.subTest(module=module):
+                self.assertEqual(modules_loaded_by(module, deferred), "[]")
+
+    def test_logging_import_leaves_root_logger_alone(self):
+        script = "import logging\nimport synapp.core.logging\nprint(len(logging.root.handlers))"
+
+        self.assertEqual(run_fresh(script), "0")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/bin/python3
+# Test file for the machine_learning utility file
+
+import unittest
+
+import numpy as np
+
+from synapp.core import machine_learning
+
+
+class TestPredictions(unittest.TestCase):
+    def test_get_prediction_threshold(self):
+        self.assertEqual(machine_learning.get_prediction(np.array([0.1, 0.8, 0.1]), 0.5, -1), 1)
+        self.assertEqual(machine_learning.get_prediction(np.array([0.4, 0.3, 0.3]), 0.5, -1), -1)
+
+    def test_get_predictions_matches_get_prediction(self):
+        probabilities = np.random.default_rng(0).dirichlet(np.ones(3), size=50)
+
+        classes, confidences = machine_learning.get_predictions(probabilities, 0.5, -1)
+
+        for i, prediction_array in enumerate(probabilities):
+            self.assertEqual(classes[i], machine_learning.get_prediction(prediction_array, 0.5, -1))
+        np.testing.assert_array_equal(confidences, probabilities.max(axis=1))
+
+
+class TestInferenceRunner(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.model = machine_learning.getmodel(num_classes=3, num_channels=4, window_length=32)
+        cls.runner = machine_learning.InferenceRunner(cls.model, max_batch_size=8)
+
+    def test_predict_matches_model(self):
+        windows = np.random.default_rng(0).normal(size=(20, 4, 32)).astype(np.float32)
+
+        classes, confidences = self.runner.predict(windows)
+
+        expected = self.model.predict(windows, verbose=0)
+        np.testing.assert_array_equal(classes, expected.argmax(axis=1))
+        np.testing.assert_allclose(confidences, expected.max(axis=1), rtol=1e-5)
+        # 20 windows in micro-batches of at most 8
+        self.assertGreaterEqual(self.runner.latency_stats()["calls"], 3)
+
+    def test_submit_and_flush(self):
+        windows = np.random.default_rng(1).normal(size=(5, 4, 32))
+        for window in windows:
+            self.runner.submit(window)
+
+        classes, _ = self.runner.flush()
+        empty_classes, _ = self.runner.flush()
+
+        np.testing.assert_array_equal(classes, self.runner.predict(windows)[0])
+        self.assertEqual(len(empty_classes), 0)
+        stats = self.runner.latency_stats()
+        self.assertLessEqual(stats["p50_ms"], stats["p99_ms"])
+
+    def test_rejects_windows_of_the_wrong_shape(self):
+        # Each would reshape into (n, 4, 32) windows, but the samples would end up in the wrong places
+        for shape in [(2, 32, 4), (2, 4, 16), (4, 32), (2, 4, 32, 1)]:
+            with self.subTest(shape=shape), self.assertRaises(ValueError):
+                self.runner.predict(np.zeros(shape))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/bin/python3
+# Test file for the marker index
+
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from synapp.core import data_parsing
+from synapp.core.markers import MarkerIndex
+from tests import test_utils
+
+
+class TestMarkerIndex(unittest.TestCase):
+    def test_matches_linear_scan(self):
+        rng = np.random.default_rng(0)
+        timestamps = rng.uniform(0, 100, size=500)
+        labels = rng.choice(["left", "right", "rest"], size=500)
+        index = MarkerIndex(timestamps, labels)
+
+        found_timestamps, found_labels = index.between(20, 30)
+
+        expected = (timestamps >= 20) & (timestamps < 30)
+        np.testing.assert_array_equal(found_timestamps, np.sort(timestamps[expected]))
+        self.assertCountEqual(found_labels, labels[expected])
+
+    def test_get_markers_between_timestamps_accepts_record_arrays(self):
+        timestamps, _, markers = test_utils.create_timestamps_samples_markers_arrays(5000, 4, 2)
+
+        found_timestamps, found_labels = data_parsing.get_markers_between_timestamps(0, timestamps[2000], markers)
+        empty_timestamps, _ = data_parsing.get_markers_between_timestamps(timestamps[2000], 0, markers)
+
+        np.testing.assert_array_equal(found_labels, ["one"])
+        self.assertEqual(found_timestamps[0], markers["timestamp"][0])
+        self.assertEqual(len(empty_timestamps), 0)
+
+    def test_get_markers_between_timestamps_output(self):
+        markers = np.rec.fromrecords([("left", 3.0), ("right", 1.0), ("rest", 2.0)], names=["marker", "timestamp"])
+
+        with mock.patch.object(MarkerIndex, "from_markers", wraps=MarkerIndex.from_markers) as from_markers:
+            for _ in range(3):
+                found_timestamps, found_labels = data_parsing.get_markers_between_timestamps(1.5, 4, markers)
+        found_labels[0] = "changed"
+        empty_timestamps, empty_labels = data_parsing.get_markers_between_timestamps(5, 6, markers)
+
+        # Indexed once, and the results are copies with the same dtypes as the linear scan's
+        self.assertEqual(from_markers.call_count, 1)
+        np.testing.assert_array_equal(found_timestamps, [2.0, 3.0])
+        self.assertEqual(found_labels.dtype.kind, "U")
+        np.testing.assert_array_equal(data_parsing.get_markers_between_timestamps(1.5, 4, markers)[1], ["rest", "left"])
+        self.assertEqual(empty_timestamps.dtype, np.float64)
+        self.assertEqual(len(empty_labels), 0)
+
+    def test_incremental_insertion_keeps_order(self):
+        index = MarkerIndex.from_markers([("a", 1.0), ("b", 5.0)])
+        index.add(3.0, "c")
+        index.add(7.0, "d")
+        index.extend([0.5, 6.0], ["e", "f"])
+        for i in range(100):
+            index.add(10.0 + i, "live")
+
+        self.assertEqual(len(index), 106)
+        self.assertTrue(np.all(np.diff(index.timestamps) >= 0))
+        np.testing.assert_array_equal(index.between(0, 7.5)[1], ["e", "a", "c", "b", "f", "d"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+#!/bin/python3
+# Test file for the metrics layer
+
+import os
+import tempfile
+import unittest
+from time import perf_counter
+
+import numpy as np
+
+from synapp.core import metrics
+from synapp.core.devices.virtual_devices import SyntheticDevice
+from synapp.core.filtering import FilterBank
+from synapp.core.recording import Recording
+
+# Generous bound on a disabled timer, so this only fails if something expensive creeps in
+DISABLED_TIMER_BUDGET = 2e-6  # sec per call
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        metrics.enable()
+
+    def tearDown(self):
+        metrics.disable()
+        metrics.reset()
+
+
+class TestMetrics(MetricsTestCase):
+    def test_counters_gauges_and_histograms(self):
+        metrics.inc("samples_total", 12, device="muse")
+        metrics.inc("samples_total", 12, device="muse")
+        metrics.set_gauge("queue_depth", 3)
+        for value in range(1, 101):
+            metrics.observe("latency_seconds", value)
+
+        values = metrics.snapshot()
+
+        self.assertEqual(values['samples_total{device="muse"}'], 24)
+        self.assertEqual(values["queue_depth"], 3)
+        self.assertEqual(values["latency_seconds"]["count"], 100)
+        self.assertEqual(values["latency_seconds"]["sum"], 5050)
+        self.assertAlmostEqual(values["latency_seconds"]["p50"], 50.5)
+        self.assertAlmostEqual(values["latency_seconds"]["p99"], 99.01)
+
+    def test_histogram_quantiles_use_recent_history(self):
+        histogram = metrics.Histogram("latency_seconds", {}, history=10)
+        for value in [100.0] * 10 + [1.0] * 10:
+            histogram.observe(value)
+
+        self.assertEqual(histogram.count, 20)
+        self.assertEqual(histogram.quantiles()[0.99], 1.0)
+
+    def test_timer(self):
+        with metrics.timer("block_seconds", stage="filter"):
+            pass
+
+        self.assertEqual(metrics.snapshot()['block_seconds{stage="filter"}']["count"], 1)
+
+    def test_disabled_records_nothing(self):
+        metrics.disable()
+        metrics.inc("samples_total")
+        metrics.observe("latency_seconds", 1.0)
+        calls = 100000
+        start = perf_counter()
+        for _ in range(calls):
+            with metrics.timer("block_seconds"):
+                pass
+        per_call = (perf_counter() - start) / calls
+
+        self.assertDictEqual(metrics.snapshot(), {})
+        self.assertLess(per_call, DISABLED_TIMER_BUDGET)
+
+    def test_one_kind_per_name(self):
+        metrics.inc("samples_total")
+
+        with self.assertRaises(TypeError):
+            metrics.observe("samples_total", 1.0)
+
+
+class TestSampleGapCounter(MetricsTestCase):
+    def test_counts_missing_samples_across_chunks(self):
+        gaps = metrics.SampleGapCounter(256, device="muse")
+        timestamps = np.arange(100) / 256
+        # 5 samples lost inside the first chunk, 12 between the chunks
+        first = np.delete(timestamps[:50], np.arange(20, 25))
+        second = timestamps[62:]
+
+        self.assertEqual(gaps.update(first), 5)
+        self.assertEqual(gaps.update(second), 12)
+        self.assertEqual(metrics.snapshot()['dropped_samples_total{device="muse"}'], 17)
+
+    def test_jitter_is_not_a_gap(self):
+        gaps = metrics.SampleGapCounter(256)
+        jittered = np.arange(256) / 256 + np.random.default_rng(0).uniform(-0.001, 0.001, 256)
+
+        self.assertEqual(gaps.update(jittered), 0)
+
+
+class TestExport(MetricsTestCase):
+    def test_prometheus_format(self):
+        metrics.inc("samples_total", 5, device='muse "2"')
+        metrics.observe("inference_seconds", 0.01, backend="tflite")
+
+        text = metrics.format_prometheus()
+
+        self.assertIn("# TYPE synapp_samples_total counter\n", text)
+        self.assertIn('synapp_samples_total{device="muse \\"2\\""} 5\n', text)
+        self.assertIn("# TYPE synapp_inference_seconds summary\n", text)
+        self.assertIn('synapp_inference_seconds{backend="tflite",quantile="0.99"} 0.01\n', text)
+        self.assertIn('synapp_inference_seconds_count{backend="tflite"} 1\n', text)
+
+    def test_reporter_writes_on_stop(self):
+        metrics.inc("samples_total")
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "synapp.prom")
+            with metrics.MetricsReporter(interval=60, path=path, log=False):
+                pass
+
+            with open(path) as f:
+                self.assertIn("synapp_samples_total 1\n", f.read())
+            self.assertListEqual(os.listdir(folder), ["synapp.prom"])
+
+    def test_log_metrics(self):
+        metrics.inc("samples_total")
+
+        with self.assertLogs("synapp.core.logging", level="INFO") as logs:
+            metrics.log_metrics()
+
+        self.assertIn('metrics {"samples_total": 1}', logs.output[0])
+
+
+class TestInstrumentation(MetricsTestCase):
+    def test_filter_bank_is_timed(self):
+        filter_bank = FilterBank()
+        for _ in range(3):
+            filter_bank.filter(np.zeros((4, 12)))
+
+        self.assertEqual(metrics.snapshot()["filter_seconds"]["count"], 3)
+
+    def test_recording_is_instrumented(self):
+        device = SyntheticDevice(speed=4.0, seed=0)
+
+        with tempfile.TemporaryDirectory() as folder:
+            saved = Recording(device.record(folder, recording_time=0.3))
+        values = metrics.snapshot()
+
+        self.assertEqual(values['samples_received_total{device="Synthetic"}'], len(saved))
+        self.assertEqual(values['dropped_samples_total{device="Synthetic"}'], 0)
+        self.assertGreater(values['device_callback_seconds{device="Synthetic"}']["count"], 0)
+        self.assertGreater(values["recording_flush_seconds"]["count"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/bin/python3
+# Test file for exporting models and running them without TensorFlow
+
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+from synapp.core import machine_learning, model_runtime
+
+HAS_ONNX = all(importlib.util.find_spec(name) for name in ("tf2onnx", "onnxruntime"))
+HAS_LITE_RUNTIME = any(importlib.util.find_spec(name) for name in ("ai_edge_litert", "tflite_runtime"))
+
+
+class TestModelRuntime(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.TemporaryDirectory()
+        cls.model = machine_learning.getmodel(num_classes=3, num_channels=4, window_length=32)
+        cls.windows = np.random.default_rng(0).normal(size=(40, 4, 32)).astype(np.float32)
+        cls.expected = cls.model.predict(cls.windows, verbose=0)
+        cls.tflite_path = model_runtime.export_tflite(cls.model, os.path.join(cls.folder.name, "model.tflite"))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.folder.cleanup()
+
+    def test_tflite_matches_keras(self):
+        model = model_runtime.LiteModel(self.tflite_path, max_batch_size=16)
+
+        classes, confidences = model.predict(self.windows)
+
+        np.testing.assert_array_equal(classes, self.expected.argmax(axis=1))
+        np.testing.assert_allclose(confidences, self.expected.max(axis=1), rtol=1e-4)
+        self.assertEqual(model.latency_stats()["calls"], 3)
+
+    def test_quantized_tflite_is_close(self):
+        path = model_runtime.export_tflite(
+            self.model, os.path.join(self.folder.name, "int8.tflite"), quantize=True, calibration_windows=self.windows
+        )
+        model = model_runtime.LiteModel(path)
+
+        probabilities = model.predict_probabilities(self.windows)
+
+        self.assertLess(os.path.getsize(path), os.path.getsize(self.tflite_path))
+        np.testing.assert_allclose(probabilities, self.expected, atol=0.1)
+
+    def test_rejects_windows_of_the_wrong_shape(self):
+        model = model_runtime.LiteModel(self.tflite_path)
+
+        for shape in [(2, 32, 4), (2, 4, 16), (4, 32), (2, 4, 32, 1)]:
+            with self.subTest(shape=shape), self.assertRaises(ValueError):
+                model.predict(np.zeros(shape))
+
+    @unittest.skipUnless(HAS_ONNX, "tf2onnx and onnxruntime are not installed")
+    def test_onnx_matches_keras(self):
+        path = model_runtime.export_onnx(self.model, os.path.join(self.folder.name, "model.onnx"))
+        model = model_runtime.LiteModel(path, max_batch_size=16)
+
+        for window in self.windows[:5]:
+            model.submit(window)
+        classes, confidences = model.flush()
+
+        np.testing.assert_array_equal(classes, self.expected[:5].argmax(axis=1))
+        np.testing.assert_allclose(confidences, self.expected[:5].max(axis=1), rtol=1e-4)
+
+    @unittest.skipUnless(HAS_LITE_RUNTIME, "No standalone TFLite runtime is installed")
+    def test_does_not_import_tensorflow(self):
+        script = (
+            "import sys, numpy as np\n"
+            "from synapp.core.model_runtime import LiteModel\n"
+            f"LiteModel({self.tflite_path!r}).predict(np.zeros((2, 4, 32)))\n"
+            "print('tensorflow' in sys.modules)\n"
+        )
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+
+        self.assertEqual(result.stdout.strip().splitlines()[-1], "False")
+
+
+class TestAsWindowBatch(unittest.TestCase):
+    def test_adds_only_a_missing_trailing_axis(self):
+        windows = np.zeros((3, 4, 32))
+
+        self.assertEqual(model_runtime.as_window_batch(windows, (4, 32, 1)).shape, (3, 4, 32, 1))
+        self.assertEqual(model_runtime.as_window_batch(windows, (4, 32)).dtype, np.float32)
+        for input_shape in [(4, 32, 2), (1, 4, 32), (32, 4)]:
+            with self.subTest(input_shape=input_shape), self.assertRaises(ValueError):
+                model_runtime.as_window_batch(windows, input_shape)
+
+
+if __name__ == "__main__":
+    unittest.main()
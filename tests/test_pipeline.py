@@ -0,0 +1,207 @@
+#!/bin/python3
+# Test file for the online pipeline
+
+import threading
+import unittest
+
+import numpy as np
+
+from synapp.core.action_management import Action
+from synapp.core.devices.virtual_devices import SyntheticDevice
+from synapp.core.pipeline import Debouncer, OnlinePipeline
+
+PREDICTION_MAP = {0: "still", 1: "winkright"}
+
+
+class ThresholdRunner:
+    """Predicts "winkright" (1) for windows whose mean is above a threshold, "still" (0) otherwise"""
+
+    def __init__(self, threshold=0.5):
+        self.threshold = threshold
+        self.calls = []
+
+    def predict(self, windows):
+        self.calls.append(len(windows))
+        classes = (windows.mean(axis=(1, 2)) > self.threshold).astype(np.int64)
+        return classes, np.ones(len(windows), dtype=np.float32)
+
+    def latency_stats(self):
+        return {}
+
+
+class FailingRunner(ThresholdRunner):
+    def predict(self, windows):
+        raise RuntimeError("model failed")
+
+
+class RecordingAction(Action):
+    def __init__(self, name):
+        self.calls = 0
+        super().__init__(name, self.run)
+
+    def run(self):
+        self.calls += 1
+
+
+def feed_steps(pipeline, levels, chunk_size=12, chunks_per_level=40, num_channels=4):
+    """Feed chunks that hold each level for a while, with timestamps at 256 Hz"""
+    sample = 0
+    for level in levels:
+        for _ in range(chunks_per_level):
+            pipeline.feed(np.full((num_channels + 1, chunk_size), level), (sample + np.arange(chunk_size)) / 256)
+            sample += chunk_size
+
+
+class TestDebouncer(unittest.TestCase):
+    def test_needs_consecutive_predictions(self):
+        debouncer = Debouncer(consecutive=3, refractory_period=0)
+        fired = [debouncer.update(label, now=i) for i, label in enumerate(["a", "a", "b", "a", "a", "a", "a"])]
+
+        self.assertListEqual(fired, [None, None, None, None, None, "a", None])
+
+    def test_refractory_period(self):
+        debouncer = Debouncer(consecutive=1, refractory_period=1.0)
+        fired = [debouncer.update("a", now=now) for now in [0.0, 0.5, 0.99, 1.0, 1.5]]
+
+        self.assertListEqual(fired, ["a", None, None, "a", None])
+
+    def test_none_breaks_a_run(self):
+        debouncer = Debouncer(consecutive=2, refractory_period=0)
+        fired = [debouncer.update(label, now=0) for label in ["a", None, "a", "a"]]
+
+        self.assertListEqual(fired, [None, None, None, "a"])
+
+
+class TestOnlinePipeline(unittest.TestCase):
+    def test_step_triggers_one_action(self):
+        action = RecordingAction("command1")
+        predictions = []
+        pipeline = OnlinePipeline(
+            ThresholdRunner(),
+            num_channels=4,
+            hop=32,
+            filter_settings=False,
+            prediction_map=PREDICTION_MAP,
+            actions={"winkright": action},
+            consecutive=2,
+            refractory_period=60,
+            on_prediction=predictions.append,
+            # Fed far faster than real time, so make room rather than drop
+            queue_size=1000,
+        )
+
+        with pipeline.start():
+            feed_steps(pipeline, [0.0, 1.0, 0.0, 1.0])
+
+        # 4 x 40 chunks x 12 samples, one window per 32 samples once the first 128 are in
+        self.assertEqual(len(predictions), (4 * 40 * 12 - 128) // 32 + 1)
+        self.assertListEqual(sorted({p.label for p in predictions}), ["still", "winkright"])
+        # The second step falls inside the refractory period
+        self.assertEqual(action.calls, 1)
+        self.assertEqual(len(pipeline.dispatched), 1)
+        self.assertEqual(pipeline.dispatched[0][0], "winkright")
+        self.assertEqual(pipeline.latency_stats()["calls"], 1)
+
+    def test_predictions_stay_in_order_and_batch(self):
+        runner = ThresholdRunner()
+        timestamps = []
+        pipeline = OnlinePipeline(
+            runner,
+            num_channels=4,
+            filter_settings=False,
+            prediction_map=PREDICTION_MAP,
+            actions={},
+            on_prediction=lambda prediction: timestamps.append(prediction.timestamp),
+            queue_size=1000,
+        )
+
+        with pipeline.start():
+            feed_steps(pipeline, [0.0] * 10)
+
+        self.assertTrue(np.all(np.diff(timestamps) > 0))
+        self.assertEqual(sum(runner.calls), len(timestamps))
+        self.assertLessEqual(max(runner.calls), pipeline.max_batch_size)
+
+    def test_streams_from_device(self):
+        enough = threading.Event()
+        predictions = []
+
+        def on_prediction(prediction):
+            predictions.append(prediction)
+            if len(predictions) >= 20:
+                enough.set()
+
+        pipeline = OnlinePipeline(
+            ThresholdRunner(threshold=1e9), num_channels=4, prediction_map=PREDICTION_MAP, on_prediction=on_prediction
+        )
+        with pipeline.start(SyntheticDevice(speed=20.0, seed=0)):
+            self.assertTrue(enough.wait(10))
+
+        self.assertTrue(all(p.label == "still" for p in predictions))
+
+    def feed_until_failed(self, pipeline):
+        # With small queues most chunks are dropped, so keep feeding until a window gets through and fails
+        for _ in range(1000):
+            feed_steps(pipeline, [0.0])
+            if pipeline.errors:
+                break
+        # Then keep the queues full while the failed stage is stuck
+        feed_steps(pipeline, [0.0] * 5)
+
+    def assertStops(self, pipeline):
+        stopper = threading.Thread(target=pipeline.stop, daemon=True)
+        stopper.start()
+        stopper.join(10)
+        self.assertFalse(stopper.is_alive(), "stop() hung")
+
+    def test_failing_stage_does_not_hang_stop(self):
+        # Small queues, so the stages upstream of the failed one fill them up
+        pipeline = OnlinePipeline(
+            FailingRunner(), num_channels=4, filter_settings=False, prediction_map=PREDICTION_MAP, queue_size=2
+        )
+        with self.assertLogs("synapp.core.logging", level="ERROR") as logs:
+            pipeline.start()
+            self.feed_until_failed(pipeline)
+            self.assertStops(pipeline)
+
+        self.assertIn("Pipeline infer stage failed: model failed", logs.output[0])
+        self.assertListEqual([stage for stage, _ in pipeline.errors], ["infer"])
+
+    def test_stop_while_feeding_does_not_hang(self):
+        pipeline = OnlinePipeline(
+            ThresholdRunner(), num_channels=4, filter_settings=False, prediction_map=PREDICTION_MAP, queue_size=1
+        )
+        pipeline.start()
+        feeding = threading.Event()
+
+        def feed_forever():
+            while True:
+                pipeline.feed(np.zeros((4, 12)), np.arange(12) / 256)
+                feeding.set()
+
+        threading.Thread(target=feed_forever, daemon=True).start()
+        feeding.wait(10)
+        self.assertStops(pipeline)
+
+    def test_failing_callback_does_not_hang_stop(self):
+        def on_prediction(prediction):
+            raise ValueError("bad callback")
+
+        pipeline = OnlinePipeline(
+            ThresholdRunner(),
+            num_channels=4,
+            filter_settings=False,
+            prediction_map=PREDICTION_MAP,
+            on_prediction=on_prediction,
+            queue_size=2,
+        )
+        with self.assertLogs("synapp.core.logging", level="ERROR"):
+            pipeline.start()
+            self.feed_until_failed(pipeline)
+            self.assertStops(pipeline)
+
+        self.assertListEqual([stage for stage, _ in pipeline.errors], ["dispatch"])
+
+
+if __name__ == "__main__":
+    unittest.main()
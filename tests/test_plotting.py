@@ -1,55 +1,268 @@
 #!/bin/python3
 # Test file for the bci_plotting utility file
 
+import tempfile
 import unittest
 
-import matplotlib as plt
+import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 
-from synapp.core import plotting
+from synapp.core import plotting, recording
+from synapp.core.ring_buffer import RingBuffer
 from tests import test_utils
 
+
 class TestPlotting(unittest.TestCase):
+    # Played back far faster than real time, and without blocking in plt.show() at the end
+
+    def tearDown(self):
+        plt.close("all")
 
     def test_playback(self):
         timestamps, samples, markers = test_utils.create_timestamps_samples_markers_arrays(5000, 4, 2)
-        print(markers)
-        plotting.playback_data(timestamps, samples, markers, 100, playback_speed=10, step_size=5, num_channels=4, fourier_channel=1)
+        plot = plotting.playback_data(
+            timestamps,
+            samples,
+            markers,
+            100,
+            playback_speed=10000,
+            step_size=5,
+            num_channels=4,
+            fourier_channel=1,
+            show=False,
+        )
+
+        self.assertEqual(plot.frames, (5000 - 100) // 5 + 1)
 
     def test_playback_data_default_args(self):
         # Test playback_data() with default arguments
         timestamps = np.arange(0, 100, 0.1)
         samples = np.random.rand(5, 1000)
-        markers = [("marker 1", 10), ("marker 2", 20), ("marker 3", 30)]
+        markers = [("marker 1", 10), ("marker 2", 20), ("marker 3", 95)]
         display_window_length = 100
-        
-        plotting.playback_data(timestamps, samples, markers, display_window_length)
-        
-        # Verify that the plot has the expected number of channels
-        assert len(plt.gcf().axes) == 6
-        
-        # Verify that the plot has the expected number of markers
-        assert len(plt.gcf().axes[0].get_xticklabels()) == 4
+
+        plot = plotting.playback_data(
+            timestamps, samples, markers, display_window_length, playback_speed=10000, show=False
+        )
+
+        # One stacked time series axis, and one for the spectrum
+        self.assertEqual(len(plt.gcf().axes), 2)
+        self.assertEqual(len(plot.lines.get_segments()), 5)
+
+        # Only the last window's marker is drawn at the end
+        self.assertEqual(len(plot.marker_lines.get_segments()), 1)
 
     def test_playback_data_custom_args(self):
         # Test playback_data() with custom arguments
         timestamps = np.arange(0, 50, 0.1)
         samples = np.random.rand(5, 500)
-        markers = [("marker 1", 5), ("marker 2", 10), ("marker 3", 15)]
+        markers = [("marker 1", 5), ("marker 2", 46), ("marker 3", 48)]
         display_window_length = 50
-        playback_speed = 2
+        playback_speed = 10000
         step_size = 5
         num_channels = 3
         fourier_channel = 1
-        
-        plotting.playback_data(timestamps, samples, markers, display_window_length, playback_speed, step_size, num_channels, fourier_channel)
-        
-        # Verify that the plot has the expected number of channels
-        assert len(plt.gcf().axes) == 4
-        
-        # Verify that the plot has the expected number of markers
-        assert len(plt.gcf().axes[0].get_xticklabels()) == 4
+
+        plot = plotting.playback_data(
+            timestamps,
+            samples,
+            markers,
+            display_window_length,
+            playback_speed,
+            step_size,
+            num_channels,
+            fourier_channel,
+            show=False,
+        )
+
+        self.assertEqual(len(plt.gcf().axes), 2)
+        self.assertEqual(len(plot.lines.get_segments()), 3)
+        self.assertEqual(len(plot.marker_lines.get_segments()), 2)
+
+    def test_playback_spectrum_of_a_channel_not_shown(self):
+        timestamps, samples, markers = test_utils.create_timestamps_samples_markers_arrays(512, 5, 256)
+
+        plot = plotting.playback_data(
+            timestamps, samples, markers, 256, playback_speed=10000, num_channels=4, show=False
+        )
+
+        self.assertEqual(len(plot.lines.get_segments()), 4)
+        self.assertEqual(len(plot.fourier_line.get_xdata()), 256 // 2)
+
+
+def agg_figure():
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    return figure
+
+
+class TestMinMaxDecimate(unittest.TestCase):
+    def test_keeps_extremes(self):
+        timestamps = np.arange(10000) / 256
+        samples = np.random.default_rng(0).normal(size=(3, 10000))
+        samples[1, 1234] = 100
+
+        times, decimated = plotting.minmax_decimate(timestamps, samples, 1000)
+
+        self.assertEqual(decimated.shape, (3, 1000))
+        self.assertEqual(len(times), 1000)
+        self.assertEqual(decimated[1].max(), 100)
+        np.testing.assert_array_equal(decimated.min(axis=1), samples[:, 10000 - 500 * 20 :].min(axis=1))
+        self.assertEqual(times[-1], timestamps[-1])
+        self.assertTrue(np.all(np.diff(times) >= 0))
+
+    def test_uneven_length_keeps_the_oldest_samples(self):
+        timestamps = np.arange(10007) / 256
+        samples = np.random.default_rng(1).normal(size=(2, 10007))
+        # Spikes in the few samples that don't fill a whole bucket
+        samples[0, 0] = 100
+        samples[1, 3] = -100
+
+        times, decimated = plotting.minmax_decimate(timestamps, samples, 1000)
+
+        self.assertLessEqual(decimated.shape[1], 1000)
+        np.testing.assert_array_equal(decimated.max(axis=1), samples.max(axis=1))
+        np.testing.assert_array_equal(decimated.min(axis=1), samples.min(axis=1))
+        self.assertEqual(times[0], timestamps[0])
+        self.assertEqual(times[-1], timestamps[-1])
+        self.assertTrue(np.all(np.diff(times) >= 0))
+
+    def test_reads_in_blocks(self):
+        timestamps = np.arange(10000) / 256
+        samples = np.random.default_rng(0).normal(size=(3, 10000))
+        expected = plotting.minmax_decimate(timestamps, samples, 100)
+
+        original_block_size = plotting.DECIMATION_BLOCK_SIZE
+        plotting.DECIMATION_BLOCK_SIZE = 1000
+        try:
+            # Transposed, like a memory-mapped recording's samples
+            blocked = plotting.minmax_decimate(timestamps, np.asfortranarray(samples), 100)
+        finally:
+            plotting.DECIMATION_BLOCK_SIZE = original_block_size
+
+        np.testing.assert_array_equal(blocked[0], expected[0])
+        np.testing.assert_array_equal(blocked[1], expected[1])
+
+    def test_short_input_unchanged(self):
+        timestamps = np.arange(100.0)
+        samples = np.zeros((2, 100))
+
+        times, decimated = plotting.minmax_decimate(timestamps, samples, 1000)
+
+        self.assertIs(times, timestamps)
+        self.assertIs(decimated, samples)
+
+
+class TestSignalPlot(unittest.TestCase):
+    def test_updates_without_redrawing(self):
+        plot = plotting.SignalPlot(32, 1024, figure=agg_figure())
+        timestamps, samples, _ = test_utils.create_timestamps_samples_markers_arrays(2048, 32, 256)
+        draws = []
+        plot.figure.canvas.mpl_connect("draw_event", draws.append)
+        plot.update(timestamps[:1024], samples[:, :1024])
+        redraws_before = len(draws)
+
+        for start in range(32, 1024, 32):
+            plot.update(
+                timestamps[start : start + 1024], samples[:, start : start + 1024], timestamps[start : start + 1]
+            )
+
+        self.assertEqual(plot.frames, 32)
+        # Spectrum growth can force a redraw, the time series never should
+        self.assertLessEqual(len(draws) - redraws_before, 2)
+        self.assertEqual(len(plot.lines.get_segments()), 32)
+        self.assertLessEqual(len(plot.lines.get_segments()[0]), plot.ax.bbox.width)
+        self.assertEqual(len(plot.marker_lines.get_segments()), 1)
+
+    def test_channels_stay_in_their_band(self):
+        plot = plotting.SignalPlot(4, 256, fourier_channel=None, figure=agg_figure())
+        samples = np.random.default_rng(0).normal(size=(4, 256)) * np.array([[1], [10], [100], [1000]])
+
+        plot.update(np.arange(256) / 256, samples)
+
+        for channel, segment in enumerate(plot.lines.get_segments()):
+            offset = 3 - channel
+            self.assertLessEqual(np.abs(segment[:, 1] - offset).max(), 0.5)
+
+    def test_spectrum_channel_past_the_shown_channels(self):
+        plot = plotting.SignalPlot(4, 256, fourier_channel=4, figure=agg_figure())
+        samples = np.zeros((5, 256))
+        samples[4] = np.sin(2 * np.pi * 10 * np.arange(256) / 256)
+
+        plot.update(np.arange(256) / 256, samples)
+
+        frequencies, amplitudes = plot.fourier_line.get_data()
+        self.assertAlmostEqual(frequencies[np.argmax(amplitudes)], 10, delta=1)
+        self.assertEqual(len(plot.lines.get_segments()), 4)
+
+    def test_flat_channel(self):
+        plot = plotting.SignalPlot(2, 256, fourier_channel=None, figure=agg_figure())
+        samples = np.zeros((2, 256))
+        samples[1] = np.arange(256)
+
+        plot.update(np.arange(256) / 256, samples)
+
+        np.testing.assert_array_equal(plot.lines.get_segments()[0][:, 1], 1)
+
+    def test_ring_buffer_playback(self):
+        buffer = RingBuffer(4, 1024)
+        timestamps, samples, _ = test_utils.create_timestamps_samples_markers_arrays(512, 4, 256)
+        buffer.append(samples, timestamps)
+
+        plot = plotting.playback_ring_buffer(buffer, 256, fps=100, duration=0.2, figure=agg_figure())
+
+        # Nothing new arrives, so the window is only drawn once
+        self.assertEqual(plot.frames, 1)
+
+
+class TestPlotTimeseriesDataframe(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        timestamps = np.arange(256 * 600) / 256
+        self.samples = 20 * np.sin(2 * np.pi * 10 * timestamps) + rng.normal(0, 5, (4, len(timestamps)))
+        self.dataframe = pd.DataFrame(
+            self.samples.T, columns=["TP9", "AF7", "AF8", "TP10"], index=pd.Index(timestamps, name="timestamps")
+        )
+
+    def tearDown(self):
+        plt.close("all")
+
+    def plotted_lines(self):
+        axes = plt.gcf().axes
+        return [line.get_ydata() for ax in axes[::2] for line in ax.lines], axes[1].lines[0]
+
+    def test_decimates_to_the_axes_width(self):
+        plotting.plot_timeseries_dataframe(self.dataframe, 256, show=False)
+        lines, psd_line = self.plotted_lines()
+
+        self.assertEqual(len(lines), 4)
+        width = plt.gcf().axes[0].bbox.width
+        for channel, line in zip(self.samples, lines):
+            self.assertLessEqual(len(line), 2 * np.ceil(width))
+            self.assertEqual(line.max(), channel.max())
+            self.assertEqual(line.min(), channel.min())
+        # 10 Hz peak, at 0.5 Hz resolution
+        self.assertAlmostEqual(psd_line.get_xdata()[np.argmax(psd_line.get_ydata())], 10)
+
+    def test_plots_a_recording_lazily(self):
+        with tempfile.TemporaryDirectory() as folder:
+            test_utils.write_recording(
+                folder, self.samples, self.dataframe.index.to_numpy(), channels=self.dataframe.columns
+            )
+
+            plotting.plot_timeseries_dataframe(recording.Recording(folder), 256, show=False)
+            from_recording, _ = self.plotted_lines()
+            plt.close("all")
+            plotting.plot_timeseries_dataframe(self.dataframe, 256, show=False)
+            from_dataframe, _ = self.plotted_lines()
+
+        self.assertEqual(len(from_recording), 4)
+        for a, b in zip(from_recording, from_dataframe):
+            np.testing.assert_array_equal(a, b)
 
 
-if __name__ == '__main__':
+if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,105 @@
+#!/bin/python3
+# Test file for reading and writing recording folders
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from synapp.core import data_parsing, recording
+from tests import test_utils
+from tests.test_utils import CHANNELS
+
+
+
+def write_chunked_recording(folder, num_chunks=5, chunk_size=12, sample_rate=256):
+    """ Write a small chunked recording whose samples encode their own sample index """
+    indices = np.arange(num_chunks * chunk_size)
+    samples = np.vstack([indices + 1000 * ch for ch in range(len(CHANNELS))])
+    test_utils.write_recording(folder, samples, indices / sample_rate, sample_rate, chunk_size=chunk_size)
+    return num_chunks * chunk_size
+
+
+class TestRecording(unittest.TestCase):
+    def test_chunked_round_trip(self):
+        with tempfile.TemporaryDirectory() as folder:
+            num_samples = write_chunked_recording(folder)
+            dataframe = recording.read_recording(folder)
+            chunk_index = recording.read_chunk_index(folder)
+
+        self.assertListEqual(list(dataframe.columns), CHANNELS)
+        self.assertEqual(len(dataframe), num_samples)
+        self.assertEqual(len(chunk_index), 5)
+        np.testing.assert_array_equal(dataframe["AF7"].to_numpy(), np.arange(num_samples) + 1000)
+        np.testing.assert_allclose(dataframe.index.to_numpy(), np.arange(num_samples) / 256)
+
+    def test_partial_trailing_write_is_ignored(self):
+        with tempfile.TemporaryDirectory() as folder:
+            num_samples = write_chunked_recording(folder)
+            # Simulate a crash after samples were written but before the index was updated
+            with open(os.path.join(folder, recording.SAMPLES_FILE), "ab") as f:
+                np.zeros((3, len(CHANNELS))).tofile(f)
+            dataframe = recording.read_recording(folder)
+
+        self.assertEqual(len(dataframe), num_samples)
+
+    def test_time_range_slicing(self):
+        with tempfile.TemporaryDirectory() as folder:
+            num_samples = write_chunked_recording(folder)
+            rec = recording.Recording(folder)
+            window = rec[12 / 256 : 24 / 256]
+            timestamps, samples = rec.arrays(12 / 256, 24 / 256)
+            open_ended = rec[50 / 256 :]
+
+            self.assertEqual(len(rec), num_samples)
+            self.assertIsInstance(rec.samples, np.memmap)
+            np.testing.assert_array_equal(window["TP9"].to_numpy(), np.arange(12, 24))
+            self.assertTupleEqual(samples.shape, (len(CHANNELS), 12))
+            np.testing.assert_array_equal(samples, window.to_numpy().T)
+            self.assertEqual(len(open_ended), num_samples - 50)
+            del rec, samples, timestamps
+
+    def test_slices_feed_ml_set(self):
+        with tempfile.TemporaryDirectory() as folder:
+            write_chunked_recording(folder)
+            rec = recording.Recording(folder)
+            timestamps, samples = rec.arrays(0, 40 / 256)
+            markers = np.rec.fromarrays(
+                [np.array(["one", "two"]), np.array([2.5 / 256, 10.5 / 256])],
+                dtype=np.dtype([("marker", "<U3"), ("timestamp", np.float64)]),
+            )
+            X, Y = data_parsing.get_ML_set_from_data(markers, timestamps, samples, samples_per_trial=8)
+            del rec, samples, timestamps
+
+        self.assertTupleEqual(X.shape, (2, len(CHANNELS), 8))
+        np.testing.assert_array_equal(X[1, 0], np.arange(11, 19))
+
+    def test_reads_legacy_pickle(self):
+        legacy = pd.DataFrame(
+            np.random.rand(100, len(CHANNELS)),
+            columns=CHANNELS,
+            index=pd.Index(np.arange(100) / 256, name="timestamps"),
+        )
+        with tempfile.TemporaryDirectory() as folder:
+            legacy.to_pickle(os.path.join(folder, recording.LEGACY_DATA_FILE))
+            dataframe = recording.read_recording(folder)
+
+        pd.testing.assert_frame_equal(dataframe, legacy)
+
+
+class TestMarkers(unittest.TestCase):
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as folder:
+            empty = recording.read_markers(folder)
+            recording.write_markers(folder, [("left", 0.1 + 0.2), ("right", 1.5)])
+            markers = recording.read_markers(folder)
+
+        self.assertEqual(len(empty), 0)
+        np.testing.assert_array_equal(markers["marker"], ["left", "right"])
+        np.testing.assert_array_equal(markers["timestamp"], [0.1 + 0.2, 1.5])
+
+
+if __name__ == "__main__":
+    unittest.main()
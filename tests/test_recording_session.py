@@ -0,0 +1,91 @@
+#!/bin/python3
+# Test file for recording several devices at once
+
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from synapp.core.devices import device
+from synapp.core.devices.recording_session import (
+    MAX_OFFSET_SLEW,
+    ClockAligner,
+    RecordingSession,
+    read_session,
+    read_session_info,
+)
+from tests import test_utils
+
+# Each fake headset's clock starts somewhere different
+CLOCK_OFFSETS = {"00:00:00:00:00:01": 0.0, "00:00:00:00:00:02": 5000.0, "00:00:00:00:00:03": -20.0}
+
+
+def fake_muse(address, callback_eeg, name):
+    return test_utils.FakeMuse(address, callback_eeg, name, time_offset=CLOCK_OFFSETS[address])
+
+
+class TestClockAligner(unittest.TestCase):
+    def test_uses_least_delayed_chunk(self):
+        aligner = ClockAligner(start_time=100.0)
+
+        # Device clock runs 150 s behind; the second chunk arrives with the least delay (0.01 s)
+        first = aligner.align([1.0, 2.0], arrival_time=152.5)
+        second = aligner.align([3.0], arrival_time=153.01)
+
+        self.assertAlmostEqual(aligner.offset, 150.01)
+        np.testing.assert_allclose(first, [51.5, 52.5])
+        # The smaller offset is slewed towards, 1 s of device time later
+        self.assertAlmostEqual(aligner.applied_offset, 150.5 - MAX_OFFSET_SLEW)
+        np.testing.assert_allclose(second, [53.5 - MAX_OFFSET_SLEW])
+
+    def test_stays_monotonic_with_jittered_arrivals(self):
+        sample_rate, chunk_size = 256, 12
+        aligner = ClockAligner(start_time=0.0, sample_rate=sample_rate)
+        # A slow chunk, then a fast one, then random transport delays
+        delays = np.concatenate([[0.08, 0.002], np.random.default_rng(0).uniform(0.002, 0.08, 2000)])
+        aligned = []
+        for i, delay in enumerate(delays):
+            timestamps = (i * chunk_size + np.arange(chunk_size)) / sample_rate
+            aligned.append(aligner.align(timestamps, arrival_time=1000.0 + timestamps[-1] + delay))
+        aligned = np.concatenate(aligned)
+
+        steps = np.diff(aligned)
+        self.assertGreaterEqual(steps.min(), (1 - MAX_OFFSET_SLEW) / sample_rate - 1e-9)
+        # Once slewed, the timestamps run at the device's rate on the least-delayed offset
+        self.assertAlmostEqual(aligner.applied_offset, aligner.offset)
+        self.assertAlmostEqual(aligner.offset, 1000.002, delta=1e-3)
+        np.testing.assert_allclose(steps[-1000:], 1 / sample_rate)
+
+
+@mock.patch.object(device, "Muse", fake_muse)
+class TestRecordingSession(unittest.TestCase):
+    def test_records_devices_onto_one_clock(self):
+        devices = [device.MuseDevice("Muse", address) for address in CLOCK_OFFSETS]
+
+        with tempfile.TemporaryDirectory() as folder:
+            session = RecordingSession(devices, folder, chunk_duration=0.2, notes="three headsets")
+            session_folder = session.record(1.0)
+            info = read_session_info(session_folder)
+            recordings = read_session(session_folder)
+
+            self.assertListEqual(list(recordings), ["muse", "muse_2", "muse_3"])
+            self.assertEqual(info["clock"], "monotonic")
+            starts, ends = [], []
+            for name, recording in recordings.items():
+                self.assertGreater(len(recording), 128)
+                self.assertEqual(info["num_samples"][name], len(recording))
+                self.assertListEqual(recording.channels, ["TP9", "AF7", "AF8", "TP10"])
+                np.testing.assert_array_equal(recording.samples[:, 0], np.arange(len(recording)))
+                self.assertTrue(np.all(np.diff(recording.timestamps) > 0))
+                starts.append(recording.timestamps[0])
+                ends.append(recording.timestamps[-1])
+
+        # Devices connect one after another, but are stopped together. Despite clocks thousands of seconds
+        # apart, their last samples line up on the session clock
+        self.assertLess(max(ends) - min(ends), 0.25)
+        self.assertTrue(all(-0.1 < start < 1 for start in starts))
+
+
+if __name__ == "__main__":
+    unittest.main()
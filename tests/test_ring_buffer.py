@@ -0,0 +1,65 @@
+#!/bin/python3
+# Test file for the ring buffer sample store
+
+import unittest
+
+import numpy as np
+
+from synapp.core.ring_buffer import RingBuffer
+
+
+class TestRingBuffer(unittest.TestCase):
+    def test_latest_returns_appended_samples(self):
+        buffer = RingBuffer(num_channels=4, capacity=100)
+        samples = np.arange(4 * 12, dtype=np.float64).reshape(4, 12)
+        buffer.append(samples, np.arange(12))
+
+        timestamps, latest = buffer.latest()
+
+        self.assertEqual(len(buffer), 12)
+        np.testing.assert_array_equal(timestamps, np.arange(12))
+        np.testing.assert_array_equal(latest, samples)
+
+    def test_wraparound_keeps_newest_samples_contiguous(self):
+        buffer = RingBuffer(num_channels=2, capacity=10)
+        for start in range(0, 36, 12):
+            times = np.arange(start, start + 12, dtype=np.float64)
+            buffer.append(np.vstack([times, -times]), times)
+
+        timestamps, latest = buffer.latest(7)
+
+        self.assertTrue(buffer.overflowed)
+        np.testing.assert_array_equal(timestamps, np.arange(29, 36))
+        np.testing.assert_array_equal(latest, np.vstack([np.arange(29, 36), -np.arange(29, 36)]))
+        # Latest samples are a view of the storage, not a copy
+        self.assertFalse(latest.flags["OWNDATA"])
+
+    def test_since_reports_lost_samples(self):
+        buffer = RingBuffer(num_channels=1, capacity=8)
+        buffer.append(np.arange(5)[np.newaxis, :], np.arange(5))
+        read_position = buffer.total_written
+        buffer.append(np.arange(5, 15)[np.newaxis, :], np.arange(5, 15))
+
+        timestamps, samples, lost = buffer.since(read_position)
+
+        self.assertEqual(lost, 2)
+        np.testing.assert_array_equal(timestamps, np.arange(7, 15))
+
+    def test_since_is_not_overwritten_by_later_appends(self):
+        buffer = RingBuffer(num_channels=1, capacity=8)
+        buffer.append(np.arange(6)[np.newaxis, :], np.arange(6))
+
+        timestamps, samples, _ = buffer.since(0)
+        buffer.append(np.full((1, 8), -1), np.full(8, -1))
+
+        np.testing.assert_array_equal(timestamps, np.arange(6))
+        np.testing.assert_array_equal(samples, np.arange(6)[np.newaxis, :])
+
+    def test_rejects_mismatched_shapes(self):
+        buffer = RingBuffer(num_channels=4, capacity=10)
+        with self.assertRaises(ValueError):
+            buffer.append(np.zeros((5, 12)), np.zeros(12))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+#!/bin/python3
+# Test file for the spectral analysis utility file
+
+import unittest
+
+import numpy as np
+from scipy import signal as sps
+
+from synapp.core import data_parsing, spectral
+
+
+class TestSpectral(unittest.TestCase):
+    def setUp(self):
+        self.time = np.arange(256 * 8) / 256
+        rng = np.random.default_rng(0)
+        self.samples = np.vstack(
+            [
+                np.sin(2 * np.pi * frequency * self.time) + 0.1 * rng.normal(size=len(self.time))
+                for frequency in (6, 10, 20)
+            ]
+        )
+
+    def test_amplitude_spectrum_matches_full_fft(self):
+        amplitudes, frequencies = data_parsing.get_FFT_from_timeseries(self.samples, 256)
+
+        full = np.abs(np.fft.fft(self.samples / self.samples.shape[1], axis=-1))[:, : self.samples.shape[1] // 2]
+        np.testing.assert_allclose(amplitudes, full, atol=1e-12)
+        np.testing.assert_allclose(frequencies, np.arange(self.samples.shape[1] // 2) / 8)
+        np.testing.assert_array_equal(frequencies[np.argmax(amplitudes, axis=1)], [6, 10, 20])
+
+    def test_welch_matches_scipy(self):
+        psd, frequencies = spectral.welch_psd(self.samples, 256, segment_length=256)
+
+        expected_frequencies, expected_psd = sps.welch(self.samples, fs=256, nperseg=256, axis=-1)
+        np.testing.assert_allclose(frequencies, expected_frequencies)
+        np.testing.assert_allclose(psd, expected_psd, rtol=1e-10)
+
+    def test_welch_in_blocks_matches_scipy(self):
+        long_samples = np.random.default_rng(0).normal(size=(2, 128 * (3 * spectral.WELCH_BLOCK_SEGMENTS + 10)))
+
+        psd, _ = spectral.welch_psd(long_samples, 256, segment_length=256)
+
+        _, expected_psd = sps.welch(long_samples, fs=256, nperseg=256, axis=-1)
+        np.testing.assert_allclose(psd, expected_psd, rtol=1e-10)
+
+    def test_welch_rejects_overlap_of_a_whole_segment(self):
+        with self.assertRaises(ValueError):
+            spectral.welch_psd(self.samples, 256, segment_length=128, overlap=128)
+        # Segments are shortened to the data, so the overlap must be shorter than that
+        with self.assertRaises(ValueError):
+            spectral.welch_psd(self.samples[:, :100], 256, segment_length=256, overlap=100)
+
+    def test_band_power(self):
+        psd, frequencies = spectral.welch_psd(self.samples, 256)
+
+        powers = spectral.band_power(psd, frequencies)
+
+        self.assertEqual(np.argmax(powers["theta"]), 0)
+        self.assertEqual(np.argmax(powers["alpha"]), 1)
+        self.assertEqual(np.argmax(powers["beta"]), 2)
+
+    def test_frequency_axes_are_cached(self):
+        self.assertIs(spectral.rfft_frequencies(512, 256), spectral.rfft_frequencies(512, 256))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/bin/python3
+# Test file for SSVEP detection
+
+import unittest
+
+import numpy as np
+
+from synapp.core import data_parsing
+from synapp.core.ssvep import SSVEPDetector, target_frequency_power
+
+TARGETS = [8.0, 10.0, 12.0, 15.0]
+
+
+def ssvep_signal(frequency, num_samples, num_channels=4, sample_rate=256, seed=0):
+    time = np.arange(num_samples) / sample_rate
+    noise = np.random.default_rng(seed).normal(scale=1.0, size=(num_channels, num_samples))
+    return np.sin(2 * np.pi * frequency * time) + 0.5 * np.sin(2 * np.pi * 2 * frequency * time) + noise
+
+
+class TestSSVEP(unittest.TestCase):
+    def test_ssvep_eval(self):
+        samples = ssvep_signal(12.0, 1024)
+
+        self.assertEqual(data_parsing.ssvep_eval(samples[0], TARGETS), 12.0)
+        self.assertEqual(data_parsing.ssvep_eval(samples, TARGETS), 12.0)
+
+    def test_streaming_matches_direct_computation(self):
+        samples = ssvep_signal(10.0, 2000)
+        detector = SSVEPDetector(TARGETS, num_channels=4, window_length=512, harmonics=2, resync_windows=1000)
+
+        for start in range(0, 2000, 12):
+            detector.update(samples[:, start : start + 12])
+
+        window = samples[:, 2000 - 512 :]
+        expected = target_frequency_power(window, TARGETS, harmonics=2)
+        np.testing.assert_allclose(detector.power().sum(axis=-1), expected, rtol=1e-9, atol=1e-12)
+        self.assertEqual(detector.predict(), 10.0)
+
+    def test_detector_follows_stimulus_change(self):
+        detector = SSVEPDetector(TARGETS, num_channels=4, window_length=256)
+        self.assertIsNone(detector.predict())
+
+        for frequency in (8.0, 15.0):
+            samples = ssvep_signal(frequency, 1024, seed=int(frequency))
+            for start in range(0, 1024, 32):
+                detector.update(samples[:, start : start + 32])
+            self.assertEqual(detector.predict(minimum_score=0.5), frequency)
+
+
+if __name__ == "__main__":
+    unittest.main()
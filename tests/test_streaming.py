@@ -0,0 +1,175 @@
+#!/bin/python3
+# Test file for async streaming from devices
+
+import asyncio
+import concurrent.futures
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import aclosing
+from unittest import mock
+
+import numpy as np
+
+from synapp.core.devices import device
+from synapp.core.recording import Recording
+from synapp.core.streaming import ChunkQueue
+from tests import test_utils
+
+
+def produce(queue, num_chunks):
+    for i in range(num_chunks):
+        queue.put_threadsafe(np.full((2, 4), i), np.arange(4) + 4 * i)
+
+
+class SharedLoopMuse(test_utils.FakeMuse):
+    """ Like muselsl's Muse: every connected device's chunks are delivered by whichever thread pumps the
+    shared event loop, see `pump_shared_loop` """
+
+    connected_muses = []
+
+    def start(self):
+        self.next_index = 0
+        SharedLoopMuse.connected_muses.append(self)
+
+    def deliver_chunk(self):
+        indices = np.arange(self.next_index, self.next_index + 12)
+        self.callback_eeg(np.vstack([indices + 1000 * channel for channel in range(5)]), indices / 256)
+        self.next_index += 12
+
+    def stop(self):
+        SharedLoopMuse.connected_muses.remove(self)
+
+
+def pump_shared_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for muse in list(SharedLoopMuse.connected_muses):
+            muse.deliver_chunk()
+        time.sleep(0.005)
+
+
+class TestChunkQueue(unittest.TestCase):
+    def test_block_applies_backpressure(self):
+        async def consume():
+            queue = ChunkQueue(maxsize=2, overflow="block")
+            producer = threading.Thread(target=produce, args=(queue, 20))
+            producer.start()
+            received = []
+            async for chunk in queue:
+                # A slow consumer, the producer has to wait for it
+                await asyncio.sleep(0.001)
+                self.assertLessEqual(queue.qsize(), 2)
+                received.append(chunk.samples[0, 0])
+                if len(received) == 20:
+                    queue.close()
+            await asyncio.to_thread(producer.join)
+            return received
+
+        self.assertListEqual(asyncio.run(consume()), list(range(20)))
+
+    def test_drop_oldest_never_blocks(self):
+        async def consume():
+            queue = ChunkQueue(maxsize=4, overflow="drop_oldest")
+            await asyncio.to_thread(produce, queue, 20)
+            await asyncio.sleep(0)
+            queue.close()
+            return [chunk.samples[0, 0] async for chunk in queue], queue.dropped_chunks
+
+        received, dropped = asyncio.run(consume())
+
+        # 16 overflowed, then the oldest of the 4 kept made way for the end-of-stream marker
+        self.assertEqual(dropped, 16)
+        self.assertListEqual(received, [17, 18, 19])
+
+    def test_close_releases_blocked_producer(self):
+        async def run():
+            queue = ChunkQueue(maxsize=1, overflow="block")
+            producer = threading.Thread(target=produce, args=(queue, 10))
+            producer.start()
+            await asyncio.sleep(0.05)
+            queue.close()
+            await asyncio.wait_for(asyncio.to_thread(producer.join), timeout=5)
+
+        asyncio.run(run())
+
+
+@mock.patch.object(device, "Muse", test_utils.FakeMuse)
+class TestDeviceStreaming(unittest.TestCase):
+    def setUp(self):
+        self.muse = device.MuseDevice("Muse-Test", "00:00:00:00:00:00")
+
+    def test_astream(self):
+        async def consume():
+            chunks = []
+            async with aclosing(self.muse.astream(queue_size=4)) as stream:
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    if len(chunks) == 5:
+                        break
+            return chunks
+
+        chunks = asyncio.run(consume())
+
+        samples = np.concatenate([chunk.samples for chunk in chunks], axis=1)
+        np.testing.assert_array_equal(samples[1], np.arange(60) + 1000)
+        np.testing.assert_array_equal(np.concatenate([chunk.timestamps for chunk in chunks]), np.arange(60) / 256)
+
+    def test_record_without_blocking_returns_task(self):
+        async def record(folder):
+            task = self.muse.record(folder, recording_time=0.5, block=False)
+            self.assertIsInstance(task, asyncio.Task)
+            # The event loop stays free while recording
+            ticks = 0
+            while not task.done():
+                await asyncio.sleep(0.01)
+                ticks += 1
+            return await task, ticks
+
+        with tempfile.TemporaryDirectory() as folder:
+            recording_folder, ticks = asyncio.run(record(folder))
+            recording = Recording(recording_folder)
+
+            self.assertGreater(ticks, 10)
+            self.assertGreater(len(recording), 0)
+            np.testing.assert_array_equal(recording.samples[:, 1], np.arange(len(recording)) + 1000)
+
+    def test_record_without_blocking_outside_event_loop_returns_future(self):
+        with tempfile.TemporaryDirectory() as folder:
+            future = self.muse.record(folder, recording_time=0.3, block=False)
+
+            self.assertIsInstance(future, concurrent.futures.Future)
+            self.assertGreater(len(Recording(future.result(timeout=10))), 0)
+
+
+@mock.patch.object(device, "Muse", SharedLoopMuse)
+@mock.patch.object(device, "_pump_device_events", pump_shared_loop)
+class TestSharedDeviceLoop(unittest.TestCase):
+    def test_slow_consumer_does_not_stall_other_devices(self):
+        async def consume_slowly(muse):
+            async with aclosing(muse.astream(queue_size=2)) as stream:
+                async for _ in stream:
+                    await asyncio.sleep(60)
+
+        async def consume(muse, num_chunks):
+            chunks = 0
+            async with aclosing(muse.astream(queue_size=2)) as stream:
+                async for _ in stream:
+                    chunks += 1
+                    if chunks == num_chunks:
+                        return chunks
+
+        async def run():
+            slow = asyncio.create_task(consume_slowly(device.MuseDevice("Muse-Slow", "00:00:00:00:00:01")))
+            try:
+                return await asyncio.wait_for(consume(device.MuseDevice("Muse", "00:00:00:00:00:02"), 50), 10)
+            finally:
+                slow.cancel()
+                await asyncio.gather(slow, return_exceptions=True)
+
+        self.assertEqual(asyncio.run(run()), 50)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,9 +2,16 @@
 # Utility file for use in testing this library.
 # Data and object generation
 
+import threading
+import time
 import unittest
 import numpy as np
 
+from synapp.core import recording
+from synapp.core.ring_buffer import RingBuffer
+
+CHANNELS = ["TP9", "AF7", "AF8", "TP10"]
+
 def create_timestamps_samples_markers_arrays(desired_num_samples, num_channels, hz, generator_function = None) -> tuple[np.ndarray, np.ndarray, np.recarray]:
     if not generator_function:
         def generator_function(length):
@@ -24,6 +31,59 @@ def create_timestamps_samples_markers_arrays(desired_num_samples, num_channels,
     return timestamps, samples, markers
 
 
+def write_recording(folder, samples, timestamps, sample_rate=256, channels=CHANNELS, chunk_size=None, **info):
+    """ Write samples of shape (channels, n) to a chunked recording folder, flushing a chunk of chunk_size
+    samples at a time (all in one chunk if None). Extra keyword arguments are stored in the recording info. """
+    samples, timestamps = np.asarray(samples), np.asarray(timestamps)
+    recording.write_recording_info(folder, {"channels": list(channels), "sample_rate": sample_rate, **info})
+    chunk_size = chunk_size or max(len(timestamps), 1)
+    buffer = RingBuffer(len(channels), capacity=chunk_size)
+    with recording.RecordingWriter(folder, buffer) as writer:
+        for start in range(0, len(timestamps), chunk_size):
+            buffer.append(samples[:, start : start + chunk_size], timestamps[start : start + chunk_size])
+            writer.flush()
+    return folder
+
+
+class FakeMuse:
+    """ Stands in for muselsl's Muse: calls callback_eeg(samples, timestamps) with 5 x 12 chunks of a
+    ramp (sample index + 1000 * channel) from its own thread, at up to `chunks_per_second`.
+    Timestamps are sample index / 256 + time_offset """
+
+    def __init__(self, address, callback_eeg, name, chunks_per_second=256 / 12, time_offset=0.0):
+        self.callback_eeg = callback_eeg
+        self.time_offset = time_offset
+        self.chunks_per_second = chunks_per_second
+        self.connected = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def connect(self):
+        self.connected = True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        start = 0
+        while not self._stop_event.is_set():
+            indices = np.arange(start, start + 12)
+            self.callback_eeg(
+                np.vstack([indices + 1000 * channel for channel in range(5)]), indices / 256 + self.time_offset
+            )
+            start += 12
+            time.sleep(1 / self.chunks_per_second)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def disconnect(self):
+        self.connected = False
+
+
 # Test the utility functions -- we need to know they work as expected
 
 class TestUtils(unittest.TestCase):
@@ -0,0 +1,134 @@
+#!/bin/python3
+# Test file for the synthetic and replay devices
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from synapp.core import recording
+from synapp.core.devices.device_scanner import DeviceScannerFactory
+from synapp.core.devices.virtual_devices import ReplayDevice, SyntheticDevice, run_device
+from synapp.core.enums import DeviceType
+from synapp.core.recording import Recording
+from tests import test_utils
+
+
+class Collector:
+    """Device callback that keeps every chunk"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def __call__(self, samples, timestamps):
+        self.chunks.append((samples, timestamps))
+
+    def arrays(self):
+        return np.concatenate([c[1] for c in self.chunks]), np.concatenate([c[0] for c in self.chunks], axis=1)
+
+
+def write_legacy_recording(folder, num_samples=1000):
+    timestamps, samples, _ = test_utils.create_timestamps_samples_markers_arrays(num_samples, 4, 256)
+    dataframe = pd.DataFrame(samples.T, columns=["TP9", "AF7", "AF8", "TP10"], index=timestamps)
+    dataframe.to_pickle(os.path.join(folder, recording.LEGACY_DATA_FILE))
+    return timestamps, samples
+
+
+class TestSyntheticDevice(unittest.TestCase):
+    def test_seeded_streams_are_identical(self):
+        runs = []
+        for _ in range(2):
+            collector = Collector()
+            run_device(SyntheticDevice(duration=1.0, seed=1, speed=float("inf")), collector, timeout=10)
+            runs.append(collector.arrays())
+
+        (timestamps, samples), (_, repeated) = runs
+        self.assertTupleEqual(samples.shape, (4, 256))
+        np.testing.assert_array_equal(samples, repeated)
+        np.testing.assert_allclose(np.diff(timestamps), 1 / 256)
+        self.assertTrue(all(len(chunk[1]) == 12 for chunk in collector.chunks[:-1]))
+
+    def test_speed_sets_delivery_rate(self):
+        device = SyntheticDevice(duration=2.0, speed=10.0)
+
+        start = time.monotonic()
+        driver = run_device(device, Collector(), timeout=10)
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(driver.samples_sent, 512)
+        # 2 s of data at 10x real time
+        self.assertGreater(elapsed, 0.15)
+        self.assertLess(elapsed, 1.0)
+
+    def test_record(self):
+        device = SyntheticDevice(channels=["a", "b"], speed=4.0, seed=0)
+
+        with tempfile.TemporaryDirectory() as folder:
+            saved = Recording(device.record(folder, recording_time=0.5, notes="synthetic"))
+
+            self.assertListEqual(saved.channels, ["a", "b"])
+            # Roughly 2 s of data, recorded in 0.5 s
+            self.assertGreater(saved.duration, 1.0)
+
+
+class TestReplayDevice(unittest.TestCase):
+    def test_replays_legacy_recording_exactly(self):
+        with tempfile.TemporaryDirectory() as folder:
+            timestamps, samples = write_legacy_recording(folder)
+            device = ReplayDevice(os.path.join(folder, recording.LEGACY_DATA_FILE), speed=float("inf"))
+            collector = Collector()
+
+            run_device(device, collector, timeout=10)
+
+            self.assertEqual(device.sampling_rate, 256)
+            self.assertListEqual(device.channel_names(), ["TP9", "AF7", "AF8", "TP10"])
+            replayed_timestamps, replayed_samples = collector.arrays()
+            np.testing.assert_array_equal(replayed_timestamps, timestamps)
+            np.testing.assert_array_equal(replayed_samples, samples)
+
+    def test_loop_keeps_timestamps_increasing(self):
+        with tempfile.TemporaryDirectory() as folder:
+            write_legacy_recording(folder, num_samples=100)
+            device = ReplayDevice(folder, speed=float("inf"), loop=True)
+            collector = Collector()
+            three_passes = threading.Event()
+
+            def collect(samples, timestamps):
+                collector(samples, timestamps)
+                if sum(len(chunk[1]) for chunk in collector.chunks) >= 300:
+                    three_passes.set()
+
+            streamer = device.stream(callback=collect)
+            self.assertTrue(three_passes.wait(10))
+            streamer.stop_streaming()
+            timestamps, samples = collector.arrays()
+
+            self.assertGreaterEqual(len(timestamps), 300)
+            np.testing.assert_allclose(np.diff(timestamps), 1 / 256, atol=1e-9)
+            np.testing.assert_array_equal(samples[:, 100:200], samples[:, :100])
+
+
+class TestVirtualDeviceScanners(unittest.TestCase):
+    def test_synthetic_scanner(self):
+        devices = DeviceScannerFactory.create(DeviceType.synthetic, count=3, seed=5).scan_for_devices()
+
+        self.assertListEqual([d.name for d in devices], ["Synthetic 1", "Synthetic 2", "Synthetic 3"])
+        self.assertListEqual([d.seed for d in devices], [5, 6, 7])
+
+    def test_replay_scanner(self):
+        with tempfile.TemporaryDirectory() as folder:
+            write_legacy_recording(folder)
+
+            devices = DeviceScannerFactory.create(DeviceType.replay, folders=[folder], speed=50).scan_for_devices()
+
+            self.assertEqual(len(devices), 1)
+            self.assertIsInstance(devices[0], ReplayDevice)
+            self.assertEqual(devices[0].speed, 50)
+
+
+if __name__ == "__main__":
+    unittest.main()